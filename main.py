@@ -1,67 +1,180 @@
+import argparse
 import asyncio
 import os
+import time
 
 import dotenv
-from google.adk import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
-
-from src.agent import create_auditor_agent
 
 # Carrega variáveis de ambiente
 dotenv.load_dotenv()
 
+APP_NAME = "auditor_app"
+USER_ID = "user"
 
-async def main():
-    print("--- Auditoria do Toby: Sistema Integrado (Google ADK) ---")
 
-    if not os.getenv("GEMINI_API_KEY"):
-        print("\n[ERRO] A variável de ambiente GEMINI_API_KEY não foi definida.")
-        print("Por favor, verifique seu arquivo .env.")
-        return
+def _registrar(tempos, etapa, inicio, perfil):
+    """Guarda a duração de uma etapa da inicialização (e a exibe com --profile-startup)."""
+    tempos[etapa] = time.perf_counter() - inicio
+    if perfil:
+        print(f"\n[Startup] {etapa}: {tempos[etapa] * 1000:.0f} ms")
 
-    try:
-        # Cria o agente orquestrador (auditor)
+
+def _preparar_runner(tempos, perfil, modelo_falso=False):
+    """Importa o ADK e as ferramentas e cria o agente e o runner (roda em uma thread)."""
+    inicio = time.perf_counter()
+    from google.adk import Runner
+    from google.adk.sessions import InMemorySessionService
+
+    from src.agent import create_auditor_agent
+
+    _registrar(tempos, "import do ADK e das ferramentas", inicio, perfil)
+
+    inicio = time.perf_counter()
+    # Cria o agente orquestrador (auditor)
+    if modelo_falso:
+        from src.modelo_falso import ModeloFalso
+
+        agent = create_auditor_agent(model=ModeloFalso())
+    else:
         agent = create_auditor_agent()
 
-        # Cria o serviço de sessão
-        session_service = InMemorySessionService()
+    # Cria o serviço de sessão
+    session_service = InMemorySessionService()
+
+    # Cria o runner para executar o agente
+    runner = Runner(agent=agent, session_service=session_service, app_name=APP_NAME)
+    _registrar(tempos, "criação do agente e do runner", inicio, perfil)
+    return runner, session_service
+
+
+async def _aquecer_runner(tempos, perfil, modelo_falso=False):
+    runner, session_service = await asyncio.to_thread(
+        _preparar_runner, tempos, perfil, modelo_falso
+    )
+
+    # Cria uma sessão
+    session = await session_service.create_session(user_id=USER_ID, app_name=APP_NAME)
+    return runner, session
+
+
+async def _aquecer_indice(tempos, perfil):
+    """Constrói (ou carrega do disco) o índice de compliance enquanto o usuário digita."""
+    inicio = time.perf_counter()
+    try:
+        from src.tools import inicializar_chatbot
+
+        await asyncio.to_thread(inicializar_chatbot)
+        _registrar(tempos, "índice de compliance", inicio, perfil)
+    except Exception as e:
+        # A compliance_tool tenta novamente na primeira pergunta
+        print(f"\n[Aviso] Não foi possível preparar o índice de compliance: {e}")
+
+
+async def _executar_turno(runner, session, user_input, streaming=True):
+    """
+    Executa um turno do agente exibindo a resposta à medida que ela chega.
+
+    Com `streaming`, o texto parcial do modelo é impresso assim que cada trecho
+    chega; as chamadas de ferramenta aparecem com marcadores de início e fim e o
+    tempo gasto. Ao final, mostra o tempo até o primeiro token e a latência total.
+    Sem `streaming`, imprime apenas o texto final, como antes. Nos dois modos,
+    termina com o resumo da telemetria do turno (veja `_imprimir_telemetria`).
+    """
+    from src.telemetria import etiquetas, marca, registros_desde
+    from src.turno import executar_turno
+
+    transmitindo = False  # já imprimiu o cabeçalho da mensagem atual
+    inicio_turno = marca()
+    with etiquetas(sessao=session.id):
+        async for evento in executar_turno(
+            runner, USER_ID, session.id, user_input, streaming
+        ):
+            tipo = evento["tipo"]
+            if tipo == "texto":
+                if not transmitindo:
+                    print("\nAuditor: ", end="")
+                    transmitindo = True
+                print(evento["texto"], end="", flush=True)
+            elif tipo == "resposta":
+                if streaming:
+                    print()
+                    transmitindo = False
+                else:
+                    print(f"\nAuditor: {evento['texto']}")
+            elif not streaming:
+                continue
+            elif tipo == "ferramenta_inicio":
+                print(f"\n[ferramenta] {evento['nome']} iniciada...", flush=True)
+            elif tipo == "ferramenta_fim":
+                print(
+                    f"[ferramenta] {evento['nome']} concluída"
+                    f" em {evento['segundos']:.1f} s",
+                    flush=True,
+                )
+            elif tipo == "fim" and evento["primeiro_token"] is not None:
+                print(
+                    f"[tempo até o primeiro token: {evento['primeiro_token']:.2f} s"
+                    f" | total do turno: {evento['total']:.2f} s]"
+                )
+
+    _imprimir_telemetria(registros_desde(inicio_turno, sessao=session.id))
+
 
-        # Cria o runner para executar o agente
-        runner = Runner(
-            agent=agent, session_service=session_service, app_name="auditor_app"
+def _imprimir_telemetria(registros):
+    """Tempo, tokens e custo estimado do turno, por ferramenta e por operação."""
+    from src.telemetria import resumo
+
+    if not registros:
+        return
+    print("[telemetria do turno]")
+    custo_total = 0.0
+    for ferramenta, grupo in resumo(registros).items():
+        operacoes = " | ".join(
+            f"{operacao} {chamadas}x {segundos:.2f} s"
+            for operacao, (chamadas, segundos) in grupo["operacoes"].items()
         )
+        print(
+            f"  {ferramenta} ({grupo['segundos']:.2f} s): {operacoes or 'sem operações'}"
+            f" | tokens {grupo['tokens_entrada']} entrada / {grupo['tokens_saida']} saída"
+            f" ({grupo['tokens_cache']} do cache) | US$ {grupo['custo_usd']:.4f}"
+        )
+        custo_total += grupo["custo_usd"]
+    print(f"  custo estimado do turno: US$ {custo_total:.4f}")
+
 
-        # Cria uma sessão
-        session = await session_service.create_session(
-            user_id="user", app_name="auditor_app"
+async def main(perfil=False, streaming=True, modelo_falso=False):
+    inicio_processo = time.perf_counter()
+    tempos = {}
+    print("--- Auditoria do Toby: Sistema Integrado (Google ADK) ---")
+
+    if not modelo_falso and not os.getenv("GEMINI_API_KEY"):
+        print("\n[ERRO] A variável de ambiente GEMINI_API_KEY não foi definida.")
+        print("Por favor, verifique seu arquivo .env.")
+        return
+
+    try:
+        # Aquecimento em segundo plano: o prompt aparece imediatamente e o agente e
+        # o índice de compliance ficam prontos enquanto o usuário digita
+        tarefa_runner = asyncio.create_task(
+            _aquecer_runner(tempos, perfil, modelo_falso)
         )
+        tarefa_indice = asyncio.create_task(_aquecer_indice(tempos, perfil))
 
         print("Agente Auditor pronto! (Digite 'sair' para encerrar)")
+        _registrar(tempos, "tempo até o primeiro prompt", inicio_processo, perfil)
 
         while True:
-            user_input = input("\nVocê: ")
+            # input() roda em uma thread para não bloquear o aquecimento
+            user_input = await asyncio.to_thread(input, "\nVocê: ")
             if user_input.lower() in ["sair", "exit", "quit"]:
                 break
 
-            # Executa o agente com a entrada do usuário
-            message_content = types.Content(
-                role="user", parts=[types.Part(text=user_input)]
-            )
-            final_response_text = ""
-            async for event in runner.run_async(
-                user_id="user", session_id=session.id, new_message=message_content
-            ):
-                if hasattr(event, "content") and event.content:
-                    content = event.content
-                    if hasattr(content, "role") and content.role == "model":
-                        if hasattr(content, "parts"):
-                            for part in content.parts:
-                                if hasattr(part, "text") and part.text:
-                                    final_response_text = part.text
-
-            if final_response_text:
-                print(f"\nAuditor: {final_response_text}")
+            runner, session = await tarefa_runner
+            await _executar_turno(runner, session, user_input, streaming)
+
+        if not tarefa_indice.done():
+            print("Aguardando o término da preparação do índice de compliance...")
+        await tarefa_indice
 
     except Exception as e:
         print(f"\n[ERRO CRÍTICO] Ocorreu um erro na execução do agente: {e}")
@@ -70,5 +183,79 @@ async def main():
         traceback.print_exc()
 
 
+async def servir(host, porta, streaming=True, modelo_falso=False):
+    """Modo servidor: atende vários usuários por HTTP/SSE (veja `src/servidor.py`)."""
+    from src.servidor import ServidorAuditor
+
+    if not modelo_falso and not os.getenv("GEMINI_API_KEY"):
+        print("\n[ERRO] A variável de ambiente GEMINI_API_KEY não foi definida.")
+        return
+
+    tempos = {}
+    runner, session_service = await asyncio.to_thread(
+        _preparar_runner, tempos, False, modelo_falso
+    )
+    if not modelo_falso:
+        await _aquecer_indice(tempos, False)
+
+    servidor = ServidorAuditor(runner, session_service, streaming=streaming)
+    socket_servidor = await servidor.iniciar(host, porta)
+    print(
+        f"[Servidor] Ouvindo em http://{host}:{porta}"
+        " (POST /chat, GET /healthz, GET /metricas, GET /metrics)"
+    )
+    async with socket_servidor:
+        await socket_servidor.serve_forever()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Agente Auditor da Dunder Mifflin")
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="exibe os tempos de importação e de inicialização",
+    )
+    parser.add_argument(
+        "--sem-streaming",
+        action="store_true",
+        help="exibe apenas a resposta final de cada turno, sem texto parcial",
+    )
+    parser.add_argument(
+        "--servidor",
+        action="store_true",
+        help="atende vários usuários por HTTP/SSE em vez do prompt interativo",
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="endereço do servidor")
+    parser.add_argument("--porta", type=int, default=8080, help="porta do servidor")
+    parser.add_argument(
+        "--modelo-falso",
+        action="store_true",
+        help="usa um modelo local simulado (testes de carga, sem chamadas à API)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="ARQUIVO",
+        help="grava a telemetria de cada operação (LLM, FAISS, leitura) em JSON-lines",
+    )
+    args = parser.parse_args()
+    if args.trace:
+        from src.telemetria import definir_trace
+
+        definir_trace(args.trace)
+    if args.servidor:
+        asyncio.run(
+            servir(
+                args.host,
+                args.porta,
+                streaming=not args.sem_streaming,
+                modelo_falso=args.modelo_falso,
+            )
+        )
+    else:
+        asyncio.run(
+            main(
+                perfil=args.profile_startup,
+                streaming=not args.sem_streaming,
+                modelo_falso=args.modelo_falso,
+            )
+        )
@@ -10,10 +10,11 @@ from src.tools import (
 )
 
 
-def create_auditor_agent():
-    # Configura a API Key (já deve estar carregada pelo dotenv no main)
+def create_auditor_agent(model="gemini-2.5-flash"):
+    # Configura a API Key (já deve estar carregada pelo dotenv no main); um
+    # modelo local (ex.: `ModeloFalso`, nos testes de carga) não precisa dela
     api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
+    if isinstance(model, str) and not api_key:
         raise ValueError("GEMINI_API_KEY não encontrada.")
 
     # Define as instruções do sistema
@@ -36,7 +37,7 @@ def create_auditor_agent():
     # Cria o agente orquestrador
     agent = Agent(
         name="AuditorAgent",
-        model="gemini-2.5-flash",
+        model=model,
         tools=[compliance_tool, conspiracy_tool, simple_fraud_tool, complex_fraud_tool],
         instruction=instructions,
     )
@@ -0,0 +1,256 @@
+import threading
+import weakref
+from collections import namedtuple
+
+import numpy as np
+
+from src.telemetria import medir
+from src.texto import normalizar
+
+# --- Pré-filtro estatístico das transações (etapa 3 da fraude complexa) ---
+# Escore z robusto (mediana/MAD, Iglewicz e Hoaglin) acima do qual um valor é atípico
+LIMIAR_Z_ROBUSTO = 3.5
+# Grupos (funcionário ou categoria) menores que isso são comparados com o CSV todo
+MIN_TRANSACOES_GRUPO = 8
+# Compra fracionada: duas ou mais compras da mesma categoria, a até
+# JANELA_FRACIONADA_DIAS dias uma da outra, entre esta fração e 100% de uma
+# alçada de aprovação, somando pelo menos a alçada
+FRACAO_ABAIXO_ALCADA = 0.8
+JANELA_FRACIONADA_DIAS = 3
+# Duplicadas: mesmo funcionário e descrição, com até esta distância em dias;
+# quase duplicadas têm valores com diferença relativa até a tolerância
+JANELA_DUPLICADA_DIAS = 3
+TOLERANCIA_QUASE_DUPLICADA = 0.02
+# Dia da semana atípico: o funcionário compra nele menos que esta fração da sua
+# média por dia da semana (só para quem tem ao menos MIN_TRANSACOES_DIA_SEMANA)
+FRACAO_DIA_ATIPICO = 0.25
+MIN_TRANSACOES_DIA_SEMANA = 14
+# -------------------------------------------------------------------------
+
+# Códigos de motivo, na ordem das colunas da matriz de sinais, e o peso de cada
+# um na pontuação (os escores z somam z / LIMIAR_Z_ROBUSTO no lugar do peso)
+VALOR_ATIPICO_FUNCIONARIO = "valor_atipico_funcionario"
+VALOR_ATIPICO_CATEGORIA = "valor_atipico_categoria"
+COMPRA_FRACIONADA = "compra_fracionada"
+DUPLICADA = "duplicada"
+QUASE_DUPLICADA = "quase_duplicada"
+DIA_ATIPICO = "dia_atipico"
+MOTIVOS = (
+    VALOR_ATIPICO_FUNCIONARIO,
+    VALOR_ATIPICO_CATEGORIA,
+    COMPRA_FRACIONADA,
+    DUPLICADA,
+    QUASE_DUPLICADA,
+    DIA_ATIPICO,
+)
+PESOS = {
+    COMPRA_FRACIONADA: 2.0,
+    DUPLICADA: 2.0,
+    QUASE_DUPLICADA: 1.0,
+    DIA_ATIPICO: 0.5,
+}
+# Motivo das transações priorizadas por quem chama `candidatos` (por exemplo, as
+# citadas nos e-mails suspeitos); não é um sinal estatístico
+PRIORIZADA = "citada_nos_emails"
+
+# Transação do pré-filtro: posição na tabela, ID, pontuação e códigos de motivo
+Candidato = namedtuple("Candidato", "indice id_transacao pontuacao motivos")
+
+# --- Variáveis Globais para Caching ---
+# TabelaTransacoes -> {limiares: (pontuações, sinais)}; some junto com a tabela
+_sinais = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+# ------------------------------------
+
+
+def _medianas(grupos, valores, total_grupos):
+    """Mediana de `valores` em cada grupo (NaN nos vazios) e o tamanho dos grupos."""
+    ordem = np.lexsort((valores, grupos))
+    ordenados = valores[ordem]
+    contagens = np.bincount(grupos, minlength=total_grupos)
+    inicios = np.cumsum(contagens) - contagens
+    medianas = np.full(total_grupos, np.nan)
+    com_valores = contagens > 0
+    baixo = (inicios + (contagens - 1) // 2)[com_valores]
+    alto = (inicios + contagens // 2)[com_valores]
+    medianas[com_valores] = (ordenados[baixo] + ordenados[alto]) / 2
+    return medianas, contagens
+
+
+def z_robusto(valores, grupos):
+    """
+    Escore z robusto de cada valor dentro do seu grupo: (x - mediana) / (MAD / 0.6745).
+
+    Quando o MAD é zero (mais da metade do grupo com o mesmo valor), usa o desvio
+    absoluto médio (× 1.2533). Grupos com menos de `MIN_TRANSACOES_GRUPO` valores
+    são comparados com todas as transações (um funcionário com duas compras ou
+    uma categoria usada uma vez não têm distribuição própria). Sem dispersão, 0.
+    """
+    if not len(valores):
+        return np.zeros(0)
+    total = int(grupos.max()) + 1
+    # Grupo extra `total` com todos os valores, referência dos grupos pequenos
+    grupos_com_geral = np.concatenate([grupos, np.full(len(grupos), total)])
+    valores_com_geral = np.concatenate([valores, valores])
+    medianas, contagens = _medianas(grupos_com_geral, valores_com_geral, total + 1)
+    pequenos = contagens < MIN_TRANSACOES_GRUPO
+    medianas[pequenos] = medianas[total]
+
+    desvios = np.abs(valores_com_geral - medianas[grupos_com_geral])
+    mad, _ = _medianas(grupos_com_geral, desvios, total + 1)
+    desvio_medio = np.bincount(grupos_com_geral, desvios, total + 1) / np.maximum(
+        contagens, 1
+    )
+    escala = np.where(mad > 0, mad / 0.6745, desvio_medio * 1.2533)
+    escala[pequenos] = escala[total]
+
+    z = np.zeros(len(valores))
+    validos = escala[grupos] > 0
+    z[validos] = (valores[validos] - medianas[grupos[validos]]) / escala[grupos[validos]]
+    return z
+
+
+def _compras_fracionadas(funcionarios, categorias, dias, valores, limiares):
+    """
+    Compras logo abaixo de uma alçada que, somadas às do mesmo funcionário e
+    categoria feitas a até `JANELA_FRACIONADA_DIAS` dias delas, a ultrapassam.
+    """
+    marcadas = np.zeros(len(valores), dtype=bool)
+    # Chave ordenável (funcionário, categoria, dia), com um intervalo maior que a
+    # janela entre grupos para que as janelas não atravessem de um grupo a outro
+    extensao = int(dias.max() - dias.min()) + 2 * JANELA_FRACIONADA_DIAS + 1
+    grupos = funcionarios * (int(categorias.max()) + 1) + categorias
+    chaves = grupos * extensao + (dias - dias.min())
+    for limiar in limiares:
+        abaixo = np.flatnonzero(
+            (valores >= FRACAO_ABAIXO_ALCADA * limiar) & (valores < limiar)
+        )
+        if not len(abaixo):
+            continue
+        ordem = abaixo[np.argsort(chaves[abaixo], kind="stable")]
+        ordenadas = chaves[ordem]
+        inicio = np.searchsorted(ordenadas, ordenadas - JANELA_FRACIONADA_DIAS, "left")
+        fim = np.searchsorted(ordenadas, ordenadas + JANELA_FRACIONADA_DIAS, "right")
+        acumulado = np.concatenate([[0.0], np.cumsum(valores[ordem])])
+        somas = acumulado[fim] - acumulado[inicio]
+        marcadas[ordem[(fim - inicio >= 2) & (somas >= limiar)]] = True
+    return marcadas
+
+
+def _duplicadas(funcionarios, descricoes, dias, valores):
+    """
+    (duplicadas, quase duplicadas): pares vizinhos na ordenação por funcionário,
+    descrição normalizada e valor, a até `JANELA_DUPLICADA_DIAS` dias um do outro.
+    """
+    duplicadas = np.zeros(len(valores), dtype=bool)
+    quase = np.zeros(len(valores), dtype=bool)
+    if len(valores) < 2:
+        return duplicadas, quase
+    ordem = np.lexsort((dias, valores, descricoes, funcionarios))
+    a, b = ordem[:-1], ordem[1:]
+    mesmo_item = (
+        (funcionarios[a] == funcionarios[b])
+        & (descricoes[a] == descricoes[b])
+        & (np.abs(dias[a] - dias[b]) <= JANELA_DUPLICADA_DIAS)
+    )
+    centavos = np.round(valores * 100)
+    iguais = mesmo_item & (centavos[a] == centavos[b])
+    proximos = (
+        mesmo_item
+        & ~iguais
+        & (
+            np.abs(valores[a] - valores[b])
+            <= TOLERANCIA_QUASE_DUPLICADA * np.maximum(valores[a], valores[b])
+        )
+    )
+    duplicadas[a[iguais]] = duplicadas[b[iguais]] = True
+    quase[a[proximos]] = quase[b[proximos]] = True
+    return duplicadas, quase & ~duplicadas
+
+
+def _dias_atipicos(funcionarios, dias):
+    """Transações em dias da semana raros para o funcionário."""
+    dia_semana = (dias + 3) % 7  # 1970-01-01 foi uma quinta-feira; segunda = 0
+    total = int(funcionarios.max()) + 1
+    por_dia = np.bincount(funcionarios * 7 + dia_semana, minlength=total * 7)
+    por_funcionario = np.bincount(funcionarios, minlength=total)
+    esperado = por_funcionario[funcionarios] / 7
+    return (por_funcionario[funcionarios] >= MIN_TRANSACOES_DIA_SEMANA) & (
+        por_dia[funcionarios * 7 + dia_semana] <= FRACAO_DIA_ATIPICO * esperado
+    )
+
+
+def _calcular(tabela, limiares):
+    valores = np.asarray(tabela.valores, dtype=np.float64)
+    funcionarios = np.asarray(tabela.codigos["funcionario"], dtype=np.int64)
+    categorias = np.asarray(tabela.codigos["categoria"], dtype=np.int64)
+    dias = tabela.datas.astype("datetime64[D]").astype(np.int64)
+    # Descrições que só diferem em caixa ou acentos contam como a mesma
+    _, descricao_normalizada = np.unique(
+        [normalizar(str(d)) for d in tabela.rotulos["descricao"]], return_inverse=True
+    )
+    descricoes = descricao_normalizada.reshape(-1)[tabela.codigos["descricao"]]
+
+    z_funcionario = z_robusto(valores, funcionarios)
+    z_categoria = z_robusto(valores, categorias)
+    duplicadas, quase = _duplicadas(funcionarios, descricoes, dias, valores)
+    sinais = np.column_stack(
+        [
+            z_funcionario > LIMIAR_Z_ROBUSTO,
+            z_categoria > LIMIAR_Z_ROBUSTO,
+            _compras_fracionadas(funcionarios, categorias, dias, valores, limiares),
+            duplicadas,
+            quase,
+            _dias_atipicos(funcionarios, dias),
+        ]
+    )
+
+    pesos = np.array([PESOS.get(motivo, 0.0) for motivo in MOTIVOS])
+    pontuacoes = sinais @ pesos
+    pontuacoes += np.where(sinais[:, 0], z_funcionario / LIMIAR_Z_ROBUSTO, 0.0)
+    pontuacoes += np.where(sinais[:, 1], z_categoria / LIMIAR_Z_ROBUSTO, 0.0)
+    return pontuacoes, sinais
+
+
+def sinais_de_anomalia(tabela, limiares=()):
+    """
+    Pontuação e sinais de anomalia de todas as transações da tabela.
+
+    Retorna (pontuações, sinais): um float por transação (0 = nenhum sinal) e uma
+    matriz booleana (n, len(MOTIVOS)). `limiares` são as alçadas de aprovação
+    usadas na detecção de compras fracionadas. O cálculo é vetorizado sobre o CSV
+    inteiro e feito uma vez por tabela e conjunto de limiares.
+    """
+    limiares = tuple(sorted(float(limiar) for limiar in limiares))
+    with _lock:
+        por_limiares = _sinais.setdefault(tabela, {})
+        if limiares not in por_limiares:
+            with medir("anomalias.pontuar", transacoes=len(tabela)):
+                por_limiares[limiares] = _calcular(tabela, limiares)
+        return por_limiares[limiares]
+
+
+def candidatos(tabela, indices=None, limiares=(), prioritarios=()):
+    """
+    Transações de `indices` (todas, se None) da mais para a menos suspeita.
+
+    Nenhuma é descartada: quem chama envia ao LLM o começo da lista que couber no
+    orçamento. As posições em `prioritarios` vêm primeiro, com o motivo
+    `PRIORIZADA`; as demais seguem pela pontuação (as sem sinal, com pontuação 0,
+    no fim). Empates são desfeitos pelo maior valor.
+    """
+    pontuacoes, sinais = sinais_de_anomalia(tabela, limiares)
+    indices = np.arange(len(tabela)) if indices is None else np.asarray(indices)
+    priorizadas = np.isin(indices, np.asarray(list(prioritarios), dtype=np.int64))
+    ordem = np.lexsort(
+        (-tabela.valores[indices], -pontuacoes[indices], ~priorizadas)
+    )
+
+    lista = []
+    for posicao in ordem:
+        i = int(indices[posicao])
+        motivos = [motivo for motivo, ativo in zip(MOTIVOS, sinais[i]) if ativo]
+        if priorizadas[posicao]:
+            motivos.insert(0, PRIORIZADA)
+        lista.append(Candidato(i, str(tabela.ids[i]), float(pontuacoes[i]), motivos))
+    return lista
@@ -0,0 +1,228 @@
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from src.regras_compliance import secoes_da_politica
+
+# Banco SQLite com os resultados das auditorias anteriores
+AUDITORIA_DB = os.getenv("AUDITORIA_DB", ".cache/auditoria.sqlite3")
+
+# Versão do esquema do banco: um banco de versão anterior é recriado (os
+# resultados são refeitos na auditoria seguinte)
+VERSAO_ESQUEMA = 2
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS itens (
+    detector TEXT NOT NULL,
+    fonte TEXT NOT NULL,
+    chave TEXT NOT NULL,
+    hash_politica TEXT NOT NULL,
+    resultado TEXT NOT NULL,
+    analisado_em TEXT NOT NULL,
+    PRIMARY KEY (detector, fonte, chave, hash_politica)
+);
+CREATE TABLE IF NOT EXISTS marcas (
+    detector TEXT NOT NULL,
+    fonte TEXT NOT NULL,
+    hash_politica TEXT NOT NULL,
+    posicao INTEGER NOT NULL,
+    itens INTEGER NOT NULL,
+    verificacao TEXT NOT NULL,
+    atualizado_em TEXT NOT NULL,
+    PRIMARY KEY (detector, fonte, hash_politica)
+);
+"""
+
+# Marca d'água de uma fonte: bytes e itens (linhas do CSV, e-mails do dump) do
+# início do arquivo já auditados
+Marca = namedtuple("Marca", "posicao itens")
+SEM_MARCA = Marca(0, 0)
+
+
+def hash_politica(politica, secoes=None, versao=None):
+    """
+    Hash das seções da política de que um detector depende.
+
+    Só o texto das seções numeradas (`SEÇÃO N:`) entra no hash, com os espaços
+    normalizados: mudar o cabeçalho, o prefácio ou a formatação não invalida nada,
+    e com `secoes` (por exemplo, `("1", "2", "3")`) mudar uma seção que o detector
+    não usa também não. `versao` identifica o formato dos resultados do detector:
+    trocá-la descarta os resultados gravados em outro formato.
+    """
+    todas = secoes_da_politica(politica)
+    escolhidas = sorted(todas if secoes is None else set(secoes) & set(todas))
+    conteudo = "\n".join(f"{s}:{' '.join(todas[s].split())}" for s in escolhidas)
+    if versao is not None:
+        conteudo += f"\nversao:{versao}"
+    return hashlib.sha256(conteudo.encode("utf-8")).hexdigest()
+
+
+def _agora():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _verificacao(caminho, posicao):
+    """Hash dos `posicao` primeiros bytes do arquivo."""
+    h = hashlib.sha256()
+    restante = posicao
+    with open(caminho, "rb") as f:
+        while restante > 0:
+            bloco = f.read(min(1 << 16, restante))
+            if not bloco:
+                break
+            h.update(bloco)
+            restante -= len(bloco)
+    return h.hexdigest()
+
+
+class RegistroAuditoria:
+    """
+    Resultados persistentes das auditorias, para que cada execução analise só o
+    que mudou.
+
+    - `itens`: o resultado (lista JSON) de cada item analisado (ID de transação ou
+      de e-mail) por detector e arquivo de entrada, sob o hash da política usada.
+      Resultados de outras versões da política são mantidos: voltar a uma versão
+      anterior não exige nova análise.
+    - `marcas`: a marca d'água de cada arquivo de entrada por detector e versão da
+      política: até onde o arquivo foi lido e todos os seus itens registrados. Os
+      exports são "somente acréscimo", de modo que a auditoria seguinte lê só o
+      que vem depois da marca; se o trecho antes dela mudar, o arquivo foi
+      reescrito e os resultados daquele arquivo são descartados.
+
+    Cada operação abre sua própria conexão, de modo que o registro pode ser usado
+    de várias threads (as ferramentas rodam em `asyncio.to_thread`).
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._pronto = False
+
+    def _conectar(self):
+        if not self._pronto:
+            with self._lock:
+                if not self._pronto:
+                    pasta = os.path.dirname(self.caminho)
+                    if pasta:
+                        os.makedirs(pasta, exist_ok=True)
+                    with sqlite3.connect(self.caminho) as conexao:
+                        (versao,) = conexao.execute("PRAGMA user_version").fetchone()
+                        if versao < VERSAO_ESQUEMA:
+                            conexao.executescript(
+                                "DROP TABLE IF EXISTS itens; DROP TABLE IF EXISTS marcas;"
+                            )
+                        conexao.executescript(_ESQUEMA)
+                        conexao.execute(f"PRAGMA user_version = {VERSAO_ESQUEMA}")
+                    self._pronto = True
+        return sqlite3.connect(self.caminho, timeout=30)
+
+    def verificar_fonte(self, detector, caminho_fonte, hash_atual):
+        """
+        Confere a marca d'água de `caminho_fonte` para `detector` e esta versão da
+        política e retorna a `Marca` (bytes e itens já auditados). Retorna
+        `SEM_MARCA` na primeira vez ou se o arquivo foi reescrito, caso em que os
+        resultados do detector para esse arquivo são descartados.
+        """
+        fonte = os.path.abspath(caminho_fonte)
+        conexao = self._conectar()
+        try:
+            with conexao:
+                linha = conexao.execute(
+                    "SELECT posicao, itens, verificacao FROM marcas "
+                    "WHERE detector = ? AND fonte = ? AND hash_politica = ?",
+                    (detector, fonte, hash_atual),
+                ).fetchone()
+                if linha is None:
+                    return SEM_MARCA
+                posicao, itens, verificacao = linha
+                if (
+                    os.path.getsize(fonte) >= posicao
+                    and _verificacao(fonte, posicao) == verificacao
+                ):
+                    return Marca(posicao, itens)
+
+                print(
+                    f"[Auditoria] {os.path.basename(fonte)} foi reescrito desde a última "
+                    f"auditoria; os resultados de '{detector}' para ele serão refeitos."
+                )
+                for tabela in ("itens", "marcas"):
+                    conexao.execute(
+                        f"DELETE FROM {tabela} WHERE detector = ? AND fonte = ?",
+                        (detector, fonte),
+                    )
+                return SEM_MARCA
+        finally:
+            conexao.close()
+
+    def avancar_marca(self, detector, caminho_fonte, hash_atual, posicao, itens):
+        """
+        Move a marca d'água de `caminho_fonte` para `posicao` (bytes) e `itens`.
+
+        Só deve ser chamado depois que todos os itens até a posição foram
+        registrados com `registrar`: o que vem antes da marca não é relido.
+        """
+        fonte = os.path.abspath(caminho_fonte)
+        conexao = self._conectar()
+        try:
+            with conexao:
+                conexao.execute(
+                    "INSERT OR REPLACE INTO marcas VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        detector,
+                        fonte,
+                        hash_atual,
+                        posicao,
+                        itens,
+                        _verificacao(fonte, posicao),
+                        _agora(),
+                    ),
+                )
+        finally:
+            conexao.close()
+
+    def analisados(self, detector, caminho_fonte, hash_atual):
+        """{chave: resultado} dos itens da fonte já analisados sob esta versão da política."""
+        conexao = self._conectar()
+        try:
+            linhas = conexao.execute(
+                "SELECT chave, resultado FROM itens "
+                "WHERE detector = ? AND fonte = ? AND hash_politica = ?",
+                (detector, os.path.abspath(caminho_fonte), hash_atual),
+            ).fetchall()
+        finally:
+            conexao.close()
+        return {chave: json.loads(resultado) for chave, resultado in linhas}
+
+    def registrar(self, detector, caminho_fonte, hash_atual, resultados):
+        """Grava {chave: resultado} (resultado serializável em JSON) dos itens analisados."""
+        if not resultados:
+            return
+        fonte = os.path.abspath(caminho_fonte)
+        agora = _agora()
+        conexao = self._conectar()
+        try:
+            with conexao:
+                conexao.executemany(
+                    "INSERT OR REPLACE INTO itens VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            detector,
+                            fonte,
+                            str(chave),
+                            hash_atual,
+                            json.dumps(resultado, ensure_ascii=False),
+                            agora,
+                        )
+                        for chave, resultado in resultados.items()
+                    ],
+                )
+        finally:
+            conexao.close()
+
+
+registro_auditoria = RegistroAuditoria(AUDITORIA_DB)
@@ -0,0 +1,169 @@
+import math
+import re
+
+import numpy as np
+
+from src.texto import normalizar, palavras
+
+# Palavras que não ajudam a distinguir um chunk de outro
+PALAVRAS_VAZIAS = {
+    "a", "o", "as", "os", "um", "uma", "uns", "umas", "de", "da", "do", "das",
+    "dos", "e", "ou", "em", "no", "na", "nos", "nas", "ao", "aos", "para", "pra",
+    "por", "pelo", "pela", "com", "sem", "que", "qual", "quais", "quem", "como",
+    "onde", "quando", "se", "sobre", "me", "eu", "voce", "isso", "esse", "essa",
+    "este", "esta", "ser", "sao", "foi", "pode", "posso", "podemos", "diz",
+    "dizer", "fala", "existe", "ha", "tem", "acontece", "regra", "regras",
+    "politica", "the", "of", "to", "is", "and",
+}
+
+# Títulos de seção na política ("SEÇÃO 1: ..." e "1.1. DESPESAS ...")
+_TITULO_SECAO = re.compile(r"^\s*secao\s+(\d+)\s*:", re.MULTILINE)
+_TITULO_SUBSECAO = re.compile(r"^\s*(\d+\.\d+)\.\s", re.MULTILINE)
+# Referências a seções em uma pergunta ("seção 3", "item 1.1", "§ 2.1", "1.3"). Um
+# número solto só conta com a sintaxe de subseção e fora de valores ("$49.50",
+# "R$ 1.000", "49.5%")
+_REFERENCIA = re.compile(
+    r"(?:\b(?:secao|secoes|item|itens|clausula)\s+|§\s*)(\d+(?:\.\d+)*)"
+    r"|(?<![\w$.,])(?<!\$ )(\d{1,2}\.\d{1,2})(?![\w.,%])"
+)
+
+
+def _radical(palavra):
+    """
+    Stemming simples de plural ("armas" -> "arma"), como em `regras_compliance`, e
+    de infinitivo ("comprar" -> "compra", "assinar" -> "assina"), para que o verbo
+    da pergunta encontre o substantivo ou a conjugação usados na política.
+    """
+    if len(palavra) > 3 and palavra.endswith("s"):
+        palavra = palavra[:-1]
+    if len(palavra) > 4 and palavra.endswith(("ar", "er", "ir")):
+        palavra = palavra[:-1]
+    return palavra
+
+
+def termos(texto):
+    """
+    Termos indexados de um texto: as palavras normalizadas (sem as vazias e sem o
+    plural) e os bigramas de palavras vizinhas ("categoria c" -> "categoria_c"),
+    que premiam expressões exatas como nomes de categorias e cláusulas.
+    """
+    unigramas = [_radical(p) for p in palavras(texto) if p not in PALAVRAS_VAZIAS]
+    return unigramas + [f"{a}_{b}" for a, b in zip(unigramas, unigramas[1:])]
+
+
+def secoes_do_texto(texto):
+    """Seções cujos títulos aparecem no texto; uma subseção ("1.2") inclui a seção ("1")."""
+    texto = normalizar(texto)
+    secoes = set(_TITULO_SECAO.findall(texto))
+    for subsecao in _TITULO_SUBSECAO.findall(texto):
+        secoes.update({subsecao, subsecao.split(".")[0]})
+    return secoes
+
+
+def secoes_citadas(pergunta):
+    """Números de seção citados na pergunta, na ordem em que aparecem."""
+    return [a or b for a, b in _REFERENCIA.findall(normalizar(pergunta))]
+
+
+class IndiceBM25:
+    """
+    Índice lexical Okapi BM25 sobre os chunks da política.
+
+    Guarda, para cada termo (ver `termos`), os chunks em que ele aparece e a
+    frequência em cada um; a pontuação de uma consulta percorre só as listas dos
+    termos dela. Também registra as seções de cada chunk (as informadas em
+    `secoes` ou, se omitidas, as cujos títulos aparecem no texto), para responder
+    a referências como "seção 1.1" diretamente.
+    """
+
+    def __init__(self, textos, secoes=None, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.total = len(textos)
+        if secoes is None:
+            secoes = [secoes_do_texto(texto) for texto in textos]
+        self.secoes = [set(s) for s in secoes]
+
+        frequencias = {}
+        tamanhos = []
+        for indice, texto in enumerate(textos):
+            termos_doc = termos(texto)
+            tamanhos.append(len(termos_doc))
+            contagem = {}
+            for termo in termos_doc:
+                contagem[termo] = contagem.get(termo, 0) + 1
+            for termo, frequencia in contagem.items():
+                frequencias.setdefault(termo, []).append((indice, frequencia))
+
+        self._tamanhos = np.array(tamanhos, dtype="float32")
+        self._tamanho_medio = float(self._tamanhos.mean()) if tamanhos else 0.0
+        self._postings = {
+            termo: (
+                np.array([i for i, _ in lista], dtype="int64"),
+                np.array([f for _, f in lista], dtype="float32"),
+            )
+            for termo, lista in frequencias.items()
+        }
+
+    def idf(self, termo):
+        """IDF do termo (termos fora do vocabulário recebem o maior valor possível)."""
+        df = len(self._postings[termo][0]) if termo in self._postings else 0
+        return math.log(1 + (self.total - df + 0.5) / (df + 0.5))
+
+    def pontuar(self, consulta):
+        """Pontuação BM25 da consulta para cada chunk."""
+        pontuacoes = np.zeros(self.total, dtype="float32")
+        if not self.total:
+            return pontuacoes
+        normalizacao = self.k1 * (
+            1 - self.b + self.b * self._tamanhos / max(self._tamanho_medio, 1e-9)
+        )
+        for termo in set(termos(consulta)):
+            if termo not in self._postings:
+                continue
+            indices, frequencias = self._postings[termo]
+            pontuacoes[indices] += (
+                self.idf(termo)
+                * frequencias
+                * (self.k1 + 1)
+                / (frequencias + normalizacao[indices])
+            )
+        return pontuacoes
+
+    def buscar(self, consulta, k):
+        """Até `k` pares (índice do chunk, pontuação), só com pontuação positiva."""
+        pontuacoes = self.pontuar(consulta)
+        ordem = np.argsort(-pontuacoes, kind="stable")[:k]
+        return [(int(i), float(pontuacoes[i])) for i in ordem if pontuacoes[i] > 0]
+
+    def cobertura(self, consulta, indice):
+        """
+        Fração do peso (IDF) das palavras da consulta que aparecem no chunk. 1.0
+        significa que todas as palavras informativas da pergunta estão no chunk.
+        """
+        unigramas = {t for t in termos(consulta) if "_" not in t}
+        if not unigramas:
+            return 0.0
+        total = sum(self.idf(t) for t in unigramas)
+        presentes = sum(
+            self.idf(t)
+            for t in unigramas
+            if t in self._postings and indice in self._postings[t][0]
+        )
+        return presentes / total
+
+    def expressao_exclusiva(self, consulta, indice):
+        """
+        Se algum bigrama da consulta (uma expressão exata, como "categoria c")
+        aparece no chunk `indice` e em nenhum outro.
+        """
+        return any(
+            t in self._postings and self._postings[t][0].tolist() == [indice]
+            for t in termos(consulta)
+            if "_" in t
+        )
+
+    def chunks_das_secoes(self, secoes):
+        """Chunks de alguma das seções, na ordem do documento."""
+        secoes = set(secoes)
+        return [i for i, do_chunk in enumerate(self.secoes) if do_chunk & secoes]
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def _normalizar_pergunta(pergunta):
+    return " ".join(pergunta.lower().split())
+
+
+class CacheRespostas:
+    """
+    Cache semântico de respostas do chatbot de compliance.
+
+    Cada entrada guarda o embedding da pergunta (None quando a pergunta foi
+    respondida pela busca lexical, sem embedding), os IDs dos chunks recuperados e
+    a resposta gerada. Uma nova pergunta reaproveita a resposta quando sua distância
+    de cosseno para uma pergunta em cache é menor que `distancia_maxima` e os chunks
+    recuperados são os mesmos. A remoção segue LRU (`max_entradas`) e TTL
+    (`ttl_segundos`). Todas as entradas são descartadas quando a versão do índice
+    muda (ver `definir_versao`).
+    """
+
+    def __init__(
+        self, distancia_maxima=0.08, max_entradas=512, ttl_segundos=86400, caminho=None
+    ):
+        self.distancia_maxima = distancia_maxima
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.caminho = caminho
+        self.versao = None
+        self._entradas = OrderedDict()  # pergunta normalizada -> entrada
+        # Embeddings normalizados, na ordem de _chaves_matriz (independente da ordem
+        # LRU); refeita só quando entradas são incluídas ou removidas
+        self._matriz = None
+        self._chaves_matriz = []
+        self._lock = threading.Lock()
+        if caminho:
+            self._carregar()
+
+    def definir_versao(self, versao):
+        """Associa o cache a uma versão do índice, descartando entradas de outras versões."""
+        with self._lock:
+            if self.versao != versao:
+                self.versao = versao
+                self._entradas.clear()
+                self._matriz = None
+                self._salvar()
+
+    def buscar_exata(self, pergunta):
+        """Retorna a resposta de uma pergunta textualmente idêntica (sem embedding)."""
+        with self._lock:
+            self._remover_expiradas()
+            chave = _normalizar_pergunta(pergunta)
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            self._entradas.move_to_end(chave)
+            return entrada["resposta"]
+
+    def buscar(self, embedding, ids_chunks):
+        """Retorna a resposta de uma pergunta semanticamente próxima, ou None."""
+        with self._lock:
+            self._remover_expiradas()
+            if self._matriz is None:
+                self._chaves_matriz = [
+                    c for c, e in self._entradas.items() if e["embedding"] is not None
+                ]
+                self._matriz = np.array(
+                    [self._entradas[c]["embedding"] for c in self._chaves_matriz],
+                    dtype="float32",
+                )
+            if not self._chaves_matriz:
+                return None
+
+            consulta = _unitario(embedding)
+            distancias = 1.0 - self._matriz @ consulta
+            chaves = self._chaves_matriz
+            ids_chunks = list(ids_chunks)
+            for posicao in np.argsort(distancias):
+                if distancias[posicao] > self.distancia_maxima:
+                    break
+                chave = chaves[posicao]
+                if self._entradas[chave]["ids_chunks"] == ids_chunks:
+                    self._entradas.move_to_end(chave)
+                    return self._entradas[chave]["resposta"]
+            return None
+
+    def guardar(self, pergunta, embedding, ids_chunks, resposta):
+        with self._lock:
+            chave = _normalizar_pergunta(pergunta)
+            self._entradas[chave] = {
+                "embedding": None if embedding is None else _unitario(embedding).tolist(),
+                "ids_chunks": [int(i) for i in ids_chunks],
+                "resposta": resposta,
+                "criado_em": time.time(),
+            }
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+            self._matriz = None
+            self._salvar()
+
+    def _remover_expiradas(self):
+        if not self.ttl_segundos:
+            return
+        limite = time.time() - self.ttl_segundos
+        expiradas = [c for c, e in self._entradas.items() if e["criado_em"] < limite]
+        for chave in expiradas:
+            del self._entradas[chave]
+        if expiradas:
+            self._matriz = None
+
+    def _carregar(self):
+        if not os.path.exists(self.caminho):
+            return
+        try:
+            with open(self.caminho, "r", encoding="utf-8") as f:
+                dados = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[Compliance] Cache de respostas ignorado: {e}")
+            return
+        self.versao = dados.get("versao")
+        self._entradas = OrderedDict(dados.get("entradas", []))
+
+    def _salvar(self):
+        if not self.caminho:
+            return
+        diretorio = os.path.dirname(self.caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        temporario = f"{self.caminho}.tmp"
+        try:
+            with open(temporario, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"versao": self.versao, "entradas": list(self._entradas.items())},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(temporario, self.caminho)
+        except OSError as e:
+            print(f"[Compliance] Não foi possível salvar o cache de respostas: {e}")
+
+
+def _unitario(vetor):
+    vetor = np.asarray(vetor, dtype="float32").reshape(-1)
+    norma = np.linalg.norm(vetor)
+    return vetor / norma if norma else vetor
@@ -0,0 +1,118 @@
+"""
+Gerador de carga para o servidor HTTP/SSE do auditor.
+
+Simula `--usuarios` usuários simultâneos, cada um enviando `--turnos` mensagens
+em sequência para `POST /chat`, e mede no cliente a vazão e os percentis do
+tempo até o primeiro trecho de texto e da latência total de cada turno. Ao final
+exibe também as `/metricas` do servidor. Exemplo, com o modelo falso:
+
+    python main.py --servidor --modelo-falso
+    python -m src.carga --usuarios 50 --turnos 4
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+async def _requisitar(host, porta, metodo, caminho, dados=None):
+    """Abre a conexão, envia a requisição e retorna (status, reader, writer)."""
+    reader, writer = await asyncio.open_connection(host, porta)
+    corpo = json.dumps(dados).encode("utf-8") if dados is not None else b""
+    writer.write(
+        (
+            f"{metodo} {caminho} HTTP/1.1\r\n"
+            f"Host: {host}:{porta}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1")
+        + corpo
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+        pass
+    return status, reader, writer
+
+
+async def _turno(host, porta, usuario, mensagem):
+    """Executa um turno e retorna (status, primeiro_token, total) medidos no cliente."""
+    inicio = time.perf_counter()
+    primeiro_token = None
+    status, reader, writer = await _requisitar(
+        host, porta, "POST", "/chat", {"usuario": usuario, "mensagem": mensagem}
+    )
+    try:
+        if status != 200:
+            return status, None, time.perf_counter() - inicio
+        async for linha in reader:
+            if linha.startswith(b"event: texto") and primeiro_token is None:
+                primeiro_token = time.perf_counter() - inicio
+            elif linha.startswith(b"event: erro"):
+                status = 500
+    finally:
+        writer.close()
+    return status, primeiro_token, time.perf_counter() - inicio
+
+
+async def _usuario(host, porta, usuario, turnos, mensagem, resultados):
+    for i in range(turnos):
+        try:
+            resultados.append(
+                await _turno(host, porta, usuario, f"{mensagem} ({usuario}, {i + 1})")
+            )
+        except (ConnectionError, OSError, ValueError, IndexError):
+            resultados.append((0, None, None))
+
+
+def _resumo(nome, amostras):
+    if not amostras:
+        return f"{nome}: sem amostras"
+    p50, p95, p99 = np.percentile(amostras, [50, 95, 99])
+    return f"{nome}: p50 {p50:.3f} s | p95 {p95:.3f} s | p99 {p99:.3f} s"
+
+
+async def executar_carga(host, porta, usuarios, turnos, mensagem="Olá, auditor"):
+    """Roda a carga e retorna a lista de (status, primeiro_token, total) por turno."""
+    resultados = []
+    inicio = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _usuario(host, porta, f"carga-{u}", turnos, mensagem, resultados)
+            for u in range(usuarios)
+        )
+    )
+    duracao = time.perf_counter() - inicio
+
+    ok = [r for r in resultados if r[0] == 200]
+    print(f"[Carga] {usuarios} usuários x {turnos} turnos em {duracao:.2f} s")
+    print(
+        f"[Carga] Turnos concluídos: {len(ok)}/{len(resultados)}"
+        f" | vazão: {len(ok) / duracao:.2f} turnos/s"
+    )
+    print("[Carga] " + _resumo("Primeiro token", [r[1] for r in ok if r[1] is not None]))
+    print("[Carga] " + _resumo("Total do turno", [r[2] for r in ok]))
+
+    status, reader, writer = await _requisitar(host, porta, "GET", "/metricas")
+    metricas = json.loads(await reader.read())
+    writer.close()
+    print("[Carga] Métricas do servidor:")
+    print(json.dumps(metricas, indent=2, ensure_ascii=False))
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga do servidor do auditor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8080)
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--turnos", type=int, default=3)
+    parser.add_argument("--mensagem", default="Olá, auditor")
+    args = parser.parse_args()
+    asyncio.run(
+        executar_carga(args.host, args.porta, args.usuarios, args.turnos, args.mensagem)
+    )
@@ -0,0 +1,538 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+
+from src.telemetria import anotar, medir, uso_de
+
+# Modelo generativo usado por todos os analisadores
+MODELO_PADRAO = "gemini-2.5-flash"
+
+# --- Cache de respostas do LLM ---
+# Diretório das respostas gravadas (um arquivo JSON por chamada)
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", ".cache/llm")
+# Tamanho máximo do cache em disco; as respostas menos usadas são removidas antes
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "256"))
+# "gravar": usa o cache e grava respostas novas (padrão)
+# "reproduzir": responde apenas do cache, sem chamadas de rede
+# "desligado": sempre chama a API
+LLM_CACHE_MODO = os.getenv("LLM_CACHE_MODO", "gravar")
+MODOS = ("gravar", "reproduzir", "desligado")
+# ---------------------------------
+
+# --- Cache de contexto (prefixo compartilhado dos prompts) ---
+# "gemini": registra o prefixo como CachedContent na API (armazenamento cobrado)
+# "local": substituto offline que apenas contabiliza os tokens economizados
+# "desligado": envia o prefixo em todas as chamadas
+LLM_CONTEXTO_CACHE = os.getenv("LLM_CONTEXTO_CACHE", "local")
+# Validade de cada contexto registrado, em segundos
+LLM_CONTEXTO_TTL = int(os.getenv("LLM_CONTEXTO_TTL", "3600"))
+BACKENDS_CONTEXTO = ("gemini", "local", "desligado")
+# Antecedência com que um contexto é renovado antes de expirar, em segundos
+MARGEM_RENOVACAO = 60
+# Estimativa grosseira de tokens (~4 caracteres por token)
+CARACTERES_POR_TOKEN = 4
+# ------------------------------------------------------------
+
+# Orçamento de tokens de entrada por requisição usado pelo empacotador de prompts
+LLM_ORCAMENTO_TOKENS = int(os.getenv("LLM_ORCAMENTO_TOKENS", "24000"))
+
+# --- Clientes compartilhados ---
+# Requisições simultâneas ao LLM no processo inteiro (todas as ferramentas)
+LLM_POOL = int(os.getenv("LLM_POOL", "8"))
+# Tempo máximo de cada requisição, em segundos
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+# Transporte do SDK ("grpc" mantém um único canal HTTP/2 multiplexado; ou "rest")
+LLM_TRANSPORTE = os.getenv("LLM_TRANSPORTE", "grpc")
+# -------------------------------
+
+# Lote de linhas de um prompt: `textos[inicio:fim]`, com `tokens` estimados e a
+# fração do espaço disponível que eles ocupam
+Lote = namedtuple("Lote", "inicio fim tokens ocupacao")
+
+
+# --- Variáveis Globais para Caching ---
+_genai = None  # SDK importado e configurado na primeira chamada
+_lock_sdk = threading.Lock()
+_modelos = {}  # (modelo, generation_config, contexto) -> GenerativeModel
+_lock_modelos = threading.Lock()
+_vagas = threading.BoundedSemaphore(LLM_POOL)
+_timeout = LLM_TIMEOUT
+# ------------------------------------
+
+
+def _sdk():
+    """
+    Importa e configura o SDK do Gemini na primeira chamada ao LLM.
+
+    Importar este módulo não tem efeitos colaterais: o `.env` é lido, a chave é
+    validada e `genai.configure` é chamado só quando o modelo é usado de fato.
+    """
+    global _genai
+    if _genai is None:
+        with _lock_sdk:
+            if _genai is None:
+                import dotenv
+                import google.generativeai as genai
+
+                dotenv.load_dotenv()
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    raise ValueError(
+                        "A chave de API do Gemini não foi encontrada. Defina a variável de ambiente GEMINI_API_KEY."
+                    )
+                genai.configure(api_key=api_key, transport=LLM_TRANSPORTE)
+                _genai = genai
+    return _genai
+
+
+def configurar_clientes(tamanho_pool=None, timeout=None):
+    """Ajusta o número de requisições simultâneas e o timeout (em segundos) do LLM."""
+    global _vagas, _timeout
+    if tamanho_pool is not None:
+        _vagas = threading.BoundedSemaphore(tamanho_pool)
+    if timeout is not None:
+        _timeout = timeout
+
+
+def modelo_compartilhado(modelo=MODELO_PADRAO, generation_config=None, contexto=None):
+    """
+    Retorna o `GenerativeModel` do par (modelo, generation_config), criado uma vez.
+
+    Todas as ferramentas compartilham as mesmas instâncias e, por meio delas, o
+    cliente do SDK e sua conexão. `contexto` é um `CachedContent`, para modelos
+    que respondem a partir de um prefixo em cache.
+    """
+    chave = (
+        modelo,
+        json.dumps(generation_config or {}, sort_keys=True),
+        getattr(contexto, "name", None),
+    )
+    with _lock_modelos:
+        model = _modelos.get(chave)
+        if model is None:
+            genai = _sdk()
+            if contexto is not None:
+                model = genai.GenerativeModel.from_cached_content(
+                    contexto, generation_config=generation_config
+                )
+            else:
+                model = genai.GenerativeModel(modelo, generation_config=generation_config)
+            _modelos[chave] = model
+        return model
+
+
+def _descartar_modelos(contexto):
+    """Remove do registro os modelos ligados a um contexto que expirou."""
+    nome = getattr(contexto, "name", None)
+    with _lock_modelos:
+        for chave in [c for c in _modelos if c[2] == nome]:
+            del _modelos[chave]
+
+
+def _requisitar(funcao, *args, **kwargs):
+    """Executa uma requisição ao LLM respeitando o pool e o timeout configurados."""
+    with _vagas:
+        resposta = funcao(*args, request_options={"timeout": _timeout}, **kwargs)
+    anotar(requisicoes=1, **uso_de(resposta))
+    return resposta
+
+
+def estimar_tokens(texto):
+    """Estimativa rápida, sem chamada à API, do número de tokens de um texto."""
+    return len(texto) // CARACTERES_POR_TOKEN + 1
+
+
+def empacotar(
+    textos, orcamento_tokens=LLM_ORCAMENTO_TOKENS, tokens_fixos=0, max_itens=None
+):
+    """
+    Divide `textos` (linhas já formatadas) em lotes consecutivos que cabem no orçamento.
+
+    Cada lote recebe linhas enquanto a soma estimada couber em
+    `orcamento_tokens - tokens_fixos` (a parte fixa do prompt: instruções,
+    política) e, se `max_itens` for informado, até esse número de linhas. As
+    linhas nunca são cortadas: uma linha maior que o espaço disponível vai sozinha
+    em um lote com ocupação acima de 1.
+    """
+    disponivel = max(orcamento_tokens - tokens_fixos, 1)
+    lotes = []
+    inicio = 0
+    tokens = 0
+    for i, texto in enumerate(textos):
+        tokens_texto = estimar_tokens(texto)
+        cheio = tokens + tokens_texto > disponivel or (
+            max_itens is not None and i - inicio >= max_itens
+        )
+        if i > inicio and cheio:
+            lotes.append(Lote(inicio, i, tokens, tokens / disponivel))
+            inicio = i
+            tokens = 0
+        tokens += tokens_texto
+    if inicio < len(textos):
+        lotes.append(Lote(inicio, len(textos), tokens, tokens / disponivel))
+    return lotes
+
+
+def descrever_ocupacao(lotes):
+    """Resumo da ocupação dos lotes para as mensagens de progresso."""
+    if not lotes:
+        return "nenhum lote"
+    ocupacoes = [lote.ocupacao for lote in lotes]
+    return (
+        f"{len(lotes)} lote(s), ocupação média {sum(ocupacoes) / len(ocupacoes):.0%} "
+        f"(mín. {min(ocupacoes):.0%}, máx. {max(ocupacoes):.0%})"
+    )
+
+
+class CacheLLM:
+    """
+    Cache em disco endereçado por conteúdo para chamadas ao LLM.
+
+    A chave é o hash SHA-256 da chamada (tipo, modelo, configuração de geração,
+    prompt/conteúdo e task_type); cada resposta fica em
+    `<diretorio>/<2 primeiros caracteres>/<chave>.json`. O mtime dos arquivos
+    registra o último uso e, quando o total passa de `max_bytes`, os arquivos
+    usados há mais tempo são removidos (LRU).
+    """
+
+    def __init__(self, diretorio, max_bytes):
+        self.diretorio = diretorio
+        self.max_bytes = max_bytes
+        self._tamanhos = None  # chave -> (último uso, bytes), carregado sob demanda
+        self._total = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def chave(**chamada):
+        texto = json.dumps(chamada, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, chave[:2], f"{chave}.json")
+
+    def _carregar_tamanhos(self):
+        if self._tamanhos is not None:
+            return
+        self._tamanhos = {}
+        self._total = 0
+        if not os.path.isdir(self.diretorio):
+            return
+        for pasta, _, arquivos in os.walk(self.diretorio):
+            for arquivo in arquivos:
+                if not arquivo.endswith(".json"):
+                    continue
+                estado = os.stat(os.path.join(pasta, arquivo))
+                self._tamanhos[arquivo[:-5]] = (estado.st_mtime, estado.st_size)
+                self._total += estado.st_size
+
+    def buscar(self, chave):
+        """Retorna o valor gravado para a chave, ou None."""
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "r", encoding="utf-8") as f:
+                valor = json.load(f)["valor"]
+        except (OSError, ValueError, KeyError):
+            return None
+        with self._lock:
+            self._carregar_tamanhos()
+            try:
+                os.utime(caminho)
+                estado = os.stat(caminho)
+                self._tamanhos[chave] = (estado.st_mtime, estado.st_size)
+            except OSError:
+                pass
+        return valor
+
+    def guardar(self, chave, valor):
+        caminho = self._caminho(chave)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        temporario = f"{caminho}.{threading.get_ident()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump({"valor": valor}, f, ensure_ascii=False)
+        os.replace(temporario, caminho)
+
+        with self._lock:
+            self._carregar_tamanhos()
+            estado = os.stat(caminho)
+            anterior = self._tamanhos.get(chave, (0, 0))[1]
+            self._tamanhos[chave] = (estado.st_mtime, estado.st_size)
+            self._total += estado.st_size - anterior
+            self._remover_excedentes()
+
+    def remover(self, chave):
+        """Descarta o valor gravado para a chave, se houver."""
+        try:
+            os.remove(self._caminho(chave))
+        except OSError:
+            return
+        with self._lock:
+            if self._tamanhos is not None and chave in self._tamanhos:
+                self._total -= self._tamanhos.pop(chave)[1]
+
+    def _remover_excedentes(self):
+        if self._total <= self.max_bytes:
+            return
+        for chave, (_, tamanho) in sorted(self._tamanhos.items(), key=lambda i: i[1][0]):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._caminho(chave))
+            except OSError:
+                pass
+            del self._tamanhos[chave]
+            self._total -= tamanho
+
+
+class ContextosEmCache:
+    """
+    Registra prefixos de prompt repetidos (instruções + política) uma única vez.
+
+    Cada prefixo é identificado pelo modelo e pelo hash do seu conteúdo; quando o
+    texto muda (por exemplo, a política foi editada), um novo contexto é criado e
+    o anterior deixa de ser usado até expirar. Contextos são renovados ao se
+    aproximar do TTL. A criação e a remoção (chamadas de rede) acontecem fora do
+    lock: chamadas concorrentes com o mesmo prefixo esperam o contexto em criação,
+    e as demais seguem sem esperar.
+
+    No backend "gemini" o prefixo vira um `CachedContent` e cada chamada envia só
+    o restante do prompt. No backend "local" o prompt completo é enviado, mas os
+    tokens que o cache teria economizado são contabilizados, permitindo medir o
+    ganho offline. Se a API recusar o cache (por exemplo, prefixo curto demais), a
+    chamada segue com o prompt completo.
+    """
+
+    def __init__(self, backend, ttl_segundos):
+        if backend not in BACKENDS_CONTEXTO:
+            raise ValueError(
+                f"Backend de contexto inválido: {backend!r}. Use um de {BACKENDS_CONTEXTO}."
+            )
+        self.backend = backend
+        self.ttl_segundos = ttl_segundos
+        self._contextos = {}  # (modelo, hash do prefixo) -> (expira_em, Future do contexto)
+        self._lock = threading.Lock()
+        self.estatisticas = {
+            "contextos_criados": 0,
+            "chamadas_com_prefixo": 0,
+            "tokens_prefixo_economizados": 0,
+        }
+
+    def _criar(self, modelo, prefixo):
+        if self.backend == "local":
+            return "local"
+        nome_modelo = modelo if modelo.startswith("models/") else f"models/{modelo}"
+        try:
+            return _sdk().caching.CachedContent.create(
+                model=nome_modelo,
+                contents=[prefixo],
+                ttl=datetime.timedelta(seconds=self.ttl_segundos),
+            )
+        except Exception as e:
+            print(f"[LLM] Cache de contexto indisponível, enviando o prompt completo: {e}")
+            return None
+
+    @staticmethod
+    def _remover(contexto):
+        if contexto is None or contexto == "local":
+            return
+        _descartar_modelos(contexto)
+        try:
+            contexto.delete()
+        except Exception:
+            pass
+
+    def obter(self, modelo, prefixo):
+        """
+        Retorna (contexto, criado_agora) para o prefixo.
+
+        `contexto` é None quando o prefixo deve ser enviado no prompt.
+        """
+        hash_prefixo = hashlib.sha256(prefixo.encode("utf-8")).hexdigest()
+        agora = time.monotonic()
+        vencidos = []
+        with self._lock:
+            atual = self._contextos.get((modelo, hash_prefixo))
+            if atual is None or atual[0] <= agora:
+                # Remove os contextos vencidos (inclusive os de prefixos que mudaram)
+                for chave, (expira_em, futuro) in list(self._contextos.items()):
+                    if expira_em <= agora and futuro.done():
+                        vencidos.append(futuro.result())
+                        del self._contextos[chave]
+                futuro = Future()
+                validade = max(self.ttl_segundos - MARGEM_RENOVACAO, 1)
+                self._contextos[(modelo, hash_prefixo)] = (agora + validade, futuro)
+                atual = None
+
+        if atual is not None:
+            return atual[1].result(), False
+
+        for contexto in vencidos:
+            self._remover(contexto)
+        contexto = None
+        try:
+            contexto = self._criar(modelo, prefixo)
+        finally:
+            futuro.set_result(contexto)
+        if contexto is not None:
+            with self._lock:
+                self.estatisticas["contextos_criados"] += 1
+        return contexto, contexto is not None
+
+    def gerar(self, modelo, generation_config, prefixo, prompt):
+        contexto, criado_agora = self.obter(modelo, prefixo)
+        economizados = 0
+
+        if contexto is None or contexto == "local":
+            model = modelo_compartilhado(modelo, generation_config)
+            response = _requisitar(model.generate_content, prefixo + prompt)
+            if contexto == "local" and not criado_agora:
+                economizados = estimar_tokens(prefixo)
+        else:
+            model = modelo_compartilhado(modelo, generation_config, contexto)
+            response = _requisitar(model.generate_content, prompt)
+            uso = getattr(response, "usage_metadata", None)
+            economizados = getattr(uso, "cached_content_token_count", 0) or 0
+
+        with self._lock:
+            self.estatisticas["chamadas_com_prefixo"] += 1
+            self.estatisticas["tokens_prefixo_economizados"] += economizados
+        return response.text
+
+
+# --- Variáveis Globais para Caching ---
+cache_llm = CacheLLM(LLM_CACHE_DIR, int(LLM_CACHE_MAX_MB * 1024 * 1024))
+modo_cache = LLM_CACHE_MODO
+contextos = ContextosEmCache(LLM_CONTEXTO_CACHE, LLM_CONTEXTO_TTL)
+# ------------------------------------
+
+
+def definir_modo_cache(modo):
+    """Altera o modo do cache de respostas ("gravar", "reproduzir" ou "desligado")."""
+    global modo_cache
+    if modo not in MODOS:
+        raise ValueError(f"Modo de cache inválido: {modo!r}. Use um de {MODOS}.")
+    modo_cache = modo
+
+
+def definir_backend_contexto(backend, ttl_segundos=None):
+    """Troca o backend do cache de contexto ("gemini", "local" ou "desligado")."""
+    global contextos
+    contextos = ContextosEmCache(backend, ttl_segundos or LLM_CONTEXTO_TTL)
+
+
+def estatisticas_contexto():
+    """Contadores do cache de contexto: contextos criados, chamadas e tokens economizados."""
+    return dict(contextos.estatisticas)
+
+
+def descrever_contexto(antes=None):
+    """
+    Resumo do cache de contexto para as mensagens de progresso, desde `antes`
+    (um retorno anterior de `estatisticas_contexto`) ou desde o início do processo.
+    """
+    atual = estatisticas_contexto()
+    antes = antes or {}
+    delta = {chave: valor - antes.get(chave, 0) for chave, valor in atual.items()}
+    return (
+        f"backend {contextos.backend}, {delta['contextos_criados']} contexto(s) criado(s), "
+        f"{delta['chamadas_com_prefixo']} chamada(s) com prefixo, "
+        f"~{delta['tokens_prefixo_economizados']} tokens de prefixo economizados"
+    )
+
+
+def _com_cache(chamada, executar, aceitar=None):
+    """
+    Resolve a chamada pelo cache conforme o modo atual, executando-a se preciso.
+
+    Com `aceitar`, só respostas para as quais `aceitar(valor)` é verdadeiro são
+    gravadas; uma resposta gravada que não passa (de antes do critério existir)
+    é descartada e a chamada refeita, exceto no modo "reproduzir".
+    """
+    if modo_cache == "desligado":
+        return executar()
+
+    chave = CacheLLM.chave(**chamada)
+    valor = cache_llm.buscar(chave)
+    if valor is not None and (
+        aceitar is None or modo_cache == "reproduzir" or aceitar(valor)
+    ):
+        anotar(cache_respostas=True)
+        return valor
+    if modo_cache == "reproduzir":
+        raise LookupError(
+            f"Chamada {chamada['tipo']} ao modelo {chamada['modelo']} não está no cache "
+            "(modo reproduzir)."
+        )
+
+    valor = executar()
+    if aceitar is None or aceitar(valor):
+        cache_llm.guardar(chave, valor)
+    else:
+        cache_llm.remover(chave)
+        anotar(resposta_rejeitada=True)
+    return valor
+
+
+def gerar(
+    prompt, modelo=MODELO_PADRAO, generation_config=None, prefixo=None, aceitar=None
+):
+    """
+    Gera texto com o modelo informado e retorna o texto da resposta.
+
+    Todas as chamadas generativas do projeto passam por aqui, para que respostas
+    a prompts idênticos sejam servidas do cache em disco. `prefixo` é a parte fixa
+    do prompt (instruções + política) repetida entre lotes: ela é enviada antes de
+    `prompt` e registrada uma única vez no cache de contexto. `aceitar(texto)`
+    decide se a resposta pode ir para o cache: uma resposta fora do esquema não
+    é gravada, e repetir a chamada (a revalidação) consulta o modelo de novo em
+    vez de reproduzir o mesmo erro.
+    """
+    chamada = {
+        "tipo": "generate_content",
+        "modelo": modelo,
+        "generation_config": generation_config or {},
+        "prompt": (prefixo or "") + prompt,
+    }
+
+    def executar():
+        if prefixo and contextos.backend != "desligado":
+            return contextos.gerar(modelo, generation_config, prefixo, prompt)
+        model = modelo_compartilhado(modelo, generation_config)
+        return _requisitar(model.generate_content, (prefixo or "") + prompt).text
+
+    with medir("llm.gerar", modelo=modelo):
+        return _com_cache(chamada, executar, aceitar)
+
+
+def gerar_embeddings(conteudo, modelo, task_type):
+    """
+    Calcula embeddings de um texto ou de uma lista de textos.
+
+    Retorna o mesmo que `result["embedding"]` de `genai.embed_content`: um vetor
+    para um texto ou uma lista de vetores para uma lista de textos.
+    """
+    chamada = {
+        "tipo": "embed_content",
+        "modelo": modelo,
+        "task_type": task_type,
+        "conteudo": conteudo,
+    }
+
+    def executar():
+        result = _requisitar(
+            _sdk().embed_content, model=modelo, content=conteudo, task_type=task_type
+        )
+        # A API de embeddings não devolve a contagem de tokens: estima-se pelo texto
+        textos = [conteudo] if isinstance(conteudo, str) else conteudo
+        anotar(
+            tokens_entrada=sum(estimar_tokens(t) for t in textos), tokens_estimados=True
+        )
+        return result["embedding"]
+
+    itens = 1 if isinstance(conteudo, str) else len(conteudo)
+    with medir("llm.embeddings", modelo=modelo, itens=itens):
+        return _com_cache(chamada, executar)
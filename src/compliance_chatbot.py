@@ -1,107 +1,575 @@
+import hashlib
+import json
 import os
+import shutil
+import tempfile
+import threading
 
-import dotenv
-import faiss
-import google.generativeai as genai
 import numpy as np
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-
-# Carrega as variáveis de ambiente
-dotenv.load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError(
-        "A chave de API do Gemini não foi encontrada. Defina a variável de ambiente GEMINI_API_KEY."
-    )
 
-genai.configure(api_key=api_key)
+from src.bm25 import IndiceBM25, secoes_citadas
+from src.cache_respostas import CacheRespostas
+from src.cliente_llm import gerar, gerar_embeddings
+from src.corpus import (
+    TIPO_EMAIL,
+    TIPO_POLITICA,
+    TIPO_TRANSACOES,
+    TIPOS_DOCUMENTO,
+    documentos_da_politica,
+    documentos_das_transacoes,
+    documentos_dos_emails,
+    rotulo,
+)
+from src.divisor_politica import TAMANHO_MAXIMO_CHUNK
+from src.embeddings import dividir_em_lotes, gerar_embeddings_em_lotes
+from src.execucao_paralela import executar_em_paralelo
+from src.indice_vetorial import (
+    FAISS_TIPO,
+    buscar,
+    configurar_busca,
+    construir_indice,
+    descrever_indice,
+)
+
+# faiss e langchain são importados apenas quando o índice é carregado ou construído
+
+# --- Configuração do índice ---
+EMBEDDING_MODEL = "models/text-embedding-004"
+# Versão do divisor de chunks e dos resumos (entra na chave do índice em disco)
+DIVISOR_CHUNKS = "secoes-v1"
+VERSAO_CORPUS = "corpus-v1"
+# Número de lotes de embedding processados em paralelo
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "4"))
+# Diretório onde o índice FAISS, os chunks e os embeddings ficam persistidos
+CACHE_DIR = os.getenv("COMPLIANCE_CACHE_DIR", ".cache/compliance_index")
+# Embeddings de cada fonte, por hash do texto do chunk, reaproveitados quando o
+# índice é reconstruído: só os chunks novos ou alterados vão para a API
+EMBEDDINGS_DIR = os.path.join(CACHE_DIR, "fontes")
+# Cache semântico de respostas (persistido apenas se o caminho for definido)
+ANSWER_CACHE_PATH = os.getenv("COMPLIANCE_ANSWER_CACHE_PATH")
+ANSWER_CACHE_MAX_DISTANCE = float(os.getenv("COMPLIANCE_ANSWER_CACHE_DISTANCE", "0.08"))
+ANSWER_CACHE_TTL = int(os.getenv("COMPLIANCE_ANSWER_CACHE_TTL", "86400"))
+# Recuperação híbrida: chunks enviados ao modelo, candidatos de cada índice na
+# fusão e critérios para responder só com o BM25 (sem embedding da pergunta)
+CHUNKS_POR_PERGUNTA = 3
+CANDIDATOS_FUSAO = 10
+RRF_K = 60
+BM25_COBERTURA_MINIMA = float(os.getenv("COMPLIANCE_BM25_COBERTURA", "0.4"))
+BM25_MARGEM_MINIMA = float(os.getenv("COMPLIANCE_BM25_MARGEM", "1.8"))
+# Respostas geradas em paralelo por `perguntar_em_lote`
+LOTE_MAX_CONCORRENCIA = int(os.getenv("COMPLIANCE_LOTE_CONCORRENCIA", "4"))
+# ------------------------------
 
 # --- Variáveis Globais para Caching ---
 vector_store = None
 text_chunks = None
+indice_lexical = None
+chunks_por_tipo = {}
+estatisticas_busca = {"secao": 0, "lexical": 0, "hibrida": 0}
+cache_respostas = CacheRespostas(
+    distancia_maxima=ANSWER_CACHE_MAX_DISTANCE,
+    ttl_segundos=ANSWER_CACHE_TTL,
+    caminho=ANSWER_CACHE_PATH,
+)
+_lock_criacao = threading.Lock()
 # ------------------------------------
 
 
-def criar_chatbot_compliance(caminho_politica):
+def _chave_indice(fontes):
     """
-    Cria e armazena em cache um vector store para o chatbot de compliance usando o Google AI SDK.
+    Calcula a chave do índice em disco.
 
-    Esta função carrega a política, a divide, gera os embeddings com o modelo do Google
-    e os armazena em um índice FAISS.
+    A chave combina o hash do conteúdo de cada fonte (`{tipo: caminho}`), as
+    configurações do divisor de chunks, o tipo de índice FAISS e o modelo de
+    embedding: se qualquer um deles mudar, o índice é reconstruído.
     """
-    global vector_store, text_chunks
+    h = hashlib.sha256()
+    for tipo, caminho in sorted(fontes.items()):
+        h.update(f"|{tipo}|".encode("utf-8"))
+        with open(caminho, "rb") as f:
+            for bloco in iter(lambda: f.read(1 << 16), b""):
+                h.update(bloco)
+    h.update(
+        f"|{DIVISOR_CHUNKS}|{VERSAO_CORPUS}|{TAMANHO_MAXIMO_CHUNK}|{FAISS_TIPO}"
+        f"|{EMBEDDING_MODEL}".encode("utf-8")
+    )
+    return h.hexdigest()[:32]
+
+
+def _carregar_indice_do_disco(chave):
+    """Carrega o índice FAISS e os chunks persistidos. Retorna None se não houver cache."""
+    diretorio = os.path.join(CACHE_DIR, chave)
+    caminho_indice = os.path.join(diretorio, "index.faiss")
+    caminho_chunks = os.path.join(diretorio, "chunks.json")
+    if not (os.path.exists(caminho_indice) and os.path.exists(caminho_chunks)):
+        return None
+
+    import faiss
+    from langchain_core.documents import Document
+
+    try:
+        # Memory-map quando o tipo de índice permite; caso contrário, leitura normal
+        try:
+            index = faiss.read_index(
+                caminho_indice, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY
+            )
+        except RuntimeError:
+            index = faiss.read_index(caminho_indice)
+        configurar_busca(index)
+
+        with open(caminho_chunks, "r", encoding="utf-8") as f:
+            chunks = [
+                Document(page_content=c["page_content"], metadata=c["metadata"])
+                for c in json.load(f)
+            ]
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"[Compliance] Cache do índice inválido, reconstruindo: {e}")
+        return None
+
+    if index.ntotal != len(chunks):
+        return None
+    return index, chunks
+
+
+def _salvar_indice_no_disco(chave, index, chunks, embeddings, fontes):
+    """Persiste o índice, os chunks e os embeddings de forma atômica."""
+    import faiss
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    destino = os.path.join(CACHE_DIR, chave)
+    temporario = tempfile.mkdtemp(dir=CACHE_DIR, prefix=f".{chave}-")
+    try:
+        faiss.write_index(index, os.path.join(temporario, "index.faiss"))
+        np.save(os.path.join(temporario, "embeddings.npy"), embeddings)
+        with open(
+            os.path.join(temporario, "chunks.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(
+                [
+                    {"page_content": c.page_content, "metadata": c.metadata}
+                    for c in chunks
+                ],
+                f,
+                ensure_ascii=False,
+            )
+        with open(
+            os.path.join(temporario, "manifest.json"), "w", encoding="utf-8"
+        ) as f:
+            json.dump(
+                {
+                    "fontes": {
+                        tipo: os.path.abspath(caminho) for tipo, caminho in fontes.items()
+                    },
+                    "divisor_chunks": DIVISOR_CHUNKS,
+                    "tamanho_maximo_chunk": TAMANHO_MAXIMO_CHUNK,
+                    "embedding_model": EMBEDDING_MODEL,
+                    "tipo_indice": descrever_indice(index),
+                    "total_chunks": len(chunks),
+                    "chunks_por_tipo": {
+                        tipo: sum(1 for c in chunks if c.metadata["tipo"] == tipo)
+                        for tipo in fontes
+                    },
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        shutil.rmtree(destino, ignore_errors=True)
+        os.replace(temporario, destino)
+    except OSError as e:
+        shutil.rmtree(temporario, ignore_errors=True)
+        print(f"[Compliance] Não foi possível salvar o índice em disco: {e}")
+
+
+def _hash_texto(texto):
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]
+
+
+def _caminho_embeddings_da_fonte(tipo, caminho):
+    """Arquivo com os embeddings de uma fonte (tipo e caminho) para o modelo atual."""
+    h = hashlib.sha256(
+        f"{tipo}|{os.path.abspath(caminho)}|{EMBEDDING_MODEL}|RETRIEVAL_DOCUMENT".encode(
+            "utf-8"
+        )
+    )
+    return os.path.join(EMBEDDINGS_DIR, f"{tipo}-{h.hexdigest()[:16]}.npz")
+
 
-    # Retorna o cache se já foi criado
-    if vector_store is not None and text_chunks is not None:
-        return
+def _carregar_embeddings_da_fonte(arquivo):
+    """{hash do texto: posição} e a matriz de embeddings gravados da fonte (ou vazios)."""
+    try:
+        with np.load(arquivo) as dados:
+            hashes = [str(h) for h in dados["hashes"]]
+            vetores = dados["vetores"]
+    except (OSError, ValueError, KeyError):
+        return {}, None
+    return {h: i for i, h in enumerate(hashes)}, vetores
 
-    # Carrega o documento de política de compliance
-    # (Usando o loader e splitter do LangChain como utilitários, pois são eficientes)
-    loader = TextLoader(caminho_politica, encoding="utf-8")
-    documentos = loader.load()
 
-    # Divide o documento em chunks
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-    text_chunks = splitter.split_documents(documentos)
+def _salvar_embeddings_da_fonte(arquivo, hashes, vetores):
+    os.makedirs(EMBEDDINGS_DIR, exist_ok=True)
+    temporario = f"{arquivo}.{threading.get_ident()}.tmp"
+    try:
+        with open(temporario, "wb") as f:
+            np.savez(f, hashes=np.array(hashes, dtype=str), vetores=vetores)
+        os.replace(temporario, arquivo)
+    except OSError as e:
+        print(f"[Compliance] Não foi possível salvar os embeddings da fonte: {e}")
 
-    # Extrai o conteúdo de texto dos documentos
-    text_contents = [chunk.page_content for chunk in text_chunks]
 
-    print(f"Gerando embeddings para {len(text_contents)} chunks de texto...")
+def _embeddings_dos_chunks(chunks, fontes):
+    """
+    Matriz de embeddings dos chunks, na ordem de `chunks`.
 
-    # Gera os embeddings usando o SDK do Google
-    # O modelo 'text-embedding-004' é o recomendado atualmente.
-    result = genai.embed_content(
-        model="models/text-embedding-004",
-        content=text_contents,
-        task_type="RETRIEVAL_DOCUMENT",
+    Os embeddings de cada fonte ficam em `EMBEDDINGS_DIR`, indexados pelo hash do
+    texto de cada chunk: quando uma fonte muda (por exemplo, e-mails acrescentados
+    ao dump), só os chunks novos ou alterados dela são enviados à API, e as demais
+    fontes não geram nenhuma chamada.
+    """
+    tipos = np.array([c.metadata["tipo"] for c in chunks])
+    matriz = None
+    for tipo, caminho in fontes.items():
+        posicoes = np.flatnonzero(tipos == tipo)
+        if not len(posicoes):
+            continue
+        textos = [chunks[i].page_content for i in posicoes]
+        hashes = [_hash_texto(t) for t in textos]
+        arquivo = _caminho_embeddings_da_fonte(tipo, caminho)
+        gravados, vetores_gravados = _carregar_embeddings_da_fonte(arquivo)
+        faltantes = [j for j, h in enumerate(hashes) if h not in gravados]
+
+        print(
+            f"[Compliance] Fonte '{tipo}': {len(textos) - len(faltantes)} embeddings "
+            f"reaproveitados, {len(faltantes)} chunks novos ou alterados."
+        )
+        novos = None
+        if faltantes:
+            # Os lotes concluídos ficam em um diretório de checkpoint, de modo que uma
+            # falha não obriga a gerar novamente os lotes que já terminaram
+            diretorio_lotes = f"{arquivo[:-4]}-lotes"
+            novos = gerar_embeddings_em_lotes(
+                [textos[j] for j in faltantes],
+                EMBEDDING_MODEL,
+                task_type="RETRIEVAL_DOCUMENT",
+                max_workers=EMBEDDING_WORKERS,
+                diretorio_checkpoint=diretorio_lotes,
+            )
+
+        dimensao = (novos if novos is not None else vetores_gravados).shape[1]
+        if matriz is None:
+            matriz = np.empty((len(chunks), dimensao), dtype="float32")
+        vetores = np.empty((len(textos), dimensao), dtype="float32")
+        if novos is not None:
+            vetores[faltantes] = novos
+        reaproveitados = [j for j, h in enumerate(hashes) if h in gravados]
+        if reaproveitados:
+            vetores[reaproveitados] = vetores_gravados[
+                [gravados[hashes[j]] for j in reaproveitados]
+            ]
+        matriz[posicoes] = vetores
+
+        if faltantes or len(gravados) != len(hashes):
+            _salvar_embeddings_da_fonte(arquivo, hashes, vetores)
+        if faltantes:
+            shutil.rmtree(diretorio_lotes, ignore_errors=True)
+    return matriz
+
+
+def _secoes_do_chunk(chunk):
+    """Seção e cláusulas de um chunk da política, conforme os metadados do divisor."""
+    if chunk.metadata.get("tipo") != TIPO_POLITICA:
+        return set()
+    return {chunk.metadata["secao"]} | set(chunk.metadata.get("subsecoes", []))
+
+
+def _carregar_em_memoria(index, chunks, chave):
+    """Publica o índice e os chunks e monta o BM25 e as listas por tipo de documento."""
+    global vector_store, text_chunks, indice_lexical, chunks_por_tipo
+
+    indice_lexical = IndiceBM25(
+        [c.page_content for c in chunks], secoes=[_secoes_do_chunk(c) for c in chunks]
     )
+    chunks_por_tipo = {}
+    for i, chunk in enumerate(chunks):
+        chunks_por_tipo.setdefault(chunk.metadata["tipo"], set()).add(i)
+    vector_store = index
+    text_chunks = chunks
+    cache_respostas.definir_versao(chave)
 
-    embeddings = result["embedding"]
 
-    # Cria o índice FAISS
-    dimension = len(embeddings[0])
-    index = faiss.IndexFlatL2(dimension)
+def _documentos(fontes):
+    """Chunks de todas as fontes, cada um com o tipo de documento nos metadados."""
+    from langchain_core.documents import Document
 
-    # Adiciona os vetores ao índice
-    index.add(np.array(embeddings))
+    geradores = {
+        TIPO_POLITICA: documentos_da_politica,
+        TIPO_EMAIL: documentos_dos_emails,
+        TIPO_TRANSACOES: documentos_das_transacoes,
+    }
+    return [
+        Document(page_content=conteudo, metadata=metadados)
+        for tipo, caminho in fontes.items()
+        for conteudo, metadados in geradores[tipo](caminho)
+    ]
 
-    # Armazena o índice e os chunks em cache
-    vector_store = index
-    print("Vector Store criado com sucesso.")
 
+def criar_chatbot_compliance(caminho_politica, caminho_emails=None, caminho_transacoes=None):
+    """
+    Cria e armazena em cache um vector store para o chatbot de compliance usando o Google AI SDK.
+
+    Esta função carrega os documentos, os divide, gera os embeddings com o modelo do
+    Google e os armazena em um índice FAISS, ao lado de um índice lexical BM25 sobre
+    os mesmos chunks (reconstruído em memória a cada carga). O índice FAISS também é persistido em `CACHE_DIR`,
+    de modo que novos processos o carregam do disco sem gerar embeddings novamente,
+    desde que os documentos, o divisor e o modelo de embedding não tenham mudado.
+
+    Além da política, o índice cobre opcionalmente os e-mails internos (um chunk
+    por e-mail) e as transações (um resumo por funcionário). Cada chunk traz o tipo
+    de documento nos metadados (`politica`, `email`, `transacoes`), usado para
+    filtrar a busca por fonte. O tipo de índice FAISS segue `COMPLIANCE_FAISS_TIPO`
+    (ver `src/indice_vetorial.py`).
+
+    A política é dividida pela sua estrutura (`src/divisor_politica.py`): cada
+    chunk fica dentro de uma seção, sem sobreposição, e traz nos metadados o
+    número e o título da seção e das cláusulas, usados para filtrar a busca e
+    citar as fontes nas respostas.
+
+    É seguro chamá-la de várias threads (por exemplo, o aquecimento em segundo plano
+    do `main.py` e a primeira pergunta): o índice é construído uma única vez.
+    """
+    with _lock_criacao:
+        # Retorna o cache se já foi criado
+        if vector_store is not None and text_chunks is not None:
+            return
+
+        fontes = {TIPO_POLITICA: caminho_politica}
+        if caminho_emails:
+            fontes[TIPO_EMAIL] = caminho_emails
+        if caminho_transacoes:
+            fontes[TIPO_TRANSACOES] = caminho_transacoes
+
+        # Tenta carregar o índice persistido
+        chave = _chave_indice(fontes)
+        em_disco = _carregar_indice_do_disco(chave)
+        if em_disco is not None:
+            _carregar_em_memoria(*em_disco, chave)
+            print(
+                f"Vector Store carregado do cache ({vector_store.ntotal} chunks, "
+                f"índice {descrever_indice(vector_store)})."
+            )
+            return
+
+        # Divide a política nas seções e cláusulas (`SEÇÃO 1: ...`, `1.1. ...`) e
+        # monta um chunk por e-mail e um resumo de transações por funcionário
+        chunks = _documentos(fontes)
+
+        print(f"Gerando embeddings para {len(chunks)} chunks de texto...")
+
+        # Gera os embeddings em lotes concorrentes usando o SDK do Google
+        # O modelo 'text-embedding-004' é o recomendado atualmente.
+        # Os embeddings já gerados de cada fonte são reaproveitados chunk a chunk.
+        embeddings = _embeddings_dos_chunks(chunks, fontes)
+
+        # Índice de produto interno sobre os vetores normalizados (flat, IVF ou HNSW)
+        index = construir_indice(embeddings)
+
+        # Persiste em disco para os próximos processos
+        _salvar_indice_no_disco(chave, index, chunks, embeddings, fontes)
+
+        # Armazena o índice e os chunks em cache
+        _carregar_em_memoria(index, chunks, chave)
+        print(f"Vector Store criado com sucesso (índice {descrever_indice(index)}).")
+
+
+def _fundir_rankings(*rankings):
+    """Reciprocal Rank Fusion: soma 1 / (RRF_K + posição) de cada ranking."""
+    pontuacoes = {}
+    for ranking in rankings:
+        for posicao, indice in enumerate(ranking):
+            pontuacoes[indice] = pontuacoes.get(indice, 0.0) + 1.0 / (RRF_K + posicao + 1)
+    return sorted(pontuacoes, key=lambda i: -pontuacoes[i])
+
+
+def _permitidos(secoes=None, tipos=None):
+    """
+    Chunks que passam pelos filtros (None quando não há filtro).
 
-def perguntar_ao_chatbot(pergunta):
+    `tipos` restringe a busca a tipos de documento (`politica`, `email`,
+    `transacoes`); `secoes`, a seções da política.
     """
-    Envia uma pergunta para o chatbot, encontra o contexto relevante e gera uma resposta.
+    if not secoes and not tipos:
+        return None
+    permitidos = set(range(len(text_chunks)))
+    if tipos:
+        invalidos = set(tipos) - set(TIPOS_DOCUMENTO)
+        if invalidos:
+            raise ValueError(
+                f"Tipos de documento inválidos: {', '.join(sorted(invalidos))}. "
+                f"Use {', '.join(TIPOS_DOCUMENTO)}."
+            )
+        permitidos = set().union(*(chunks_por_tipo.get(t, set()) for t in tipos))
+    if secoes:
+        permitidos &= set(indice_lexical.chunks_das_secoes(secoes))
+    return permitidos
+
+
+def _recuperar_sem_embedding(pergunta, permitidos):
     """
-    global vector_store, text_chunks
+    Primeira etapa de `_recuperar_em_lote` para uma pergunta.
+
+    Retorna (índices, rota, ranking lexical); os índices são None quando a
+    pergunta precisa da busca híbrida.
+    """
+    # Com filtro, o ranking percorre todos os chunks e descarta os de fora
+    candidatos = CANDIDATOS_FUSAO if permitidos is None else indice_lexical.total
+    ranking_lexical = [
+        (i, pontuacao)
+        for i, pontuacao in indice_lexical.buscar(pergunta, candidatos)
+        if permitidos is None or i in permitidos
+    ][:CANDIDATOS_FUSAO]
+
+    da_secao = set(indice_lexical.chunks_das_secoes(secoes_citadas(pergunta)))
+    if permitidos is not None:
+        da_secao &= permitidos
+    if da_secao:
+        pontuacoes = indice_lexical.pontuar(pergunta)
+        ordem = sorted(da_secao, key=lambda i: (-pontuacoes[i], i))
+        return ordem[:CHUNKS_POR_PERGUNTA], "secao", ranking_lexical
+
+    if ranking_lexical:
+        melhor, pontuacao = ranking_lexical[0]
+        segunda = ranking_lexical[1][1] if len(ranking_lexical) > 1 else 0.0
+        # Uma expressão exata da pergunta que só o melhor chunk contém dispensa a margem
+        if indice_lexical.cobertura(pergunta, melhor) >= BM25_COBERTURA_MINIMA and (
+            pontuacao >= BM25_MARGEM_MINIMA * segunda
+            or indice_lexical.expressao_exclusiva(pergunta, melhor)
+        ):
+            indices = [i for i, _ in ranking_lexical[:CHUNKS_POR_PERGUNTA]]
+            return indices, "lexical", ranking_lexical
+
+    return None, "hibrida", ranking_lexical
+
+
+def _embeddings_de_perguntas(perguntas):
+    """Embeddings das perguntas, com uma chamada à API por lote de até 100 perguntas."""
+    vetores = []
+    for inicio, fim in dividir_em_lotes(perguntas):
+        vetores.extend(
+            gerar_embeddings(perguntas[inicio:fim], EMBEDDING_MODEL, "RETRIEVAL_QUERY")
+        )
+    return np.array(vetores, dtype="float32")
+
+
+def _recuperar_em_lote(perguntas, secoes=None, tipos=None):
+    """
+    Escolhe os chunks de contexto de cada pergunta.
+
+    Com `secoes` (por exemplo, `["3"]` ou `["1.2"]`) e/ou `tipos` (por exemplo,
+    `["email"]`), só os chunks que passam pelos filtros são considerados.
+
+    Retorna, para cada pergunta, (índices dos chunks, embedding da pergunta ou
+    None, rota):
+    - "secao": a pergunta cita uma seção da política ("seção 1.1", "item 3.2") e
+      os chunks dessa seção são usados, sem embedding
+    - "lexical": o melhor chunk do BM25 contém ao menos `BM25_COBERTURA_MINIMA`
+      do peso das palavras da pergunta e pontua `BM25_MARGEM_MINIMA` vezes mais
+      que o segundo (ou é o único com uma expressão exata da pergunta), sem
+      embedding
+    - "hibrida": demais perguntas; os rankings do BM25 e do FAISS são fundidos
+
+    As perguntas da rota híbrida têm os embeddings gerados e buscados no FAISS
+    de uma só vez (uma matriz de consultas), em vez de uma chamada por pergunta.
+    """
+    permitidos = _permitidos(secoes, tipos)
+    if permitidos is not None and not permitidos:
+        return [([], None, "secao") for _ in perguntas]
+
+    resultados = [_recuperar_sem_embedding(p, permitidos) for p in perguntas]
+    hibridas = [n for n, (indices, _, _) in enumerate(resultados) if indices is None]
+
+    embeddings = {}
+    if hibridas:
+        vetores = _embeddings_de_perguntas([perguntas[n] for n in hibridas])
+        _, vizinhos = buscar(vector_store, vetores, CANDIDATOS_FUSAO, permitidos)
+        for n, vetor, linha in zip(hibridas, vetores, vizinhos):
+            ranking_vetorial = [int(i) for i in linha if i >= 0]
+            ranking_lexical = [i for i, _ in resultados[n][2]]
+            fundidos = _fundir_rankings(ranking_vetorial, ranking_lexical)
+            resultados[n] = (fundidos[:CHUNKS_POR_PERGUNTA], "hibrida", None)
+            embeddings[n] = vetor
 
+    return [
+        (indices, embeddings.get(n), rota)
+        for n, (indices, rota, _) in enumerate(resultados)
+    ]
+
+
+def _recuperar(pergunta, secoes=None, tipos=None):
+    """Chunks de contexto de uma pergunta (ver `_recuperar_em_lote`)."""
+    return _recuperar_em_lote([pergunta], secoes, tipos)[0]
+
+
+def _chave_cache(pergunta, secoes=None, tipos=None):
+    """Chave da pergunta no cache de respostas; buscas filtradas têm chaves próprias."""
+    if not secoes and not tipos:
+        return pergunta
+    filtros = f"secoes={','.join(sorted(secoes or []))};tipos={','.join(sorted(tipos or []))}"
+    return f"[{filtros}] {pergunta}"
+
+
+def _exigir_indice():
     if vector_store is None:
         raise RuntimeError(
             "O chatbot de compliance não foi inicializado. Chame criar_chatbot_compliance() primeiro."
         )
 
-    # 1. Gerar o embedding da pergunta
-    query_embedding_result = genai.embed_content(
-        model="models/text-embedding-004", content=pergunta, task_type="RETRIEVAL_QUERY"
-    )
-    query_embedding = np.array([query_embedding_result["embedding"]])
 
-    # 2. Buscar no FAISS pelos vizinhos mais próximos
-    k = 3  # Número de chunks relevantes a serem recuperados
-    distances, indices = vector_store.search(query_embedding, k)
+def _consultar(perguntas, secoes=None, tipos=None):
+    """
+    Etapas anteriores à geração, para um lote de perguntas.
 
-    # 3. Recuperar os chunks de texto correspondentes
+    Retorna, para cada pergunta, a resposta já pronta (cache ou nenhum trecho
+    encontrado) ou None e os (índices, embedding) dos chunks para gerar a resposta.
+    """
+    prontas = [
+        cache_respostas.buscar_exata(_chave_cache(p, secoes, tipos)) for p in perguntas
+    ]
+    pendentes = [n for n, resposta in enumerate(prontas) if resposta is None]
+
+    # 1. Recuperar os chunks relevantes (BM25, FAISS ou os dois)
+    recuperados = _recuperar_em_lote([perguntas[n] for n in pendentes], secoes, tipos)
+
+    resultado = [(resposta, None) for resposta in prontas]
+    for n, (indices, query_embedding, rota) in zip(pendentes, recuperados):
+        estatisticas_busca[rota] += 1
+        if not indices:
+            filtros = ", ".join(list(secoes or []) + list(tipos or []))
+            resultado[n] = (f"Nenhum trecho dos documentos corresponde a: {filtros}.", None)
+            continue
+        if query_embedding is not None:
+            resposta_em_cache = cache_respostas.buscar(query_embedding, indices)
+            if resposta_em_cache is not None:
+                resultado[n] = (resposta_em_cache, None)
+                continue
+        resultado[n] = (None, (indices, query_embedding))
+    return resultado
+
+
+def _gerar_resposta(pergunta, indices, query_embedding, secoes=None, tipos=None):
+    # 2. Montar o contexto com os chunks de texto correspondentes, identificados
+    # pela fonte (seção da política, e-mail ou resumo de transações)
     contexto_relevante = "\n---\n".join(
-        [text_chunks[i].page_content for i in indices[0]]
+        [
+            f"[{rotulo(text_chunks[i].metadata)}]\n{text_chunks[i].page_content}"
+            for i in indices
+        ]
     )
 
-    # 4. Construir o prompt e chamar o modelo generativo
+    # 3. Construir o prompt e chamar o modelo generativo
     prompt_template = f"""
-        Você é um assistente de auditoria da Dunder Mifflin. Sua tarefa é responder a perguntas sobre a política de compliance da empresa.
+        Você é um assistente de auditoria da Dunder Mifflin. Sua tarefa é responder a perguntas sobre a política de compliance da empresa, os e-mails internos e as transações dos funcionários.
         Use apenas o contexto fornecido abaixo para basear suas respostas. Seja claro e direto.
+        Cite as fontes em que a resposta se baseia (por exemplo, "Seção 1.2" ou "E-mail #12"), conforme os rótulos entre colchetes.
 
         Contexto Relevante:
         {contexto_relevante}
@@ -112,16 +580,79 @@ def perguntar_ao_chatbot(pergunta):
         Resposta:
     """
 
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    response = model.generate_content(prompt_template)
+    resposta = gerar(prompt_template)
+
+    cache_respostas.guardar(
+        _chave_cache(pergunta, secoes, tipos), query_embedding, indices, resposta
+    )
+    return resposta
 
-    return response.text
+
+def perguntar_ao_chatbot(pergunta, secoes=None, tipos=None):
+    """
+    Envia uma pergunta para o chatbot, encontra o contexto relevante e gera uma resposta.
+
+    `secoes` restringe a busca a seções da política (por exemplo, `["3"]`) e
+    `tipos` a tipos de documento (por exemplo, `["email", "transacoes"]`); a
+    resposta cita as fontes dos trechos usados.
+
+    Perguntas idênticas ou semanticamente próximas de uma já respondida (e que
+    recuperam os mesmos chunks) são atendidas pelo cache de respostas, sem nova geração.
+    Perguntas que o índice lexical responde com segurança (ver `_recuperar_em_lote`)
+    não geram embedding.
+    """
+    _exigir_indice()
+    resposta, pendente = _consultar([pergunta], secoes, tipos)[0]
+    if resposta is not None:
+        return resposta
+    return _gerar_resposta(pergunta, *pendente, secoes, tipos)
+
+
+def perguntar_em_lote(perguntas, secoes=None, tipos=None, max_concorrencia=None):
+    """
+    Responde a uma lista de perguntas (por exemplo, uma bateria noturna de testes).
+
+    Os embeddings das perguntas que precisam da busca vetorial são gerados em
+    poucas chamadas e buscados no FAISS com uma única matriz de consultas; as
+    respostas são geradas em paralelo (até `max_concorrencia`, padrão
+    `LOTE_MAX_CONCORRENCIA`). Filtros e cache funcionam como em
+    `perguntar_ao_chatbot`.
+
+    Retorna as respostas na ordem das perguntas (perguntas repetidas são
+    respondidas uma vez); uma geração que falha não interrompe as demais e vira
+    uma mensagem de erro na posição correspondente.
+    """
+    _exigir_indice()
+    unicas = list(dict.fromkeys(perguntas))
+    respostas = []
+    pendentes = []
+    for n, (resposta, pendente) in enumerate(_consultar(unicas, secoes, tipos)):
+        respostas.append(resposta)
+        if resposta is None:
+            pendentes.append((n, pendente))
+
+    resultados = executar_em_paralelo(
+        lambda item: _gerar_resposta(unicas[item[0]], *item[1], secoes, tipos),
+        pendentes,
+        max_concorrencia=max_concorrencia or LOTE_MAX_CONCORRENCIA,
+    )
+    for (n, _), resultado in zip(pendentes, resultados):
+        if resultado["status"] == "ok":
+            respostas[n] = resultado["resultado"]
+        else:
+            respostas[n] = f"Erro ao gerar a resposta: {resultado['erro']}"
+    por_pergunta = dict(zip(unicas, respostas))
+    return [por_pergunta[p] for p in perguntas]
 
 
 # Exemplo de uso quando o script é executado diretamente
 if __name__ == "__main__":
     print("Inicializando o chatbot de compliance com o Google AI SDK...")
-    criar_chatbot_compliance()
+    criar_chatbot_compliance(
+        "documents/politica_compliance.txt",
+        "documents/emails_internos.txt",
+        "documents/transacoes_bancarias.csv",
+    )
     print("Chatbot pronto! Faça sua pergunta ou digite 'sair' para terminar.")
 
     while True:
@@ -0,0 +1,127 @@
+from collections import Counter
+
+import numpy as np
+
+from src.divisor_politica import citacao, dividir_politica
+from src.emails import iterar_emails
+from src.transacoes import carregar_transacoes
+
+# Tipos de documento do índice do chatbot (metadado `tipo` de cada chunk)
+TIPO_POLITICA = "politica"
+TIPO_EMAIL = "email"
+TIPO_TRANSACOES = "transacoes"
+TIPOS_DOCUMENTO = (TIPO_POLITICA, TIPO_EMAIL, TIPO_TRANSACOES)
+
+# Maiores transações listadas no resumo de cada funcionário
+MAIORES_TRANSACOES_POR_RESUMO = 5
+
+
+def documentos_da_politica(caminho_politica):
+    """Chunks da política, divididos por seção e cláusula (ver `dividir_politica`)."""
+    with open(caminho_politica, "r", encoding="utf-8") as f:
+        politica = f.read()
+    return [
+        (conteudo, {"tipo": TIPO_POLITICA, **metadados})
+        for conteudo, metadados in dividir_politica(politica)
+    ]
+
+
+def documentos_dos_emails(caminho_emails):
+    """Um chunk por e-mail do dump, com remetente, data e assunto nos metadados."""
+    documentos = []
+    for email in iterar_emails(caminho_emails):
+        data = email.data.strftime("%Y-%m-%d %H:%M") if email.data else ""
+        conteudo = (
+            f"E-mail #{email.id}\n"
+            f"De: {email.de}\n"
+            f"Para: {email.para}\n"
+            f"Data: {data or 'N/A'}\n"
+            f"Assunto: {email.assunto}\n\n"
+            f"{email.corpo}"
+        )
+        documentos.append(
+            (
+                conteudo,
+                {
+                    "tipo": TIPO_EMAIL,
+                    "id": email.id,
+                    "de": email.de,
+                    "para": email.para,
+                    "data": data,
+                    "assunto": email.assunto,
+                },
+            )
+        )
+    return documentos
+
+
+def _resumo_funcionario(tabela, nome, indices):
+    """Texto do resumo das transações de um funcionário (`indices` da tabela)."""
+    valores = tabela.valores[indices]
+    cargo = Counter(tabela.rotulos_de("cargo", indices).tolist()).most_common(1)[0][0]
+    departamento = Counter(
+        tabela.rotulos_de("departamento", indices).tolist()
+    ).most_common(1)[0][0]
+    datas = tabela.datas[indices]
+
+    categorias = tabela.rotulos_de("categoria", indices)
+    por_categoria = {}
+    for categoria, valor in zip(categorias.tolist(), valores.tolist()):
+        quantidade, total = por_categoria.get(categoria, (0, 0.0))
+        por_categoria[categoria] = (quantidade + 1, total + valor)
+
+    linhas = [
+        f"Resumo de transações de {nome} ({cargo}, {departamento})",
+        f"Período: {datas.min()} a {datas.max()}",
+        f"Transações: {len(indices)} | Total: ${valores.sum():.2f}"
+        f" | Média: ${valores.mean():.2f} | Maior: ${valores.max():.2f}",
+        "Por categoria:",
+    ]
+    for categoria, (quantidade, total) in sorted(
+        por_categoria.items(), key=lambda item: -item[1][1]
+    ):
+        linhas.append(f"- {categoria}: {quantidade} transações, ${total:.2f}")
+
+    linhas.append("Maiores transações:")
+    maiores = indices[np.argsort(-valores, kind="stable")[:MAIORES_TRANSACOES_POR_RESUMO]]
+    for i in maiores:
+        t = tabela.registro(i)
+        linhas.append(
+            f"- {t['id_transacao']} ({t['data']}): {t['descricao']}"
+            f" | {t['categoria']} | ${t['valor']:.2f}"
+        )
+    return "\n".join(linhas), cargo, departamento
+
+
+def documentos_das_transacoes(caminho_transacoes):
+    """Um chunk por funcionário, com o resumo das suas transações."""
+    tabela = carregar_transacoes(caminho_transacoes)
+    documentos = []
+    for nome in tabela.rotulos["funcionario"].tolist():
+        indices = tabela.indices_por_funcionario([nome])
+        if not len(indices):
+            continue
+        conteudo, cargo, departamento = _resumo_funcionario(tabela, nome, indices)
+        documentos.append(
+            (
+                conteudo,
+                {
+                    "tipo": TIPO_TRANSACOES,
+                    "funcionario": nome,
+                    "cargo": cargo,
+                    "departamento": departamento,
+                    "transacoes": int(len(indices)),
+                },
+            )
+        )
+    return documentos
+
+
+def rotulo(metadados):
+    """Rótulo de citação de um chunk de qualquer tipo de documento."""
+    tipo = metadados.get("tipo", TIPO_POLITICA)
+    if tipo == TIPO_EMAIL:
+        return f"E-mail #{metadados.get('id')} — {metadados.get('assunto', '')}"
+    if tipo == TIPO_TRANSACOES:
+        return f"Transações de {metadados.get('funcionario', '')}"
+    return citacao(metadados)
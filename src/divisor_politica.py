@@ -0,0 +1,142 @@
+import re
+
+# Tamanho máximo (em caracteres) de um chunk; cláusulas de uma mesma seção são
+# agrupadas até esse limite, e só uma cláusula maior que ele é cortada
+TAMANHO_MAXIMO_CHUNK = 1000
+
+_FAIXA = re.compile(r"^\s*={5,}\s*$")
+_SECAO = re.compile(r"^SEÇÃO (\d+):\s*(.*?)\s*$")
+_SUBSECAO = re.compile(r"^(\d+\.\d+)\.\s+(.*?)\s*$")
+
+# Seção atribuída ao cabeçalho e ao prefácio do documento
+SECAO_PREAMBULO = "0"
+
+
+def _unidades(politica):
+    """
+    Percorre a política linha a linha e produz as unidades estruturais:
+    (id_secao, titulo_secao, id_subsecao ou None, titulo_subsecao, linhas).
+
+    O texto de uma seção antes da primeira cláusula vira uma unidade sem
+    subseção; as faixas de "=" são descartadas.
+    """
+    secao, titulo_secao = SECAO_PREAMBULO, "Cabeçalho e Prefácio"
+    subsecao, titulo_subsecao = None, ""
+    linhas = []
+
+    for linha in politica.splitlines():
+        if _FAIXA.match(linha):
+            continue
+        cabecalho_secao = _SECAO.match(linha.strip())
+        cabecalho_subsecao = _SUBSECAO.match(linha.strip())
+        if cabecalho_secao or cabecalho_subsecao:
+            if any(l.strip() for l in linhas):
+                yield secao, titulo_secao, subsecao, titulo_subsecao, linhas
+            linhas = [linha.strip()]
+            if cabecalho_secao:
+                secao, titulo_secao = cabecalho_secao.groups()
+                subsecao, titulo_subsecao = None, ""
+                linhas = []  # o título da seção vai no cabeçalho de cada chunk
+            else:
+                subsecao, titulo_subsecao = cabecalho_subsecao.groups()
+        else:
+            linhas.append(linha.rstrip())
+
+    if any(l.strip() for l in linhas):
+        yield secao, titulo_secao, subsecao, titulo_subsecao, linhas
+
+
+def _compactar(linhas):
+    """Junta as linhas removendo linhas em branco repetidas e nas pontas."""
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(linhas)).strip()
+
+
+def _partes(texto, limite):
+    """Divide um texto maior que `limite` em partes, preferindo quebras de parágrafo e de linha."""
+    partes = []
+    atual = ""
+    for paragrafo in re.split(r"(?<=\n)", texto):
+        if atual and len(atual) + len(paragrafo) > limite:
+            partes.append(atual.strip())
+            atual = ""
+        atual += paragrafo
+    if atual.strip():
+        partes.append(atual.strip())
+    return partes
+
+
+def dividir_politica(politica, tamanho_maximo=TAMANHO_MAXIMO_CHUNK):
+    """
+    Divide a política de compliance seguindo a sua estrutura.
+
+    Os limites dos chunks são os títulos das seções (`SEÇÃO 3: LISTA NEGRA`) e das
+    cláusulas (`1.1.`): cláusulas consecutivas de uma mesma seção são agrupadas
+    até `tamanho_maximo` caracteres, nenhum chunk atravessa duas seções e não há
+    sobreposição entre chunks. Cada chunk começa com o título da sua seção, para
+    que faça sentido isoladamente.
+
+    Retorna uma lista de (conteudo, metadados), com os metadados:
+    - `secao`: número da seção ("1"; "0" para o cabeçalho e o prefácio)
+    - `titulo`: título da seção
+    - `subsecoes` / `titulos_subsecoes`: cláusulas contidas no chunk
+    """
+    chunks = []
+    atual = None
+
+    def fechar():
+        if atual and atual["partes"]:
+            chunks.append(
+                (
+                    "\n\n".join([atual["cabecalho"]] + atual["partes"]),
+                    {
+                        "secao": atual["secao"],
+                        "titulo": atual["titulo"],
+                        "subsecoes": atual["subsecoes"],
+                        "titulos_subsecoes": atual["titulos_subsecoes"],
+                    },
+                )
+            )
+
+    for secao, titulo, subsecao, titulo_subsecao, linhas in _unidades(politica):
+        texto = _compactar(linhas)
+        cabecalho = (
+            f"SEÇÃO {secao}: {titulo}" if secao != SECAO_PREAMBULO else titulo.upper()
+        )
+        limite = max(tamanho_maximo - len(cabecalho) - 2, 1)
+
+        for parte in _partes(texto, limite) if len(texto) > limite else [texto]:
+            cabe = (
+                atual is not None
+                and atual["secao"] == secao
+                and atual["tamanho"] + len(parte) + 2 <= tamanho_maximo
+            )
+            if not cabe:
+                fechar()
+                atual = {
+                    "secao": secao,
+                    "titulo": titulo,
+                    "cabecalho": cabecalho,
+                    "partes": [],
+                    "subsecoes": [],
+                    "titulos_subsecoes": [],
+                    "tamanho": len(cabecalho),
+                }
+            atual["partes"].append(parte)
+            atual["tamanho"] += len(parte) + 2
+            if subsecao and subsecao not in atual["subsecoes"]:
+                atual["subsecoes"].append(subsecao)
+                atual["titulos_subsecoes"].append(titulo_subsecao)
+    fechar()
+    return chunks
+
+
+def citacao(metadados):
+    """Rótulo de citação de um chunk: "Seção 1.2 — DESPESAS INTERMEDIÁRIAS (...)"."""
+    if metadados.get("subsecoes"):
+        return "; ".join(
+            f"Seção {s} — {t}"
+            for s, t in zip(metadados["subsecoes"], metadados["titulos_subsecoes"])
+        )
+    if metadados.get("secao") == SECAO_PREAMBULO:
+        return metadados.get("titulo", "")
+    return f"Seção {metadados.get('secao')} — {metadados.get('titulo', '')}"
@@ -0,0 +1,233 @@
+import mmap
+import os
+import re
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from src.telemetria import registrar
+
+# Registro compacto de um e-mail. `inicio`/`fim` são os offsets em bytes do bloco
+# no arquivo; `id` é a posição (começando em 1) do e-mail no dump.
+Email = namedtuple(
+    "Email",
+    "id inicio fim de de_email para para_email data assunto corpo",
+)
+
+_SEPARADOR = re.compile(rb"^-{3,}\s*$")
+_ENDERECO = re.compile(r"^(.*?)\s*<([^>]*)>\s*$")
+_CABECALHOS = {"De", "Para", "Data", "Assunto"}
+
+
+def _nome_e_endereco(valor):
+    """
+    Separa 'Nome <email>' em (nome, email).
+
+    Vários destinatários separados por ';' são mantidos juntos, com nomes e
+    endereços também separados por '; '.
+    """
+    nomes = []
+    enderecos = []
+    for parte in valor.split(";"):
+        parte = parte.strip()
+        if not parte:
+            continue
+        correspondencia = _ENDERECO.match(parte)
+        if correspondencia:
+            nomes.append(correspondencia.group(1))
+            enderecos.append(correspondencia.group(2).lower())
+        elif "@" in parte:
+            nomes.append(parte)
+            enderecos.append(parte.lower())
+        else:
+            nomes.append(parte)
+    return "; ".join(nomes), "; ".join(enderecos)
+
+
+def _montar_email(id_email, inicio, fim, cabecalhos, linhas_corpo):
+    de, de_email = _nome_e_endereco(cabecalhos.get("De", ""))
+    para, para_email = _nome_e_endereco(cabecalhos.get("Para", ""))
+    data = None
+    if cabecalhos.get("Data"):
+        try:
+            data = datetime.strptime(cabecalhos["Data"], "%Y-%m-%d %H:%M")
+        except ValueError:
+            data = None
+    return Email(
+        id=id_email,
+        inicio=inicio,
+        fim=fim,
+        de=de,
+        de_email=de_email,
+        para=para,
+        para_email=para_email,
+        data=data,
+        assunto=cabecalhos.get("Assunto", ""),
+        corpo="\n".join(linhas_corpo).strip(),
+    )
+
+
+def _iterar_blocos(linhas):
+    """
+    Percorre linhas (bytes) e produz (inicio, fim, cabecalhos, linhas_corpo) por e-mail.
+
+    `linhas` é um iterável de (offset, linha). Um e-mail começa em uma linha "De:",
+    os cabeçalhos vão até "Mensagem:" e o corpo até a próxima linha de traços (ou
+    até o próximo "De:" / fim do arquivo, se o separador estiver ausente).
+    """
+    inicio = None
+    fim = None
+    cabecalhos = None
+    corpo = None
+
+    for offset, linha in linhas:
+        if _SEPARADOR.match(linha):
+            if cabecalhos is not None:
+                yield inicio, offset, cabecalhos, corpo
+                cabecalhos = None
+            continue
+
+        texto = linha.decode("utf-8").rstrip("\r\n")
+
+        if corpo is None and cabecalhos is not None:
+            # Ainda nos cabeçalhos
+            if texto.startswith("Mensagem:"):
+                corpo = []
+                resto = texto[len("Mensagem:") :].strip()
+                if resto:
+                    corpo.append(resto)
+                    fim = offset + len(linha)
+                continue
+            nome, _, valor = texto.partition(":")
+            if nome in _CABECALHOS:
+                cabecalhos[nome] = valor.strip()
+                fim = offset + len(linha)
+                continue
+
+        if texto.startswith("De:") and (cabecalhos is None or corpo is not None):
+            if cabecalhos is not None:
+                yield inicio, fim, cabecalhos, corpo
+            inicio = offset
+            fim = offset + len(linha)
+            cabecalhos = {"De": texto[3:].strip()}
+            corpo = None
+            continue
+
+        if corpo is not None:
+            corpo.append(texto)
+            fim = offset + len(linha)
+
+    if cabecalhos is not None:
+        yield inicio, fim, cabecalhos, corpo or []
+
+
+def _linhas_com_offset(arquivo, offset=0):
+    for linha in arquivo:
+        yield offset, linha
+        offset += len(linha)
+
+
+def iterar_emails(caminho_arquivo, a_partir_de=0, primeiro_id=1):
+    """
+    Lê o dump de e-mails de forma incremental, produzindo um `Email` por vez.
+
+    O arquivo é percorrido uma única vez, linha a linha, sem carregá-lo inteiro na
+    memória. Ao final da primeira passada, o índice de offsets é salvo para que
+    `ler_email` possa buscar e-mails individuais diretamente.
+
+    Com `a_partir_de` (o `fim` de um e-mail já lido), só os e-mails seguintes são
+    lidos, numerados a partir de `primeiro_id`: é assim que uma auditoria
+    incremental lê apenas o que foi acrescentado ao dump.
+    """
+    offsets = []
+    gasto = 0.0  # tempo de leitura, sem contar o de quem consome os e-mails
+    inicio_leitura = time.perf_counter()
+    with open(caminho_arquivo, "rb") as f:
+        f.seek(a_partir_de)
+        blocos = _iterar_blocos(_linhas_com_offset(f, a_partir_de))
+        for id_email, (inicio, fim, cabecalhos, corpo) in enumerate(
+            blocos, start=primeiro_id
+        ):
+            offsets.append((inicio, fim))
+            email = _montar_email(id_email, inicio, fim, cabecalhos, corpo or [])
+            gasto += time.perf_counter() - inicio_leitura
+            yield email
+            inicio_leitura = time.perf_counter()
+    if not a_partir_de:
+        _salvar_indice(
+            caminho_arquivo, np.array(offsets, dtype=np.int64).reshape(-1, 2)
+        )
+    gasto += time.perf_counter() - inicio_leitura
+    registrar(
+        "emails.ler", gasto, arquivo=os.path.basename(caminho_arquivo), emails=len(offsets)
+    )
+
+
+def carregar_emails(caminho_arquivo):
+    """Retorna todos os e-mails do dump como uma lista de `Email`."""
+    return list(iterar_emails(caminho_arquivo))
+
+
+def _caminho_indice(caminho_arquivo):
+    pasta, nome = os.path.split(os.path.abspath(caminho_arquivo))
+    return os.path.join(pasta, f".{nome}.offsets.npz")
+
+
+def _salvar_indice(caminho_arquivo, offsets):
+    estado = os.stat(caminho_arquivo)
+    try:
+        np.savez(
+            _caminho_indice(caminho_arquivo),
+            offsets=offsets,
+            estado=np.array([estado.st_mtime_ns, estado.st_size], dtype=np.int64),
+        )
+    except OSError as e:
+        print(f"[E-mails] Não foi possível salvar o índice de offsets: {e}")
+
+
+def indice_de_offsets(caminho_arquivo):
+    """
+    Retorna um array (n, 2) com os offsets [inicio, fim) de cada e-mail.
+
+    Usa o índice salvo se ele corresponder ao mtime e ao tamanho atuais do arquivo;
+    caso contrário, faz uma passada completa para reconstruí-lo.
+    """
+    estado = os.stat(caminho_arquivo)
+    try:
+        with np.load(_caminho_indice(caminho_arquivo)) as dados:
+            if tuple(dados["estado"]) == (estado.st_mtime_ns, estado.st_size):
+                return dados["offsets"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    offsets = [(email.inicio, email.fim) for email in iterar_emails(caminho_arquivo)]
+    return np.array(offsets, dtype=np.int64).reshape(-1, 2)
+
+
+def ler_emails(caminho_arquivo, ids, offsets=None):
+    """Busca vários e-mails pelos `id` (começando em 1) via um único mmap do dump."""
+    if offsets is None:
+        offsets = indice_de_offsets(caminho_arquivo)
+
+    emails = []
+    with open(caminho_arquivo, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapa:
+            for id_email in ids:
+                inicio, fim = (int(v) for v in offsets[id_email - 1])
+                linhas = []
+                offset = inicio
+                for linha in mapa[inicio:fim].splitlines(keepends=True):
+                    linhas.append((offset, linha))
+                    offset += len(linha)
+                _, fim, cabecalhos, corpo = next(_iterar_blocos(linhas))
+                emails.append(
+                    _montar_email(id_email, inicio, fim, cabecalhos, corpo or [])
+                )
+    return emails
+
+
+def ler_email(caminho_arquivo, id_email, offsets=None):
+    """Busca um único e-mail pelo `id` (começando em 1) via mmap, sem reler o dump."""
+    return ler_emails(caminho_arquivo, [id_email], offsets)[0]
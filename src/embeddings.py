@@ -0,0 +1,156 @@
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from src.cliente_llm import gerar_embeddings
+from src.execucao_paralela import executar_com_retentativas
+from src.telemetria import com_contexto
+
+# Limites por requisição da API de embeddings
+MAX_ITENS_POR_LOTE = 100
+MAX_CARACTERES_POR_LOTE = 30000
+# Tentativas por lote antes de considerá-lo falho
+MAX_TENTATIVAS = 3
+
+
+def dividir_em_lotes(
+    textos, max_itens=MAX_ITENS_POR_LOTE, max_caracteres=MAX_CARACTERES_POR_LOTE
+):
+    """
+    Divide os textos em lotes limitados por quantidade de itens e de caracteres.
+
+    Retorna uma lista de tuplas (inicio, fim) com os intervalos de cada lote.
+    Um texto maior que `max_caracteres` vai sozinho em seu próprio lote.
+    """
+    lotes = []
+    inicio = 0
+    caracteres = 0
+    for i, texto in enumerate(textos):
+        cheio = i - inicio >= max_itens or caracteres + len(texto) > max_caracteres
+        if i > inicio and cheio:
+            lotes.append((inicio, i))
+            inicio = i
+            caracteres = 0
+        caracteres += len(texto)
+    if inicio < len(textos):
+        lotes.append((inicio, len(textos)))
+    return lotes
+
+
+def _caminho_checkpoint(diretorio, modelo, textos, task_type):
+    h = hashlib.sha256(f"{modelo}|{task_type}".encode("utf-8"))
+    for texto in textos:
+        h.update(b"\x00" + texto.encode("utf-8"))
+    return os.path.join(diretorio, f"lote-{h.hexdigest()[:24]}.npy")
+
+
+def _embed_lote(modelo, textos, task_type, diretorio_checkpoint=None):
+    caminho = None
+    if diretorio_checkpoint:
+        caminho = _caminho_checkpoint(diretorio_checkpoint, modelo, textos, task_type)
+        if os.path.exists(caminho):
+            return np.load(caminho)
+
+    vetores = executar_com_retentativas(
+        _chamar_api, modelo, textos, task_type, max_tentativas=MAX_TENTATIVAS
+    )
+
+    if caminho:
+        np.save(caminho, vetores)
+    return vetores
+
+
+def _chamar_api(modelo, textos, task_type):
+    vetores = np.array(gerar_embeddings(textos, modelo, task_type), dtype="float32")
+    if vetores.shape[0] != len(textos):
+        raise ValueError(
+            f"A API retornou {vetores.shape[0]} embeddings para {len(textos)} textos."
+        )
+    return vetores
+
+
+def _executar_lotes(
+    textos, lotes, modelo, task_type, max_workers, diretorio_checkpoint, concluido
+):
+    """
+    Gera os embeddings de cada lote (intervalos (inicio, fim) de `textos`) em um
+    pool de `max_workers` threads e chama `concluido(n, vetores)` na thread
+    chamadora à medida que os lotes terminam, em qualquer ordem. Levanta
+    RuntimeError, depois de todos os lotes, se algum falhou.
+    """
+    falhas = []
+    if diretorio_checkpoint:
+        os.makedirs(diretorio_checkpoint, exist_ok=True)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        embed_lote = com_contexto(_embed_lote)
+        futuros = {
+            executor.submit(
+                embed_lote,
+                modelo,
+                textos[inicio:fim],
+                task_type,
+                diretorio_checkpoint,
+            ): n
+            for n, (inicio, fim) in enumerate(lotes)
+        }
+
+        for futuro in as_completed(futuros):
+            n = futuros[futuro]
+            try:
+                vetores = futuro.result()
+            except Exception as e:
+                inicio, fim = lotes[n]
+                falhas.append(f"{inicio + 1}-{fim}: {e}")
+                continue
+            concluido(n, vetores)
+
+    if falhas:
+        raise RuntimeError(
+            f"Falha ao gerar embeddings de {len(falhas)} de {len(lotes)} lotes: "
+            + "; ".join(sorted(falhas))
+        )
+
+
+def gerar_embeddings_em_lotes(
+    textos,
+    modelo,
+    task_type="RETRIEVAL_DOCUMENT",
+    max_workers=4,
+    max_itens=MAX_ITENS_POR_LOTE,
+    max_caracteres=MAX_CARACTERES_POR_LOTE,
+    diretorio_checkpoint=None,
+):
+    """
+    Gera os embeddings dos textos em lotes concorrentes.
+
+    Os lotes rodam em um pool limitado a `max_workers` threads e cada lote é repetido
+    isoladamente em caso de falha. Cada lote é copiado para a sua posição no array
+    de saída assim que termina, de modo que nenhum lote fica retido em memória e a
+    linha i corresponde a `textos[i]`.
+
+    Se `diretorio_checkpoint` for informado, cada lote concluído é salvo nele; uma
+    nova execução após uma falha reaproveita esses lotes e só gera os que faltaram.
+
+    Retorna um array float32 (len(textos), dimensão).
+    """
+    if not textos:
+        raise ValueError("Nenhum texto informado para gerar embeddings.")
+
+    lotes = dividir_em_lotes(textos, max_itens, max_caracteres)
+    matriz = None
+
+    def concluido(n, vetores):
+        nonlocal matriz
+        if matriz is None:
+            matriz = np.empty((len(textos), vetores.shape[1]), dtype="float32")
+        inicio, fim = lotes[n]
+        matriz[inicio:fim] = vetores
+
+    _executar_lotes(
+        textos, lotes, modelo, task_type, max_workers, diretorio_checkpoint, concluido
+    )
+    return matriz
+
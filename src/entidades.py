@@ -0,0 +1,221 @@
+import os
+import re
+import threading
+from collections import deque
+
+from src.emails import iterar_emails
+from src.texto import normalizar, palavras
+from src.transacoes import carregar_transacoes
+
+# Apelidos com uma palavra só precisam de pelo menos este tamanho ("Jim", "Pam")
+TAMANHO_MINIMO_APELIDO = 3
+
+# Palavras que indicam uma lista de distribuição, e não uma pessoa
+_PALAVRAS_DE_GRUPO = {"all", "todos", "grupo", "equipe", "comite", "staff", "time"}
+
+_ESPACOS = re.compile(r"\s+")
+
+# --- Variáveis Globais para Caching ---
+_ligadores = {}  # (caminho_emails, caminho_transacoes) -> (estados, LigadorEntidades)
+_lock = threading.Lock()
+# ------------------------------------
+
+
+def _preparar(texto):
+    """Forma normalizada usada tanto nos apelidos quanto no texto pesquisado."""
+    return _ESPACOS.sub(" ", normalizar(texto)).strip()
+
+
+def _pontuado(nome):
+    """"Michael Scott" -> "michael.scott" (o formato dos endereços da empresa)."""
+    return ".".join(palavras(nome))
+
+
+def _variantes_do_nome(nome):
+    """
+    Apelidos derivados de um nome completo.
+
+    Inclui o nome completo, o primeiro nome, o sobrenome e, para sobrenomes
+    compostos ("Phyllis Lapin-Vance"), cada parte isolada e combinada com o
+    primeiro nome ("Phyllis Vance", "Phyllis Lapin").
+    """
+    nome = _preparar(nome)
+    partes = nome.split(" ")
+    variantes = {nome, nome.replace("-", " ")}
+    if len(partes) < 2:
+        return variantes
+    primeiro, sobrenome = partes[0], partes[-1]
+    variantes.update({primeiro, sobrenome, sobrenome.replace("-", " ")})
+    for parte in sobrenome.split("-"):
+        variantes.update({parte, f"{primeiro} {parte}"})
+    return variantes
+
+
+def _e_pessoa(nome, endereco):
+    """
+    Um cabeçalho identifica uma pessoa quando o endereço segue o padrão
+    "nome.sobrenome@" e cada parte dele inicia uma palavra do nome
+    ("Phyllis Lapin-Vance" <phyllis.vance@...>, "Pamela Beesly" <pam.beesly@...>).
+
+    Descarta listas e apelidos genéricos ("All Staff" <all.scranton@...>,
+    "Sua Esposa" <terri.hudson@...>, "Grupo de Vendas" <vendas@...>).
+    """
+    local = endereco.split("@", 1)[0]
+    partes = [p for p in re.split(r"[._-]", local) if p]
+    palavras_nome = palavras(nome)
+    if len(partes) < 2 or _PALAVRAS_DE_GRUPO & set(palavras_nome):
+        return False
+    return all(any(p.startswith(parte) for p in palavras_nome) for parte in partes)
+
+
+class LigadorEntidades:
+    """
+    Liga menções a funcionários em texto livre ao seu ID canônico.
+
+    Os apelidos (nome completo, primeiro nome, sobrenome, endereços e variantes)
+    são compilados em um autômato de Aho–Corasick, de modo que qualquer texto é
+    percorrido uma única vez, independentemente do número de apelidos. As buscas
+    são feitas sobre o texto normalizado (minúsculas, sem acentos, espaços
+    simples) e só aceitam ocorrências delimitadas por caracteres que não sejam
+    letras ou dígitos ("Martin" não casa com "Martinez").
+    """
+
+    def __init__(self, apelidos):
+        self.apelidos = apelidos  # apelido normalizado -> ID canônico
+        self._transicoes = [{}]
+        self._falhas = [0]
+        self._saidas = [[]]
+
+        for apelido, id_canonico in apelidos.items():
+            estado = 0
+            for caractere in apelido:
+                proximo = self._transicoes[estado].get(caractere)
+                if proximo is None:
+                    proximo = len(self._transicoes)
+                    self._transicoes[estado][caractere] = proximo
+                    self._transicoes.append({})
+                    self._falhas.append(0)
+                    self._saidas.append([])
+                estado = proximo
+            self._saidas[estado].append((len(apelido), id_canonico))
+
+        # Links de falha em largura: cada estado herda as saídas do seu sufixo
+        fila = deque(self._transicoes[0].values())
+        while fila:
+            estado = fila.popleft()
+            for caractere, proximo in self._transicoes[estado].items():
+                fila.append(proximo)
+                falha = self._falhas[estado]
+                while falha and caractere not in self._transicoes[falha]:
+                    falha = self._falhas[falha]
+                destino = self._transicoes[falha].get(caractere, 0)
+                self._falhas[proximo] = destino if destino != proximo else 0
+                self._saidas[proximo] = (
+                    self._saidas[proximo] + self._saidas[self._falhas[proximo]]
+                )
+
+    def encontrar(self, texto):
+        """Produz (inicio, fim, id_canonico) para cada menção, em posições do texto normalizado."""
+        texto = _preparar(texto)
+        estado = 0
+        for posicao, caractere in enumerate(texto):
+            while estado and caractere not in self._transicoes[estado]:
+                estado = self._falhas[estado]
+            estado = self._transicoes[estado].get(caractere, 0)
+            for tamanho, id_canonico in self._saidas[estado]:
+                inicio = posicao - tamanho + 1
+                fim = posicao + 1
+                if inicio > 0 and texto[inicio - 1].isalnum():
+                    continue
+                if fim < len(texto) and texto[fim].isalnum():
+                    continue
+                yield inicio, fim, id_canonico
+
+    def ids_em(self, texto):
+        """IDs canônicos mencionados no texto, na ordem da primeira menção."""
+        ids = {}
+        for _, _, id_canonico in self.encontrar(texto):
+            ids.setdefault(id_canonico, None)
+        return list(ids)
+
+
+def construir_ligador(funcionarios, cabecalhos):
+    """
+    Monta o `LigadorEntidades` a partir do cadastro e dos cabeçalhos de e-mail.
+
+    - `funcionarios`: nomes do cadastro (coluna `funcionario` do CSV), que são os
+      IDs canônicos
+    - `cabecalhos`: pares (nome, endereço) vistos em De/Para. Um endereço
+      "nome.sobrenome@" é ligado ao funcionário de mesmo nome; pessoas que não
+      estão no cadastro usam como ID o primeiro nome visto com aquele endereço.
+
+    Apelidos que apontariam para mais de uma pessoa (um primeiro nome ou sobrenome
+    compartilhado) são descartados.
+    """
+    por_endereco = {_pontuado(nome): nome for nome in funcionarios}
+    nomes_por_id = {nome: {nome} for nome in funcionarios}
+    enderecos_por_id = {nome: set() for nome in funcionarios}
+
+    for nome, endereco in cabecalhos:
+        if not endereco or not _e_pessoa(nome, endereco):
+            continue
+        local = endereco.split("@", 1)[0]
+        id_canonico = por_endereco.setdefault(local, nome)
+        nomes_por_id.setdefault(id_canonico, set()).add(nome)
+        enderecos_por_id.setdefault(id_canonico, set()).update({endereco, local})
+
+    candidatos = {}
+    for id_canonico, nomes in nomes_por_id.items():
+        apelidos = set(enderecos_por_id[id_canonico])
+        for nome in nomes:
+            apelidos |= _variantes_do_nome(nome)
+        for apelido in apelidos:
+            if " " not in apelido and len(apelido) < TAMANHO_MINIMO_APELIDO:
+                continue
+            candidatos.setdefault(apelido, set()).add(id_canonico)
+
+    return LigadorEntidades(
+        {apelido: ids.pop() for apelido, ids in candidatos.items() if len(ids) == 1}
+    )
+
+
+def _cabecalhos(caminho_emails):
+    pares = set()
+    for email in iterar_emails(caminho_emails):
+        for nomes, enderecos in (
+            (email.de, email.de_email),
+            (email.para, email.para_email),
+        ):
+            nomes = nomes.split("; ")
+            enderecos = enderecos.split("; ")
+            if len(nomes) == len(enderecos):
+                pares.update(zip(nomes, enderecos))
+    return sorted(pares)
+
+
+def carregar_ligador(caminho_emails, caminho_transacoes=None):
+    """
+    Retorna o `LigadorEntidades` do dump de e-mails (e, se informado, do cadastro
+    de funcionários do CSV de transações), reconstruindo-o só quando um dos
+    arquivos muda.
+    """
+    caminhos = tuple(
+        os.path.abspath(c) if c else None for c in (caminho_emails, caminho_transacoes)
+    )
+    estados = tuple(
+        (os.stat(c).st_mtime_ns, os.stat(c).st_size) if c else None for c in caminhos
+    )
+
+    with _lock:
+        em_memoria = _ligadores.get(caminhos)
+        if em_memoria is not None and em_memoria[0] == estados:
+            return em_memoria[1]
+
+        funcionarios = []
+        if caminho_transacoes:
+            tabela = carregar_transacoes(caminho_transacoes)
+            funcionarios = [str(nome) for nome in tabela.rotulos["funcionario"]]
+        ligador = construir_ligador(funcionarios, _cabecalhos(caminho_emails))
+
+        _ligadores[caminhos] = (estados, ligador)
+        return ligador
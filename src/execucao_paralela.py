@@ -0,0 +1,84 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.telemetria import com_contexto, registrar
+
+# --- Variáveis Globais para Caching ---
+# Erros da API que costumam se resolver sozinhos (limite de taxa, indisponibilidade),
+# montados na primeira consulta para não importar o google.api_core na inicialização
+_erros_transitorios = None
+# ------------------------------------
+
+
+def erro_transitorio(erro):
+    """Indica se vale a pena repetir a chamada que gerou `erro`."""
+    global _erros_transitorios
+    if _erros_transitorios is None:
+        from google.api_core import exceptions as google_exceptions
+
+        _erros_transitorios = (
+            ConnectionError,
+            TimeoutError,
+            google_exceptions.TooManyRequests,
+            google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded,
+            google_exceptions.InternalServerError,
+        )
+    return isinstance(erro, _erros_transitorios)
+
+
+def executar_com_retentativas(
+    funcao,
+    *args,
+    max_tentativas=3,
+    espera_base=1.0,
+    espera_maxima=30.0,
+    repetir_se=erro_transitorio,
+    **kwargs,
+):
+    """
+    Executa `funcao(*args, **kwargs)`, repetindo em caso de erro transitório.
+
+    Entre as tentativas aplica backoff exponencial com jitter ("full jitter"):
+    a espera é sorteada entre 0 e min(espera_maxima, espera_base * 2**tentativa).
+    Erros para os quais `repetir_se` retorna False são propagados imediatamente; a
+    última exceção é propagada se todas as tentativas falharem.
+    """
+    for tentativa in range(max_tentativas):
+        try:
+            return funcao(*args, **kwargs)
+        except Exception as e:
+            if tentativa == max_tentativas - 1 or not repetir_se(e):
+                raise
+            limite = min(espera_maxima, espera_base * (2**tentativa))
+            espera = random.uniform(0, limite)
+            registrar(
+                "retentativa", espera, motivo=type(e).__name__, tentativa=tentativa + 1
+            )
+            time.sleep(espera)
+
+
+def executar_em_paralelo(funcao, itens, max_concorrencia=4, max_tentativas=3):
+    """
+    Aplica `funcao` a cada item mantendo até `max_concorrencia` chamadas em andamento.
+
+    Cada chamada é repetida com `executar_com_retentativas`. Os resultados voltam na
+    mesma ordem de `itens`, um dicionário por item com:
+      - "status": "ok" ou "erro"
+      - "resultado": valor retornado (quando "ok")
+      - "erro": mensagem da última falha (quando "erro")
+    Uma falha não interrompe os demais itens, permitindo reexecutar só os que falharam.
+    """
+
+    def executar(item):
+        try:
+            resultado = executar_com_retentativas(
+                funcao, item, max_tentativas=max_tentativas
+            )
+            return {"status": "ok", "resultado": resultado}
+        except Exception as e:
+            return {"status": "erro", "erro": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max_concorrencia) as executor:
+        return list(executor.map(com_contexto(executar), itens))
@@ -1,27 +1,63 @@
-import csv
 import os
-
-import dotenv
-import google.generativeai as genai
-
-# Carrega as variáveis de ambiente e configura a API
-dotenv.load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError(
-        "A chave de API do Gemini não foi encontrada. Defina a variável de ambiente GEMINI_API_KEY."
-    )
-genai.configure(api_key=api_key)
-
-
-def ler_transacoes(caminho_arquivo):
-    """Lê o arquivo CSV de transações e retorna uma lista de dicionários."""
-    transacoes = []
-    with open(caminho_arquivo, mode="r", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            transacoes.append(row)
-    return transacoes
+import re
+
+import numpy as np
+
+from src.anomalias import candidatos
+from src.auditoria import SEM_MARCA, hash_politica, registro_auditoria
+from src.cliente_llm import (
+    LLM_ORCAMENTO_TOKENS,
+    descrever_contexto,
+    descrever_ocupacao,
+    estatisticas_contexto,
+    empacotar,
+    estimar_tokens,
+    gerar,
+)
+from src.emails import iterar_emails, ler_emails
+from src.entidades import carregar_ligador
+from src.execucao_paralela import executar_em_paralelo
+from src.indice_emails import buscar_emails
+from src.regras_compliance import compilar_regras
+from src.saida_estruturada import (
+    ESQUEMA_ACHADOS,
+    ESQUEMA_FRAUDES,
+    analisar_com_revalidacao,
+    config_json,
+    ler_registros,
+    resposta_valida,
+    validar_achado,
+    validar_fraude_contextual,
+    validar_registros,
+)
+from src.texto import normalizar
+from src.transacoes import carregar_transacoes
+
+# Consulta opcional para restringir a etapa 1 a e-mails que mencionam valores,
+# pagamentos ou lançamentos (por padrão, a caixa inteira é analisada)
+CONSULTA_EMAILS_CANDIDATOS = (
+    "has:valor OR term:reembols* OR term:recibo* OR term:fatura* OR term:boleto* "
+    "OR term:cartao OR term:custo* OR term:despesa* OR term:verba* OR term:lanc* "
+    "OR term:pedido* OR term:aprova* OR term:nota OR term:dinheiro"
+)
+
+# Nome do detector no registro de auditoria (a etapa 1 é registrada por e-mail)
+DETECTOR = "fraude_complexa"
+
+# Limite opcional de requisições da etapa 3: as transações dos suspeitos, das
+# citadas nos e-mails e mais atípicas para as menos, preenchem até este número de
+# lotes do orçamento e as que sobram são listadas em "transacoes_nao_enviadas"
+# (0: todas as transações são enviadas)
+MAX_LOTES_TRANSACOES = int(os.getenv("FRAUDE_LOTES_TRANSACOES", "0")) or None
+# Termos de uma descrição procurados nos e-mails de evidência: o fornecedor
+# ("<Fornecedor> - <descrição>") e a descrição inteira, se tiverem ao menos este
+# número de caracteres
+MIN_CARACTERES_TERMO = 4
+
+# Respostas das etapas 1 (achados nos e-mails) e 3 (fraudes por transação)
+# restritas aos esquemas JSON de `src/saida_estruturada.py`
+CONFIG_ACHADOS = config_json(ESQUEMA_ACHADOS)
+CONFIG_FRAUDES = config_json(ESQUEMA_FRAUDES)
 
 
 def ler_politica(caminho_arquivo):
@@ -30,72 +66,36 @@ def ler_politica(caminho_arquivo):
         return f.read()
 
 
-def parse_emails(file_path):
-    """Analisa o arquivo de texto de e-mails e o divide em uma lista de dicionários."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        content = f.read()
-    email_blocks = content.strip().split("---")
-    parsed_emails = []
-    for block in email_blocks:
-        if not block.strip():
-            continue
-        email_data = {}
-        lines = block.strip().split("\n")
-        for line in lines:
-            if line.startswith("De:"):
-                email_data["de"] = line.split(":", 1)[1].strip()
-            elif line.startswith("Para:"):
-                email_data["para"] = line.split(":", 1)[1].strip()
-            elif line.startswith("Assunto:"):
-                email_data["assunto"] = line.split(":", 1)[1].strip()
-            elif "corpo" not in email_data:
-                email_data["corpo"] = line
-            else:
-                email_data["corpo"] += "\n" + line
-        parsed_emails.append(email_data)
-    return parsed_emails
-
-
-def analisar_transacoes_complexas(caminho_transacoes, caminho_politica, caminho_emails):
+def _prefixo_politica(politica):
     """
-    Analisa fraudes que SÓ PODEM SER DESCOBERTAS COM CONTEXTO DE COMUNICAÇÃO.
-
-    Fluxo:
-    1. Primeiro, analisa TODOS os e-mails para identificar padrões suspeitos
-       (conluios, combinações de desvio de verba, conspirações)
-    2. Depois, busca transações relacionadas aos funcionários/temas suspeitos
-    3. Cruza as informações para identificar fraudes contextuais
+    Parte fixa dos prompts das etapas 1 e 3 (papel + política).
 
-    Este detector NÃO verifica violações diretas - isso é trabalho do detector simples.
+    É idêntica em todos os shards e na análise final, para ser registrada uma única
+    vez no cache de contexto.
     """
-    transacoes = ler_transacoes(caminho_transacoes)
-    politica = ler_politica(caminho_politica)
-    todos_emails = parse_emails(caminho_emails)
+    return f"""Você é um investigador e auditor forense da Dunder Mifflin.
 
-    model = genai.GenerativeModel(
-        "gemini-2.5-flash", generation_config={"temperature": 0.1}
-    )
+        POLÍTICA DE COMPLIANCE (para referência):
+        {politica}
+    """
 
-    print(
-        "[Fraude Complexa] Etapa 1: Analisando e-mails em busca de padrões suspeitos..."
-    )
 
-    # ETAPA 1: Analisar e-mails para encontrar comportamentos suspeitos
-    # Limitado para testes
-    max_emails = 50
-    emails_formatados = ""
-    for i, email in enumerate(todos_emails[:max_emails]):
-        emails_formatados += f"""
-E-mail #{i + 1}:
-De: {email.get("de", "N/A")}
-Para: {email.get("para", "N/A")}
-Assunto: {email.get("assunto", "N/A")}
-Corpo: {email.get("corpo", "")[:300]}
+def _formatar_email(email):
+    data = email.data.strftime("%Y-%m-%d %H:%M") if email.data else "N/A"
+    return f"""
+E-mail #{email.id}:
+De: {email.de or "N/A"}
+Para: {email.para or "N/A"}
+Data: {data}
+Assunto: {email.assunto or "N/A"}
+Corpo: {email.corpo}
 ---
 """
 
-    prompt_emails = f"""Você é um investigador forense da Dunder Mifflin.
 
+def _prompt_shard(emails_formatados):
+    """Parte variável do prompt da etapa 1: os e-mails do shard e o formato da resposta."""
+    return f"""
         TAREFA: Analisar os e-mails abaixo e identificar COMUNICAÇÕES SUSPEITAS que possam indicar:
         - Funcionários combinando fraudes ou desvios de verba
         - Conluio para burlar regras de compliance
@@ -105,41 +105,383 @@ Corpo: {email.get("corpo", "")[:300]}
         E-MAILS:
         {emails_formatados}
 
-        POLÍTICA DE COMPLIANCE (para referência):
-        {politica}
-
         INSTRUÇÕES:
         1. Identifique e-mails que indicam comportamento fraudulento ou suspeito
-        2. Liste os funcionários envolvidos e o tipo de fraude suspeita
-        3. Se não houver nada suspeito, responda: "Nenhuma comunicação suspeita identificada."
+        2. Para cada suspeita, liste os funcionários envolvidos (nomes completos), o tipo
+           de fraude suspeita e os números dos e-mails que servem de evidência
+        3. Se não houver nada suspeito, retorne uma lista vazia
+
+        FORMATO DE RESPOSTA (JSON):
+        {{"achados": [{{"funcionarios": ["Nome"], "tipo": "descrição", "evidencia_email_ids": [1, 2]}}]}}
+    """
 
-        FORMATO DE RESPOSTA (se houver suspeitas):
-        - Funcionários: [nomes]
-        - Tipo de fraude suspeita: [descrição]
-        - Evidência: [trecho do e-mail]
 
-        ANÁLISE:
+def _analisar_emails(politica, emails):
     """
+    Envia e-mails (pares (ID, texto formatado)) ao LLM.
+
+    Retorna (achados válidos, IDs dos e-mails citados por achados fora do esquema).
+    """
+    ids_emails = {id_email for id_email, _ in emails}
+    resposta = gerar(
+        _prompt_shard("".join(texto for _, texto in emails)),
+        generation_config=CONFIG_ACHADOS,
+        prefixo=_prefixo_politica(politica),
+        aceitar=resposta_valida("achados", validar_achado, ids_emails),
+    )
+    achados, a_repetir, _ = validar_registros(
+        ler_registros(resposta, "achados"),
+        validar_achado,
+        ids_emails,
+    )
+    return achados, a_repetir
 
-    try:
-        response = model.generate_content(prompt_emails)
-        analise_emails = response.text.strip()
-    except Exception as e:
-        return [{"erro": f"Erro ao analisar e-mails: {e}"}]
 
-    if "Nenhuma comunicação suspeita identificada." in analise_emails:
+def _analisar_shard(politica, shard):
+    """
+    Etapa "map": analisa um shard de e-mails e retorna os achados estruturados.
+
+    Cada achado é {"funcionarios": [...], "tipo": str, "evidencia_email_ids": [...]},
+    com as evidências restritas aos IDs presentes no shard. Os e-mails citados por
+    achados fora do esquema são reanalisados sozinhos; os que continuam inválidos
+    são retornados à parte.
+    """
+    return analisar_com_revalidacao(
+        lambda emails: _analisar_emails(politica, emails), shard, lambda email: email[0]
+    )
+
+
+def _achados_por_email(shard, achados):
+    """
+    Distribui os achados de um shard entre seus e-mails para o registro de
+    auditoria: cada achado fica com o seu primeiro e-mail de evidência (ou com o
+    primeiro e-mail do shard) e os demais e-mails ficam com uma lista vazia.
+    """
+    por_email = {id_email: [] for id_email, _ in shard}
+    if not por_email:
+        return por_email
+    for achado in achados:
+        evidencias = [i for i in achado["evidencia_email_ids"] if i in por_email]
+        por_email[evidencias[0] if evidencias else shard[0][0]].append(achado)
+    return por_email
+
+
+def _prompt_final(analise_emails, transacoes_formatadas):
+    """Parte variável do prompt da etapa 3: achados dos e-mails, transações e formato da resposta."""
+    return f"""
+        CONTEXTO: Foram identificadas comunicações suspeitas nos e-mails da empresa.
+
+        ANÁLISE DOS E-MAILS:
+        {analise_emails}
+
+        TRANSAÇÕES DOS FUNCIONÁRIOS MENCIONADOS (primeiro as citadas nos e-mails, depois
+        da mais para a menos atípica, com os sinais que as destacaram):
+        {transacoes_formatadas}
+
+        TAREFA: Cruze as informações e identifique transações que, COM BASE NAS COMUNICAÇÕES,
+        representam fraudes ou desvios de verba.
+
+        IMPORTANTE: Estas são fraudes que SÓ PODEM SER DESCOBERTAS com o contexto dos e-mails.
+        (Transações que parecem normais isoladamente, mas são fraudulentas considerando as comunicações)
+
+        INSTRUÇÕES:
+        1. Para cada transação fraudulenta, informe o ID, o funcionário, o tipo de fraude, os
+           números dos e-mails que servem de evidência e uma justificativa curta
+        2. Se nenhuma transação for fraudulenta, retorne uma lista vazia
+
+        FORMATO DE RESPOSTA (JSON):
+        {{"fraudes": [{{"id_transacao": "TX_0000", "funcionario": "Nome", "tipo": "descrição", "evidencia_email_ids": [1], "justificativa": "..."}}]}}
+    """
+
+
+def _analisar_transacoes(politica, analise_emails, transacoes):
+    """
+    Etapa 3 para um lote de transações (pares (ID, linha formatada)).
+
+    Retorna (fraudes válidas, IDs citados por registros fora do esquema).
+    """
+    ids_transacoes = {id_transacao for id_transacao, _ in transacoes}
+    resposta = gerar(
+        _prompt_final(analise_emails, "".join(linha for _, linha in transacoes)),
+        generation_config=CONFIG_FRAUDES,
+        prefixo=_prefixo_politica(politica),
+        aceitar=resposta_valida("fraudes", validar_fraude_contextual, ids_transacoes),
+    )
+    fraudes, a_repetir, _ = validar_registros(
+        ler_registros(resposta, "fraudes"),
+        validar_fraude_contextual,
+        ids_transacoes,
+    )
+    return fraudes, a_repetir
+
+
+def _termos_da_descricao(descricao):
+    """Fornecedor (antes de " - " ou " (") e descrição inteira, normalizados."""
+    descricao = " ".join(normalizar(descricao).split())
+    fornecedor = re.split(r" - | \(", descricao, maxsplit=1)[0].strip()
+    return {t for t in (fornecedor, descricao) if len(t) >= MIN_CARACTERES_TERMO}
+
+
+def _transacoes_citadas(tabela, indices, caminho_emails, achados):
+    """
+    Posições de `indices` cujo fornecedor ou descrição aparece nos e-mails de
+    evidência dos achados (assunto e corpo) ou no tipo de fraude descrito.
+    """
+    ids_evidencia = sorted({i for a in achados for i in a["evidencia_email_ids"]})
+    textos = [a["tipo"] for a in achados]
+    textos += [
+        f"{email.assunto}\n{email.corpo}"
+        for email in ler_emails(caminho_emails, ids_evidencia)
+    ]
+    texto = " ".join(normalizar(" ".join(textos)).split())
+
+    codigos = tabela.codigos["descricao"][indices]
+    citados = [
+        codigo
+        for codigo in np.unique(codigos)
+        if any(
+            re.search(rf"\b{re.escape(termo)}\b", texto)
+            for termo in _termos_da_descricao(str(tabela.rotulos["descricao"][codigo]))
+        )
+    ]
+    return np.asarray(indices)[np.isin(codigos, citados)]
+
+
+def _reduzir_achados(achados):
+    """
+    Etapa "reduce": une os achados de todos os shards.
+
+    Achados com o mesmo conjunto de funcionários (ignorando caixa e acentos) são
+    fundidos em um só, acumulando os tipos de fraude e os e-mails de evidência.
+    """
+    unidos = {}
+    for achado in achados:
+        chave = frozenset(normalizar(f) for f in achado["funcionarios"])
+        if not chave:
+            chave = frozenset(f"#{i}" for i in achado["evidencia_email_ids"])
+        atual = unidos.setdefault(
+            chave,
+            {"funcionarios": [], "tipos": [], "evidencia_email_ids": set()},
+        )
+        conhecidos = {normalizar(f) for f in atual["funcionarios"]}
+        for funcionario in achado["funcionarios"]:
+            if normalizar(funcionario) not in conhecidos:
+                conhecidos.add(normalizar(funcionario))
+                atual["funcionarios"].append(funcionario)
+        if achado["tipo"] and achado["tipo"] not in atual["tipos"]:
+            atual["tipos"].append(achado["tipo"])
+        atual["evidencia_email_ids"].update(achado["evidencia_email_ids"])
+
+    return [
+        {
+            "funcionarios": achado["funcionarios"],
+            "tipo": "; ".join(achado["tipos"]),
+            "evidencia_email_ids": sorted(achado["evidencia_email_ids"]),
+        }
+        for achado in unidos.values()
+    ]
+
+
+def _formatar_fraudes(fraudes):
+    linhas = []
+    for fraude in fraudes:
+        evidencias = ", ".join(f"#{i}" for i in fraude["evidencia_email_ids"])
+        linhas.append(
+            f"- {fraude['id_transacao']} | {fraude['funcionario']} | {fraude['tipo']}\n"
+            f"  Evidência: e-mails {evidencias or 'N/A'}\n"
+            f"  {fraude['justificativa']}"
+        )
+    return "\n".join(linhas)
+
+
+def _formatar_achados(achados):
+    linhas = []
+    for achado in achados:
+        evidencias = ", ".join(f"#{i}" for i in achado["evidencia_email_ids"])
+        linhas.append(
+            f"- Funcionários: {', '.join(achado['funcionarios']) or 'N/A'}\n"
+            f"- Tipo de fraude suspeita: {achado['tipo'] or 'N/A'}\n"
+            f"- Evidência: e-mails {evidencias or 'N/A'}"
+        )
+    return "\n\n".join(linhas)
+
+
+def analisar_transacoes_complexas(
+    caminho_transacoes,
+    caminho_politica,
+    caminho_emails,
+    orcamento_tokens=LLM_ORCAMENTO_TOKENS,
+    max_concorrencia=4,
+    consulta_emails=None,
+    incremental=True,
+    max_lotes_transacoes=MAX_LOTES_TRANSACOES,
+):
+    """
+    Analisa fraudes que SÓ PODEM SER DESCOBERTAS COM CONTEXTO DE COMUNICAÇÃO.
+
+    Fluxo:
+    1. Primeiro, analisa os e-mails em map-reduce: a caixa é dividida em shards que
+       preenchem até `orcamento_tokens` tokens por requisição, cada shard é analisado em paralelo (até
+       `max_concorrencia` chamadas) e os achados estruturados (funcionários, tipo de
+       fraude, e-mails de evidência) são unidos e deduplicados
+    2. Depois, liga os funcionários listados nos achados ao cadastro e busca as
+       suas transações
+    3. Cruza as informações para identificar fraudes contextuais; cada fraude é
+       um registro {id_transacao, funcionario, tipo, evidencia_email_ids,
+       justificativa}. As transações dos funcionários suspeitos são ordenadas
+       pelo pré-filtro estatístico (`src/anomalias.py`: valores atípicos, compras
+       fracionadas, duplicadas, dias atípicos), com as de fornecedor ou descrição
+       citados nos e-mails de evidência à frente, e preenchem nessa ordem
+       requisições do mesmo orçamento de tokens. Por padrão todas são enviadas;
+       com `max_lotes_transacoes`, as que não cabem nesse número de requisições
+       são listadas em "transacoes_nao_enviadas"
+
+    As etapas 1 e 3 pedem JSON restrito a um esquema (`src/saida_estruturada.py`).
+    Registros fora do esquema não derrubam o shard ou o lote: só os e-mails ou
+    transações que eles citam são reenviados ao LLM, um a um.
+
+    Por padrão todos os e-mails do dump são analisados; `consulta_emails` (por
+    exemplo, `CONSULTA_EMAILS_CANDIDATOS`) restringe a etapa 1 aos e-mails que a
+    satisfazem no índice invertido. E-mails de shards que falharam são listados em
+    "emails_nao_analisados" e transações de lotes da etapa 3 que falharam, em
+    "transacoes_nao_analisadas", sem descartar o resultado dos demais lotes.
+
+    Com `incremental`, os achados da etapa 1 ficam no registro de auditoria
+    (`src/auditoria.py`) por e-mail, sob o hash das seções da política: só os
+    e-mails ainda não analisados com essa versão da política (os novos desde a
+    última auditoria, os de shards que falharam ou todos, se a política mudar)
+    são enviados ao LLM, e os achados anteriores entram no reduce. Sem
+    `consulta_emails`, só o trecho do dump depois da marca d'água é lido; a marca
+    avança quando todos os e-mails lidos foram registrados. As etapas 2 e 3
+    são refeitas sobre os achados unidos (chamadas idênticas às de uma execução
+    anterior são atendidas pelo cache de respostas do LLM).
+
+    Este detector NÃO verifica violações diretas - isso é trabalho do detector simples.
+    """
+    tabela = carregar_transacoes(caminho_transacoes)
+    politica = ler_politica(caminho_politica)
+
+    # Sem `consulta_emails`, a auditoria incremental lê só os e-mails depois da
+    # marca d'água do dump; os anteriores entram pelos achados registrados
+    marca = SEM_MARCA
+    if incremental:
+        hash_atual = hash_politica(politica)
+        marca = registro_auditoria.verificar_fonte(DETECTOR, caminho_emails, hash_atual)
+        anteriores = registro_auditoria.analisados(DETECTOR, caminho_emails, hash_atual)
+    if consulta_emails:
+        emails = buscar_emails(caminho_emails, consulta_emails)
+    else:
+        emails = iterar_emails(caminho_emails, marca.posicao, marca.itens + 1)
+    emails = list(emails)
+
+    achados = []
+    ja_analisados = 0
+    if incremental:
+        novos = [email for email in emails if str(email.id) not in anteriores]
+        if consulta_emails:
+            ids_lidos = {str(email.id) for email in emails}
+            registrados = [id_e for id_e in anteriores if id_e in ids_lidos]
+        else:
+            registrados = list(anteriores)
+        for id_email in registrados:
+            achados.extend(anteriores[id_email])
+        ja_analisados = len(registrados)
+        print(
+            f"[Fraude Complexa] Auditoria incremental: {ja_analisados} e-mails "
+            f"já analisados com esta versão da política, {len(novos)} pendentes."
+        )
+        emails_lidos = emails
+        emails = novos
+
+    textos_emails = [_formatar_email(email) for email in emails]
+    lotes_emails = empacotar(
+        textos_emails,
+        orcamento_tokens,
+        estimar_tokens(_prefixo_politica(politica) + _prompt_shard("")),
+    )
+    shards = [
+        [(emails[i].id, textos_emails[i]) for i in range(lote.inicio, lote.fim)]
+        for lote in lotes_emails
+    ]
+
+    print(
+        f"[Fraude Complexa] Etapa 1: Analisando {len(emails)} e-mails em busca de "
+        f"padrões suspeitos: {descrever_ocupacao(lotes_emails)}..."
+    )
+
+    # ETAPA 1: map (shards em paralelo) + reduce (união dos achados)
+    contexto_antes = estatisticas_contexto()
+    resultados_shards = executar_em_paralelo(
+        lambda shard: _analisar_shard(politica, shard),
+        shards,
+        max_concorrencia=max_concorrencia,
+    )
+    print(f"[Fraude Complexa] Etapa 1, cache de contexto: {descrever_contexto(contexto_antes)}.")
+
+    emails_nao_analisados = []
+    erros = []
+    for shard, resultado in zip(shards, resultados_shards):
+        if resultado["status"] == "ok":
+            achados_shard, invalidos = resultado["resultado"]
+            achados.extend(achados_shard)
+            # E-mails com resposta fora do esquema não são registrados: a próxima
+            # auditoria os envia de novo ao LLM
+            emails_nao_analisados.extend(invalidos)
+            if incremental:
+                validos = [email for email in shard if email[0] not in invalidos]
+                registro_auditoria.registrar(
+                    DETECTOR,
+                    caminho_emails,
+                    hash_atual,
+                    _achados_por_email(validos, achados_shard),
+                )
+        else:
+            emails_nao_analisados.extend(id_email for id_email, _ in shard)
+            erros.append(resultado["erro"])
+
+    # A marca d'água só avança quando todos os e-mails lidos foram registrados
+    if incremental and not consulta_emails and not emails_nao_analisados and emails_lidos:
+        ultimo = emails_lidos[-1]
+        registro_auditoria.avancar_marca(
+            DETECTOR, caminho_emails, hash_atual, ultimo.fim, ultimo.id
+        )
+
+    if shards and len(erros) == len(shards) and not ja_analisados:
+        return [{"erro": f"Erro ao analisar e-mails: {erros[0]}"}]
+    if emails_nao_analisados:
+        print(
+            f"[Fraude Complexa] Aviso: {len(erros)} shard(s) falharam; "
+            f"{len(emails_nao_analisados)} e-mails não foram analisados "
+            "(falhas ou respostas fora do esquema)."
+        )
+
+    achados = _reduzir_achados(achados)
+
+    if not achados:
         print("[Fraude Complexa] Nenhuma comunicação suspeita encontrada nos e-mails.")
+        if emails_nao_analisados:
+            return [
+                {
+                    "tipo": "Análise de E-mails Incompleta",
+                    "emails_nao_analisados": emails_nao_analisados,
+                }
+            ]
         return []
 
+    analise_emails = _formatar_achados(achados)
+
     print("[Fraude Complexa] Etapa 2: Buscando transações relacionadas às suspeitas...")
 
     # ETAPA 2: Com base nas suspeitas, buscar transações relacionadas
-    # Extrai nomes dos funcionários mencionados na análise
-    funcionarios_suspeitos = set()
-    for transacao in transacoes:
-        nome = transacao["funcionario"].lower()
-        if nome in analise_emails.lower():
-            funcionarios_suspeitos.add(transacao["funcionario"])
+    # Liga os nomes e apelidos listados nos achados aos funcionários do cadastro
+    ligador = carregar_ligador(caminho_emails, caminho_transacoes)
+    funcionarios_suspeitos = {}
+    for achado in achados:
+        for nome in achado["funcionarios"]:
+            for id_funcionario in ligador.ids_em(nome):
+                if tabela.codigo("funcionario", id_funcionario) >= 0:
+                    funcionarios_suspeitos.setdefault(id_funcionario, None)
+    funcionarios_suspeitos = list(funcionarios_suspeitos)
 
     if not funcionarios_suspeitos:
         print("[Fraude Complexa] Não foi possível vincular suspeitas a transações.")
@@ -147,68 +489,118 @@ Corpo: {email.get("corpo", "")[:300]}
             {
                 "tipo": "Comunicação Suspeita (sem vínculo a transações)",
                 "analise_emails": analise_emails,
+                "achados": achados,
+                "emails_nao_analisados": emails_nao_analisados,
                 "transacoes_vinculadas": [],
             }
         ]
 
-    # Filtra transações dos funcionários suspeitos
-    transacoes_suspeitas = [
-        t for t in transacoes if t["funcionario"] in funcionarios_suspeitos
+    # Transações dos funcionários suspeitos (busca no índice por funcionário),
+    # ordenadas pelo pré-filtro estatístico: primeiro as citadas nos e-mails de
+    # evidência, depois da mais para a menos atípica
+    indices_suspeitos = tabela.indices_por_funcionario(funcionarios_suspeitos)
+    alcadas = [
+        limite for _, limite in compilar_regras(politica)["alcadas"] if limite > 0
     ]
+    citadas = _transacoes_citadas(tabela, indices_suspeitos, caminho_emails, achados)
+    candidatas = candidatos(tabela, indices_suspeitos, alcadas, citadas)
 
-    if not transacoes_suspeitas:
-        return [
-            {
-                "tipo": "Comunicação Suspeita (sem transações encontradas)",
-                "analise_emails": analise_emails,
-                "transacoes_vinculadas": [],
-            }
-        ]
-
-    # Formata transações para análise final (limitado para testes)
-    transacoes_formatadas = ""
-    for t in transacoes_suspeitas[:50]:
-        transacoes_formatadas += f"ID: {t['id_transacao']} | {t['funcionario']} | ${t['valor']} | {t['descricao']}\n"
-
+    # ETAPA 3: Análise final cruzando e-mails + transações. As transações, na ordem
+    # do pré-filtro, preenchem as requisições do orçamento (até `max_lotes_transacoes`)
+    transacoes = []
+    for candidata in candidatas:
+        t = tabela.registro(candidata.indice)
+        transacoes.append(
+            (
+                t["id_transacao"],
+                f"ID: {t['id_transacao']} | {t['data']} | {t['funcionario']} | "
+                f"${t['valor']} | {t['descricao']} | {t['categoria']} | "
+                f"Sinais: {', '.join(candidata.motivos) or 'nenhum'}\n",
+            )
+        )
+    lotes_transacoes = empacotar(
+        [linha for _, linha in transacoes],
+        orcamento_tokens,
+        estimar_tokens(_prefixo_politica(politica) + _prompt_final(analise_emails, "")),
+    )
+    if max_lotes_transacoes is not None:
+        lotes_transacoes = lotes_transacoes[:max_lotes_transacoes]
+    enviadas = candidatas[: lotes_transacoes[-1].fim] if lotes_transacoes else []
+    nao_enviadas = candidatas[len(enviadas) :]
     print(
-        f"[Fraude Complexa] Etapa 3: Analisando {min(len(transacoes_suspeitas), 50)} transações de funcionários suspeitos..."
+        f"[Fraude Complexa] Pré-filtro: {len(enviadas)} de {len(candidatas)} "
+        f"transações dos funcionários suspeitos cabem em {len(lotes_transacoes)} "
+        f"requisição(ões) ({len(citadas)} citadas nos e-mails, "
+        f"{sum(c.pontuacao > 0 for c in enviadas)} com sinais de anomalia)."
     )
 
-    # ETAPA 3: Análise final cruzando e-mails + transações
-    prompt_final = f"""Você é um auditor forense da Dunder Mifflin.
-
-        CONTEXTO: Foram identificadas comunicações suspeitas nos e-mails da empresa.
-
-        ANÁLISE DOS E-MAILS:
-        {analise_emails}
-
-        TRANSAÇÕES DOS FUNCIONÁRIOS MENCIONADOS:
-        {transacoes_formatadas}
-
-        POLÍTICA DE COMPLIANCE:
-        {politica}
-
-        TAREFA: Cruze as informações e identifique transações que, COM BASE NAS COMUNICAÇÕES,
-        representam fraudes ou desvios de verba.
-
-        IMPORTANTE: Estas são fraudes que SÓ PODEM SER DESCOBERTAS com o contexto dos e-mails.
-        (Transações que parecem normais isoladamente, mas são fraudulentas considerando as comunicações)
-
-        RELATÓRIO FINAL:
-    """
+    print(
+        f"[Fraude Complexa] Etapa 3: Analisando {len(enviadas)} transações de funcionários "
+        f"suspeitos: {descrever_ocupacao(lotes_transacoes)}..."
+    )
 
-    try:
-        response = model.generate_content(prompt_final)
-        resultado_final = response.text.strip()
-    except Exception as e:
-        return [{"erro": f"Erro na análise final: {e}"}]
+    contexto_antes = estatisticas_contexto()
+    resultados = executar_em_paralelo(
+        lambda lote: analisar_com_revalidacao(
+            lambda itens: _analisar_transacoes(politica, analise_emails, itens),
+            transacoes[lote.inicio : lote.fim],
+            lambda item: item[0],
+        ),
+        lotes_transacoes,
+        max_concorrencia=max_concorrencia,
+    )
+    print(f"[Fraude Complexa] Etapa 3, cache de contexto: {descrever_contexto(contexto_antes)}.")
+    # Lotes que falharam não derrubam os demais: as suas transações vão para
+    # "transacoes_nao_analisadas", como as de resposta fora do esquema
+    fraudes = []
+    transacoes_invalidas = []
+    erros = []
+    for lote, resultado in zip(lotes_transacoes, resultados):
+        if resultado["status"] == "ok":
+            fraudes.extend(resultado["resultado"][0])
+            transacoes_invalidas.extend(resultado["resultado"][1])
+        else:
+            transacoes_invalidas.extend(
+                id_transacao for id_transacao, _ in transacoes[lote.inicio : lote.fim]
+            )
+            erros.append(resultado["erro"])
+    if lotes_transacoes and len(erros) == len(lotes_transacoes):
+        return [{"erro": f"Erro na análise final: {erros[0]}"}]
+    if transacoes_invalidas:
+        print(
+            f"[Fraude Complexa] Aviso: {len(erros)} lote(s) falharam; "
+            f"{len(transacoes_invalidas)} transações não foram analisadas "
+            "(falhas ou respostas fora do esquema)."
+        )
+    fraudes.sort(key=lambda f: f["id_transacao"])
 
     return [
         {
             "tipo": "Fraude Contextual Identificada",
             "analise_emails": analise_emails,
-            "funcionarios_suspeitos": list(funcionarios_suspeitos),
-            "relatorio_final": resultado_final,
+            "achados": achados,
+            "emails_nao_analisados": emails_nao_analisados,
+            "funcionarios_suspeitos": funcionarios_suspeitos,
+            "fraudes": fraudes,
+            "transacoes_candidatas": [
+                {
+                    "id_transacao": c.id_transacao,
+                    "pontuacao": round(c.pontuacao, 3),
+                    "motivos": c.motivos,
+                }
+                for c in enviadas
+            ],
+            "transacoes_nao_enviadas": [
+                {
+                    "id_transacao": c.id_transacao,
+                    "pontuacao": round(c.pontuacao, 3),
+                    "motivos": c.motivos,
+                }
+                for c in nao_enviadas
+            ],
+            "transacoes_nao_analisadas": transacoes_invalidas,
+            "relatorio_final": _formatar_fraudes(fraudes)
+            or "Nenhuma transação fraudulenta identificada.",
         }
     ]
 
@@ -229,6 +621,10 @@ if __name__ == "__main__":
                 print(f"Erro: {s['erro']}")
             else:
                 print(f"\nTipo: {s.get('tipo', 'N/A')}")
+                if s.get("emails_nao_analisados"):
+                    print(
+                        f"\nE-mails não analisados: {s['emails_nao_analisados']}"
+                    )
                 print(f"\nAnálise dos E-mails:\n{s.get('analise_emails', 'N/A')}")
                 print(
                     f"\nFuncionários Suspeitos: {s.get('funcionarios_suspeitos', [])}"
@@ -1,27 +1,40 @@
-import csv
 import os
 
-import dotenv
-import google.generativeai as genai
+import numpy as np
 
-# Carrega as variáveis de ambiente e configura a API
-dotenv.load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key:
-    raise ValueError(
-        "A chave de API do Gemini não foi encontrada. Defina a variável de ambiente GEMINI_API_KEY."
-    )
-genai.configure(api_key=api_key)
+from src.auditoria import SEM_MARCA, hash_politica, registro_auditoria
+from src.cliente_llm import (
+    LLM_ORCAMENTO_TOKENS,
+    descrever_contexto,
+    descrever_ocupacao,
+    estatisticas_contexto,
+    empacotar,
+    estimar_tokens,
+    gerar,
+)
+from src.execucao_paralela import executar_em_paralelo
+from src.regras_compliance import avaliar_transacoes, compilar_regras
+from src.saida_estruturada import (
+    ESQUEMA_VIOLACOES,
+    analisar_com_revalidacao,
+    config_json,
+    ler_registros,
+    resposta_valida,
+    validar_registros,
+    validar_violacao,
+)
+from src.transacoes import carregar_transacoes
 
+# Nome do detector no registro de auditoria e seções da política de que ele
+# depende (alçadas, categorias e lista negra): mudar as demais não invalida nada
+DETECTOR = "fraude_simples"
+SECOES_POLITICA = ("1", "2", "3")
+# Versão dos vereditos gravados no registro de auditoria (formato e triagem das
+# regras): trocá-la descarta a marca d'água e as linhas que a triagem antiga não enviou
+FORMATO_REGISTRO = "json-v2"
 
-def ler_transacoes(caminho_arquivo):
-    """Lê o arquivo CSV de transações e retorna uma lista de dicionários."""
-    transacoes = []
-    with open(caminho_arquivo, mode="r", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            transacoes.append(row)
-    return transacoes
+# Resposta do LLM restrita ao esquema {"violacoes": [{id_transacao, funcionario, regra, severidade}]}
+CONFIG_JSON = config_json(ESQUEMA_VIOLACOES)
 
 
 def ler_politica(caminho_arquivo):
@@ -30,74 +43,304 @@ def ler_politica(caminho_arquivo):
         return f.read()
 
 
+def _formatar_transacao(i, transacao):
+    return f"#{i + 1} | ID: {transacao['id_transacao']} | {transacao['data']} | {transacao['funcionario']} | ${transacao['valor']} | {transacao['descricao']}\n"
+
+
+def _prefixo_politica(politica):
+    """Parte fixa do prompt (instruções + política), compartilhada por todos os lotes."""
+    return f"""Você é um auditor de compliance da Dunder Mifflin.
+
+                TAREFA: Identificar transações que, POR SI SÓ, violam a política de compliance.
+                (Não considere conspirações ou contexto de e-mails - apenas se a transação viola regras diretamente)
+
+                POLÍTICA DE COMPLIANCE:
+                {politica}
+            """
+
+
+def _prompt_lote(linhas):
+    """Parte variável do prompt: as transações do lote e o formato da resposta."""
+    return f"""
+                TRANSAÇÕES PARA ANÁLISE:
+                {"".join(linhas)}
+
+                INSTRUÇÕES:
+                1. Verifique cada transação contra as regras da política
+                2. Uma violação DIRETA é quando a transação, por si só, quebra uma regra (ex: valor acima do limite, categoria proibida)
+                3. Liste APENAS violações diretas, uma por regra quebrada, com o ID da transação,
+                   o funcionário, a regra (descrição breve) e a severidade (baixa, media ou alta)
+                4. Se nenhuma transação violar diretamente a política, retorne uma lista vazia
+
+                FORMATO DE RESPOSTA (JSON):
+                {{"violacoes": [{{"id_transacao": "TX_0000", "funcionario": "Nome", "regra": "descrição", "severidade": "alta"}}]}}
+            """
+
+
+def _analisar_lote(politica, itens):
+    """
+    Envia um lote de transações (pares (ID, linha formatada)) ao LLM.
+
+    Retorna (violações válidas, IDs citados por violações fora do esquema).
+    """
+    ids_transacoes = {id_transacao for id_transacao, _ in itens}
+    resposta = gerar(
+        _prompt_lote([linha for _, linha in itens]),
+        generation_config=CONFIG_JSON,
+        prefixo=_prefixo_politica(politica),
+        aceitar=resposta_valida("violacoes", validar_violacao, ids_transacoes),
+    )
+    validas, a_repetir, _ = validar_registros(
+        ler_registros(resposta, "violacoes"),
+        validar_violacao,
+        ids_transacoes,
+    )
+    return validas, a_repetir
+
+
+def _formatar_violacoes(violacoes):
+    return "\n".join(
+        f"ID: {v['id_transacao']} | Funcionário: {v['funcionario']} | "
+        f"Violação: {v['regra']} | Severidade: {v['severidade']}"
+        for v in violacoes
+    )
+
+
+def _violacoes_por_transacao(violacoes, ids_lote):
+    """Agrupa as violações de um lote em {ID: [violações]} para o registro de auditoria."""
+    por_id = {id_transacao: [] for id_transacao in ids_lote}
+    for violacao in violacoes:
+        por_id[violacao["id_transacao"]].append(violacao)
+    return por_id
+
+
 def analisar_transacoes_simples(
-    caminho_transacoes, caminho_politica, batch_size=50, max_batches=3
+    caminho_transacoes,
+    caminho_politica,
+    batch_size=None,
+    max_batches=None,
+    max_concorrencia=4,
+    ids_transacoes=None,
+    orcamento_tokens=LLM_ORCAMENTO_TOKENS,
+    incremental=True,
 ):
     """
     Analisa transações bancárias em busca de violações DIRETAS da política de compliance.
 
+    As regras determinísticas da política (alçadas, categorias não aceitas, locais
+    banidos e itens da lista negra) são compiladas e avaliadas sobre todas as
+    transações de uma vez. Apenas as transações que as regras não conseguem decidir
+    são enviadas ao LLM, em lotes processados em paralelo com retentativas. Os
+    lotes são empacotados até `orcamento_tokens` (descontada a parte fixa do
+    prompt), sem cortar transações.
+
+    O LLM responde em JSON restrito a um esquema (`src/saida_estruturada.py`):
+    uma violação {id_transacao, funcionario, regra, severidade} por regra
+    quebrada. Violações fora do esquema não derrubam o lote: só as transações
+    que elas citam são reenviadas ao LLM, uma a uma.
+
+    Com `incremental`, os vereditos do LLM ficam no registro de auditoria
+    (`src/auditoria.py`) sob o hash das seções 1 a 3 da política: só as
+    transações ainda não analisadas com essa versão da política (as novas desde a
+    última auditoria, as de lotes que falharam ou todas as afetadas por uma
+    mudança nessas seções) vão para o LLM, e os achados anteriores são incluídos
+    no resultado. A marca d'água do CSV só avança quando todas as transações lidas
+    foram registradas; as linhas antes dela não são reavaliadas.
+
+    Cada item retornado tem "batch", "status" ("ok" ou "erro"), "ids_transacoes",
+    "violacoes" (os registros) e "justificativa_ia" (os registros em texto). Lotes
+    com erro, e transações cujas respostas continuaram fora do esquema, podem ser
+    reexecutados passando seus `ids_transacoes`.
+
     Args:
-        batch_size: Transações por lote (padrão: 50)
-        max_batches: Número máximo de lotes a processar
+        batch_size: Limite opcional de transações por lote (padrão: só o orçamento)
+        max_batches: Número máximo de lotes enviados ao LLM (padrão: todos)
+        max_concorrencia: Lotes enviados ao LLM simultaneamente (padrão: 4)
+        ids_transacoes: Se informado, analisa apenas as transações com esses IDs
+        orcamento_tokens: Tokens de entrada estimados por requisição ao LLM
+        incremental: Reaproveita as análises registradas (padrão: True)
     """
-    transacoes = ler_transacoes(caminho_transacoes)
+    # Tamanho do CSV antes da leitura: a marca d'água não passa do que foi lido
+    tamanho_lido = os.path.getsize(caminho_transacoes)
+    tabela = carregar_transacoes(caminho_transacoes)
     politica = ler_politica(caminho_politica)
 
-    model = genai.GenerativeModel("gemini-2.5-flash")
+    indices = None
+    if ids_transacoes is not None:
+        indices = np.flatnonzero(np.isin(tabela.ids, list(ids_transacoes)))
+    total_avaliadas = len(tabela) if indices is None else len(indices)
 
     violacoes_encontradas = []
-    total_batches = min((len(transacoes) + batch_size - 1) // batch_size, max_batches)
 
+    violacoes_regras, indices_indecisos = avaliar_transacoes(
+        tabela, compilar_regras(politica), indices
+    )
     print(
-        f"[Fraude Simples] Analisando {min(len(transacoes), batch_size * max_batches)} transações em {total_batches} lotes (limitado para teste)..."
+        f"[Fraude Simples] Regras: {total_avaliadas} transações avaliadas, "
+        f"{len(violacoes_regras)} violações diretas, {len(indices_indecisos)} para o LLM."
     )
+    if violacoes_regras:
+        registros = [
+            {
+                "id_transacao": v["transacao"]["id_transacao"],
+                "funcionario": v["transacao"]["funcionario"],
+                "regra": f"{r['descricao']} (Seção {r['secao']})",
+                "severidade": "alta",
+            }
+            for v in violacoes_regras
+            for r in v["regras"]
+        ]
+        violacoes_encontradas.append(
+            {
+                "batch": f"{total_avaliadas} transações (regras determinísticas)",
+                "status": "ok",
+                "ids_transacoes": [v["transacao"]["id_transacao"] for v in violacoes_regras],
+                "violacoes": registros,
+                "justificativa_ia": _formatar_violacoes(registros),
+            }
+        )
 
-    for batch_num in range(total_batches):
-        start_idx = batch_num * batch_size
-        end_idx = min(start_idx + batch_size, len(transacoes))
-        batch = transacoes[start_idx:end_idx]
+    # Apenas as transações que as regras não decidem (e que ainda não foram
+    # analisadas com esta versão da política) vão para o LLM. As linhas antes da
+    # marca d'água já foram todas analisadas; das seguintes, as que uma execução
+    # anterior (parcial ou com falhas) já registrou também não voltam ao LLM
+    anteriores = {}
+    marca = SEM_MARCA
+    auditoria_completa = incremental and ids_transacoes is None
+    if incremental:
+        hash_atual = hash_politica(politica, SECOES_POLITICA, FORMATO_REGISTRO)
+        marca = registro_auditoria.verificar_fonte(
+            DETECTOR, caminho_transacoes, hash_atual
+        )
+        if ids_transacoes is None:
+            anteriores = registro_auditoria.analisados(
+                DETECTOR, caminho_transacoes, hash_atual
+            )
 
-        print(f"[Fraude Simples] Lote {batch_num + 1}/{total_batches}...")
+    pendentes = []
+    ja_analisadas = []
+    for i in indices_indecisos:
+        id_transacao = str(tabela.ids[i])
+        if ids_transacoes is None and (i < marca.itens or id_transacao in anteriores):
+            ja_analisadas.append(id_transacao)
+        else:
+            pendentes.append((i, tabela.registro(i)))
 
-        # Formata as transações do lote
-        transacoes_formatadas = ""
-        for i, transacao in enumerate(batch):
-            transacoes_formatadas += f"#{start_idx + i + 1} | ID: {transacao['id_transacao']} | {transacao['data']} | {transacao['funcionario']} | ${transacao['valor']} | {transacao['descricao']}\n"
+    if incremental:
+        print(
+            f"[Fraude Simples] Auditoria incremental: {len(ja_analisadas)} transações "
+            f"já analisadas com esta versão da política, {len(pendentes)} pendentes."
+        )
+    registros_anteriores = [
+        v for id_t in ja_analisadas for v in anteriores.get(id_t, [])
+    ]
+    if registros_anteriores:
+        violacoes_encontradas.append(
+            {
+                "batch": f"{len(ja_analisadas)} transações (auditorias anteriores)",
+                "status": "ok",
+                "ids_transacoes": [id_t for id_t in ja_analisadas if anteriores.get(id_t)],
+                "violacoes": registros_anteriores,
+                "justificativa_ia": _formatar_violacoes(registros_anteriores),
+            }
+        )
 
-        prompt = f"""Você é um auditor de compliance da Dunder Mifflin.
+    if not pendentes:
+        if auditoria_completa:
+            registro_auditoria.avancar_marca(
+                DETECTOR, caminho_transacoes, hash_atual, tamanho_lido, len(tabela)
+            )
+        return violacoes_encontradas
 
-                    TAREFA: Identificar transações que, POR SI SÓ, violam a política de compliance.
-                    (Não considere conspirações ou contexto de e-mails - apenas se a transação viola regras diretamente)
+    linhas = [_formatar_transacao(i, transacao) for i, transacao in pendentes]
+    tokens_fixos = estimar_tokens(_prefixo_politica(politica) + _prompt_lote([]))
+    empacotados = empacotar(linhas, orcamento_tokens, tokens_fixos, batch_size)
+    if max_batches is not None:
+        empacotados = empacotados[:max_batches]
+    lotes = [pendentes[l.inicio : l.fim] for l in empacotados]
+    # Com `max_batches`, parte das pendentes fica para a próxima auditoria
+    auditoria_completa = auditoria_completa and sum(len(l) for l in lotes) == len(
+        pendentes
+    )
 
-                    POLÍTICA DE COMPLIANCE:
-                    {politica}
+    print(
+        f"[Fraude Simples] Analisando {sum(len(l) for l in lotes)} transações com o LLM: "
+        f"{descrever_ocupacao(empacotados)} ({max_concorrencia} em paralelo)..."
+    )
 
-                    TRANSAÇÕES PARA ANÁLISE:
-                    {transacoes_formatadas}
+    itens = [(t["id_transacao"], linha) for (_, t), linha in zip(pendentes, linhas)]
+    contexto_antes = estatisticas_contexto()
+    resultados = executar_em_paralelo(
+        lambda l: analisar_com_revalidacao(
+            lambda lote: _analisar_lote(politica, lote),
+            itens[l.inicio : l.fim],
+            lambda item: item[0],
+        ),
+        empacotados,
+        max_concorrencia=max_concorrencia,
+    )
+    print(f"[Fraude Simples] Cache de contexto: {descrever_contexto(contexto_antes)}.")
 
-                    INSTRUÇÕES:
-                    1. Verifique cada transação contra as regras da política
-                    2. Uma violação DIRETA é quando a transação, por si só, quebra uma regra (ex: valor acima do limite, categoria proibida)
-                    3. Liste APENAS violações diretas no formato:
-                    ID: [id] | Funcionário: [nome] | Violação: [descrição breve da regra quebrada]
-                    4. Se nenhuma transação violar diretamente a política, responda APENAS: "Nenhuma violação direta detectada."
+    for batch_num, (lote, resultado) in enumerate(zip(lotes, resultados)):
+        identificacao = f"{lote[0][1]['id_transacao']}-{lote[-1][1]['id_transacao']}"
+        ids_lote = [t["id_transacao"] for _, t in lote]
 
-                    RELATÓRIO:
-                """
+        if resultado["status"] == "erro":
+            auditoria_completa = False
+            print(f"[Fraude Simples] Erro no lote {batch_num + 1}: {resultado['erro']}")
+            violacoes_encontradas.append(
+                {
+                    "batch": identificacao,
+                    "status": "erro",
+                    "ids_transacoes": ids_lote,
+                    "violacoes": [],
+                    "justificativa_ia": f"Falha na análise do lote: {resultado['erro']}",
+                }
+            )
+            continue
 
-        try:
-            response = model.generate_content(prompt)
-            resultado = response.text.strip()
+        violacoes, invalidas = resultado["resultado"]
+        if invalidas:
+            # Não são registradas: a próxima auditoria as envia de novo ao LLM
+            auditoria_completa = False
+            print(
+                f"[Fraude Simples] Lote {batch_num + 1}: {len(invalidas)} transações "
+                "com resposta fora do esquema após as retentativas."
+            )
+            violacoes_encontradas.append(
+                {
+                    "batch": f"{identificacao} (respostas inválidas)",
+                    "status": "erro",
+                    "ids_transacoes": invalidas,
+                    "violacoes": [],
+                    "justificativa_ia": "Resposta do LLM fora do esquema para: "
+                    + ", ".join(invalidas),
+                }
+            )
 
-            if "Nenhuma violação direta detectada." not in resultado:
-                violacao = {
-                    "batch": f"{start_idx + 1}-{end_idx}",
-                    "justificativa_ia": resultado,
+        if incremental:
+            por_transacao = _violacoes_por_transacao(violacoes, ids_lote)
+            for id_transacao in invalidas:
+                por_transacao.pop(id_transacao, None)
+            registro_auditoria.registrar(
+                DETECTOR, caminho_transacoes, hash_atual, por_transacao
+            )
+        if violacoes:
+            violacoes_encontradas.append(
+                {
+                    "batch": identificacao,
+                    "status": "ok",
+                    "ids_transacoes": ids_lote,
+                    "violacoes": violacoes,
+                    "justificativa_ia": _formatar_violacoes(violacoes),
                 }
-                violacoes_encontradas.append(violacao)
-        except Exception as e:
-            print(f"[Fraude Simples] Erro no lote {batch_num + 1}: {e}")
+            )
 
+    # A marca d'água só avança quando todas as transações lidas foram registradas
+    if auditoria_completa:
+        registro_auditoria.avancar_marca(
+            DETECTOR, caminho_transacoes, hash_atual, tamanho_lido, len(tabela)
+        )
     return violacoes_encontradas
 
 
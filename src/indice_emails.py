@@ -0,0 +1,266 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from src.emails import iterar_emails, ler_emails
+from src.texto import normalizar, palavras
+
+# Campos aceitos nas consultas
+CAMPOS = ("from", "to", "term", "date", "has")
+
+_VALOR_MONETARIO = re.compile(r"\$\s*\d")
+_TOKEN_CONSULTA = re.compile(r"\(|\)|[^\s()]+")
+
+# --- Variáveis Globais para Caching ---
+_indices = {}  # caminho absoluto -> ((mtime_ns, tamanho), IndiceEmails)
+_lock = threading.Lock()
+# ------------------------------------
+
+
+def _chaves_de_endereco(campo, nomes, enderecos):
+    """Chaves de um remetente/destinatário: endereço completo e parte local."""
+    chaves = set()
+    for endereco in filter(None, enderecos.split("; ")):
+        chaves.add(f"{campo}:{endereco}")
+        chaves.add(f"{campo}:{endereco.split('@', 1)[0]}")
+    if not enderecos:
+        # Sem endereço: usa o nome normalizado ("Grupo de Vendas" -> "grupo.de.vendas")
+        for nome in filter(None, nomes.split("; ")):
+            chaves.add(f"{campo}:{'.'.join(palavras(nome))}")
+    return chaves
+
+
+def _chaves_do_email(email):
+    chaves = _chaves_de_endereco("from", email.de, email.de_email)
+    chaves |= _chaves_de_endereco("to", email.para, email.para_email)
+    chaves.update(f"term:{p}" for p in palavras(f"{email.assunto}\n{email.corpo}"))
+    if _VALOR_MONETARIO.search(email.corpo):
+        chaves.add("has:valor")
+    return chaves
+
+
+class IndiceEmails:
+    """
+    Índice invertido sobre o dump de e-mails.
+
+    - `vocabulario`: chaves ordenadas ("from:michael.scott", "term:toby", ...)
+    - `postings` / `limites`: os IDs dos e-mails de `vocabulario[i]` estão em
+      `postings[limites[i]:limites[i + 1]]`, em ordem crescente
+    - `datas`: data de cada e-mail (datetime64[m], NaT se ausente), por ID - 1
+
+    Consultas aceitam `campo:valor` com AND, OR, NOT e parênteses; AND é implícito
+    entre termos consecutivos. Exemplos:
+        from:michael.scott AND term:toby AND date:2008-04..2008-05
+        (term:fatura OR term:reembols*) NOT from:toby.flenderson
+    `*` no fim do valor faz busca por prefixo; datas aceitam AAAA, AAAA-MM ou
+    AAAA-MM-DD, e intervalos abertos ("date:..2008-04-15").
+    """
+
+    def __init__(self, vocabulario, limites, postings, datas):
+        self.vocabulario = vocabulario
+        self.limites = limites
+        self.postings = postings
+        self.datas = datas
+        self.ordem_datas = np.argsort(datas, kind="stable")
+        self.datas_ordenadas = datas[self.ordem_datas]
+
+    @property
+    def total(self):
+        return len(self.datas)
+
+    def _posting(self, chave):
+        posicao = np.searchsorted(self.vocabulario, chave)
+        if posicao < len(self.vocabulario) and self.vocabulario[posicao] == chave:
+            return np.asarray(
+                self.postings[self.limites[posicao] : self.limites[posicao + 1]]
+            )
+        return np.array([], dtype=np.int32)
+
+    def _prefixo(self, prefixo):
+        inicio = np.searchsorted(self.vocabulario, prefixo, side="left")
+        fim = np.searchsorted(self.vocabulario, prefixo + "￿", side="left")
+        if inicio == fim:
+            return np.array([], dtype=np.int32)
+        partes = [
+            self.postings[self.limites[i] : self.limites[i + 1]]
+            for i in range(inicio, fim)
+        ]
+        return np.unique(np.concatenate(partes))
+
+    def _periodo(self, valor):
+        inicio, _, fim = valor.partition("..")
+        if not _:
+            fim = inicio
+        esquerda = 0
+        direita = len(self.datas_ordenadas)
+        if inicio:
+            limite = np.datetime64(inicio).astype("datetime64[m]")
+            esquerda = np.searchsorted(self.datas_ordenadas, limite, side="left")
+        if fim:
+            limite = (np.datetime64(fim) + 1).astype("datetime64[m]")
+            direita = np.searchsorted(self.datas_ordenadas, limite, side="left")
+        # NaT fica no fim da ordenação e nunca entra no intervalo
+        direita = min(direita, np.count_nonzero(~np.isnat(self.datas_ordenadas)))
+        return np.sort(self.ordem_datas[esquerda:direita] + 1).astype(np.int32)
+
+    def _termo(self, campo, valor):
+        if campo not in CAMPOS:
+            raise ValueError(f"Campo de consulta desconhecido: {campo!r}")
+        if campo == "date":
+            return self._periodo(valor)
+
+        valor = normalizar(valor)
+        if campo == "term":
+            # Mesma normalização do texto indexado
+            valor = "".join(palavras(valor.rstrip("*"))) + ("*" if valor.endswith("*") else "")
+        if valor.endswith("*"):
+            return self._prefixo(f"{campo}:{valor[:-1]}")
+        return self._posting(f"{campo}:{valor}")
+
+    def buscar(self, consulta):
+        """Retorna os IDs (ordenados) dos e-mails que satisfazem a consulta."""
+        tokens = _TOKEN_CONSULTA.findall(consulta)
+        resultado, posicao = self._ou(tokens, 0)
+        if posicao != len(tokens):
+            raise ValueError(f"Consulta inválida perto de {tokens[posicao]!r}")
+        return resultado
+
+    # Analisador descendente recursivo: OU > E > NÃO > termo
+    def _ou(self, tokens, posicao):
+        resultado, posicao = self._e(tokens, posicao)
+        while posicao < len(tokens) and tokens[posicao] == "OR":
+            direita, posicao = self._e(tokens, posicao + 1)
+            resultado = np.union1d(resultado, direita)
+        return resultado, posicao
+
+    def _e(self, tokens, posicao):
+        resultado, posicao = self._nao(tokens, posicao)
+        while posicao < len(tokens) and tokens[posicao] not in ("OR", ")"):
+            if tokens[posicao] == "AND":
+                posicao += 1
+            direita, posicao = self._nao(tokens, posicao)
+            resultado = np.intersect1d(resultado, direita, assume_unique=True)
+        return resultado, posicao
+
+    def _nao(self, tokens, posicao):
+        if posicao < len(tokens) and tokens[posicao] == "NOT":
+            negado, posicao = self._nao(tokens, posicao + 1)
+            universo = np.arange(1, self.total + 1, dtype=np.int32)
+            return np.setdiff1d(universo, negado, assume_unique=True), posicao
+        return self._atomo(tokens, posicao)
+
+    def _atomo(self, tokens, posicao):
+        if posicao >= len(tokens):
+            raise ValueError("Consulta incompleta.")
+        token = tokens[posicao]
+        if token == "(":
+            resultado, posicao = self._ou(tokens, posicao + 1)
+            if posicao >= len(tokens) or tokens[posicao] != ")":
+                raise ValueError("Parêntese não fechado na consulta.")
+            return resultado, posicao + 1
+        campo, separador, valor = token.partition(":")
+        if not separador or not valor:
+            raise ValueError(f"Termo de consulta inválido: {token!r}")
+        return self._termo(campo.lower(), valor), posicao + 1
+
+
+def _construir(caminho):
+    postings_por_chave = {}
+    datas = []
+    for email in iterar_emails(caminho):
+        datas.append(np.datetime64(email.data, "m") if email.data else np.datetime64("NaT"))
+        for chave in _chaves_do_email(email):
+            postings_por_chave.setdefault(chave, []).append(email.id)
+
+    vocabulario = sorted(postings_por_chave)
+    tamanhos = [len(postings_por_chave[c]) for c in vocabulario]
+    limites = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+    np.cumsum(tamanhos, out=limites[1:])
+    postings = np.fromiter(
+        (i for c in vocabulario for i in postings_por_chave[c]),
+        dtype=np.int32,
+        count=int(limites[-1]),
+    )
+    return IndiceEmails(
+        vocabulario=np.array(vocabulario, dtype=str),
+        limites=limites,
+        postings=postings,
+        datas=np.array(datas, dtype="datetime64[m]"),
+    )
+
+
+def _diretorio_indice(caminho):
+    pasta, nome = os.path.split(caminho)
+    return os.path.join(pasta, f".{nome}.indice")
+
+
+def _carregar_do_disco(caminho, estado):
+    diretorio = _diretorio_indice(caminho)
+    try:
+        with open(os.path.join(diretorio, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if (meta["mtime_ns"], meta["tamanho"]) != (estado.st_mtime_ns, estado.st_size):
+            return None
+
+        def coluna(nome):
+            return np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode="r")
+
+        return IndiceEmails(
+            vocabulario=coluna("vocabulario"),
+            limites=coluna("limites"),
+            postings=coluna("postings"),
+            datas=np.load(os.path.join(diretorio, "datas.npy")),
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _salvar_no_disco(caminho, estado, indice):
+    diretorio = _diretorio_indice(caminho)
+    temporario = tempfile.mkdtemp(dir=os.path.dirname(diretorio), prefix=".indice-")
+    try:
+        for nome in ("vocabulario", "limites", "postings", "datas"):
+            np.save(os.path.join(temporario, f"{nome}.npy"), getattr(indice, nome))
+        with open(os.path.join(temporario, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump({"mtime_ns": estado.st_mtime_ns, "tamanho": estado.st_size}, f)
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.replace(temporario, diretorio)
+    except OSError as e:
+        shutil.rmtree(temporario, ignore_errors=True)
+        print(f"[E-mails] Não foi possível salvar o índice invertido: {e}")
+
+
+def carregar_indice_emails(caminho_arquivo):
+    """
+    Retorna o `IndiceEmails` do dump, construindo-o apenas quando o arquivo muda.
+
+    O índice é persistido em `.<arquivo>.indice/`, ao lado do dump, e as listas de
+    postings são abertas com memory-map.
+    """
+    caminho = os.path.abspath(caminho_arquivo)
+    estado = os.stat(caminho)
+    chave = (estado.st_mtime_ns, estado.st_size)
+
+    with _lock:
+        em_memoria = _indices.get(caminho)
+        if em_memoria is not None and em_memoria[0] == chave:
+            return em_memoria[1]
+
+        indice = _carregar_do_disco(caminho, estado)
+        if indice is None:
+            indice = _construir(caminho)
+            _salvar_no_disco(caminho, estado, indice)
+
+        _indices[caminho] = (chave, indice)
+        return indice
+
+
+def buscar_emails(caminho_arquivo, consulta):
+    """Executa a consulta no índice e retorna os `Email` correspondentes, em ordem."""
+    ids = carregar_indice_emails(caminho_arquivo).buscar(consulta)
+    return ler_emails(caminho_arquivo, [int(i) for i in ids])
@@ -0,0 +1,145 @@
+import math
+import os
+
+import numpy as np
+
+from src.telemetria import medir
+
+# faiss é importado apenas quando um índice é construído ou consultado
+
+# Tipo do índice FAISS: "flat" (busca exata), "ivf" (listas invertidas, treinado
+# sobre os próprios vetores), "hnsw" (grafo) ou "auto" (escolhe pelo tamanho)
+FAISS_TIPO = os.getenv("COMPLIANCE_FAISS_TIPO", "auto")
+TIPOS_INDICE = ("auto", "flat", "ivf", "hnsw")
+# No modo "auto": busca exata até LIMITE_FLAT vetores, HNSW até LIMITE_HNSW e IVF
+# acima disso (o HNSW é rápido mas guarda o grafo em memória)
+LIMITE_FLAT = int(os.getenv("COMPLIANCE_FAISS_LIMITE_FLAT", "20000"))
+LIMITE_HNSW = int(os.getenv("COMPLIANCE_FAISS_LIMITE_HNSW", "1000000"))
+# Parâmetros de busca: listas visitadas no IVF e candidatos explorados no HNSW
+IVF_NPROBE = int(os.getenv("COMPLIANCE_FAISS_NPROBE", "16"))
+HNSW_VIZINHOS = 32
+HNSW_EF_CONSTRUCAO = 80
+HNSW_EF_BUSCA = int(os.getenv("COMPLIANCE_FAISS_EF_BUSCA", "64"))
+# Vetores de treino por lista do IVF recomendados pelo FAISS
+VETORES_POR_LISTA = 39
+
+
+def escolher_tipo(total, tipo=FAISS_TIPO):
+    """Resolve o tipo de índice para `total` vetores ("auto" vira flat, hnsw ou ivf)."""
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(
+            f"Tipo de índice FAISS inválido: {tipo!r}. Use um de {', '.join(TIPOS_INDICE)}."
+        )
+    if tipo != "auto":
+        return tipo
+    if total <= LIMITE_FLAT:
+        return "flat"
+    return "hnsw" if total <= LIMITE_HNSW else "ivf"
+
+
+def normalizar_vetores(vetores):
+    """Cópia float32 dos vetores com norma 1 (produto interno = similaridade de cosseno)."""
+    vetores = np.array(vetores, dtype="float32", ndmin=2)
+    normas = np.linalg.norm(vetores, axis=1, keepdims=True)
+    return vetores / np.maximum(normas, 1e-12)
+
+
+def configurar_busca(index):
+    """Aplica os parâmetros de busca (nprobe, efSearch) a um índice construído ou carregado."""
+    import faiss
+
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(IVF_NPROBE, index.nlist)
+        index.make_direct_map()  # permite reconstruir vetores por posição
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_BUSCA
+    return index
+
+
+def construir_indice(vetores, tipo=FAISS_TIPO):
+    """
+    Constrói um índice FAISS de produto interno sobre os vetores normalizados.
+
+    - "flat": `IndexFlatIP`, busca exata; ideal para corpora pequenos
+    - "ivf": `IndexIVFFlat` com cerca de 4·√n listas, treinado sobre os próprios
+      vetores; a busca visita `IVF_NPROBE` listas
+    - "hnsw": `IndexHNSWFlat` com `HNSW_VIZINHOS` vizinhos por nó, sem treino
+
+    A posição de cada vetor no índice é a mesma em `vetores`.
+    """
+    import faiss
+
+    vetores = normalizar_vetores(vetores)
+    total, dimensao = vetores.shape
+    tipo = escolher_tipo(total, tipo)
+
+    if tipo == "ivf":
+        listas = max(1, min(int(4 * math.sqrt(total)), total // VETORES_POR_LISTA))
+        quantizador = faiss.IndexFlatIP(dimensao)
+        index = faiss.IndexIVFFlat(
+            quantizador, dimensao, listas, faiss.METRIC_INNER_PRODUCT
+        )
+        index.train(vetores)
+    elif tipo == "hnsw":
+        index = faiss.IndexHNSWFlat(
+            dimensao, HNSW_VIZINHOS, faiss.METRIC_INNER_PRODUCT
+        )
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCAO
+    else:
+        index = faiss.IndexFlatIP(dimensao)
+
+    index.add(vetores)
+    return configurar_busca(index)
+
+
+def descrever_indice(index):
+    """Nome curto do tipo de um índice FAISS, para logs e manifestos."""
+    import faiss
+
+    if isinstance(index, faiss.IndexIVF):
+        return f"ivf (nlist={index.nlist}, nprobe={index.nprobe})"
+    if isinstance(index, faiss.IndexHNSW):
+        return f"hnsw (M={HNSW_VIZINHOS}, efSearch={index.hnsw.efSearch})"
+    return "flat"
+
+
+def _busca_no_subconjunto(index, consultas, k, ids):
+    """Busca exata só entre os vetores `ids`, reconstruídos a partir do índice."""
+    vetores = index.reconstruct_batch(ids)
+    similaridades = consultas @ vetores.T
+    ordem = np.argsort(-similaridades, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(similaridades, ordem, axis=1), ids[ordem]
+
+
+def _parametros_filtro(index, permitidos):
+    """Parâmetros de busca que restringem o FAISS aos IDs em `permitidos`."""
+    import faiss
+
+    seletor = faiss.IDSelectorBatch(np.fromiter(sorted(permitidos), dtype="int64"))
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=seletor, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=seletor, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=seletor)
+
+
+def buscar(index, consultas, k, permitidos=None):
+    """
+    Busca as `k` vizinhas de cada consulta (matriz n x d) em uma única chamada.
+
+    Com `permitidos` (conjunto de posições), só esses vetores são considerados:
+    filtros que deixam até `LIMITE_FLAT` vetores usam busca exata sobre eles
+    (o HNSW e o IVF perdem resultados com filtros muito seletivos); filtros maiores
+    usam o seletor de IDs do próprio FAISS. Retorna (similaridades, indices), como
+    `index.search`; posições sem resultado vêm com índice -1.
+    """
+    consultas = normalizar_vetores(consultas)
+    k = min(k, index.ntotal)
+    with medir("faiss.busca", consultas=len(consultas), k=k) as registro:
+        if permitidos is None:
+            return index.search(consultas, k)
+        registro["permitidos"] = len(permitidos)
+        if len(permitidos) <= LIMITE_FLAT:
+            ids = np.fromiter(sorted(permitidos), dtype="int64")
+            return _busca_no_subconjunto(index, consultas, k, ids)
+        return index.search(consultas, k, params=_parametros_filtro(index, permitidos))
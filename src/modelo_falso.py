@@ -0,0 +1,72 @@
+import asyncio
+import os
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+# Latências simuladas (em segundos), configuráveis para testes de carga
+LATENCIA_PRIMEIRO_TOKEN = float(os.getenv("MODELO_FALSO_PRIMEIRO_TOKEN", "0.3"))
+LATENCIA_POR_TRECHO = float(os.getenv("MODELO_FALSO_POR_TRECHO", "0.02"))
+TRECHOS_POR_RESPOSTA = int(os.getenv("MODELO_FALSO_TRECHOS", "20"))
+
+
+def _ultima_pergunta(llm_request):
+    for content in reversed(llm_request.contents or []):
+        if content.role == "user":
+            for part in content.parts or []:
+                if part.text:
+                    return part.text
+    return ""
+
+
+class ModeloFalso(BaseLlm):
+    """
+    Modelo local que imita a latência do Gemini sem chamar a API.
+
+    Responde a cada pergunta com um texto fixo de `trechos` palavras, emitidas uma
+    a uma em streaming, após `latencia_primeiro_token` segundos. Não chama
+    ferramentas: serve para medir a vazão e as latências do servidor e do Runner
+    (`python main.py --servidor --modelo-falso`), sem custo nem rede.
+    """
+
+    model: str = "modelo-falso"
+    latencia_primeiro_token: float = LATENCIA_PRIMEIRO_TOKEN
+    latencia_por_trecho: float = LATENCIA_POR_TRECHO
+    trechos: int = TRECHOS_POR_RESPOSTA
+
+    async def generate_content_async(self, llm_request, stream=False):
+        pergunta = _ultima_pergunta(llm_request)
+        palavras = [f"Resposta simulada para '{pergunta[:40]}':"]
+        palavras += [f"trecho{i}" for i in range(1, self.trechos)]
+
+        await asyncio.sleep(self.latencia_primeiro_token)
+        if stream:
+            for i, palavra in enumerate(palavras):
+                if i:
+                    await asyncio.sleep(self.latencia_por_trecho)
+                yield LlmResponse(
+                    content=types.Content(
+                        role="model", parts=[types.Part(text=palavra + " ")]
+                    ),
+                    partial=True,
+                )
+        else:
+            await asyncio.sleep(self.latencia_por_trecho * (len(palavras) - 1))
+
+        texto = " ".join(palavras) + " "
+        tokens_prompt = sum(
+            len(part.text or "") // 4
+            for content in llm_request.contents or []
+            for part in content.parts or []
+        )
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=texto)]),
+            partial=False,
+            turn_complete=True,
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=tokens_prompt,
+                candidates_token_count=len(texto) // 4,
+                total_token_count=tokens_prompt + len(texto) // 4,
+            ),
+        )
@@ -0,0 +1,317 @@
+import re
+
+import numpy as np
+
+from src.texto import normalizar as _normalizar
+from src.texto import palavras as _palavras
+
+# Decisões possíveis de uma regra
+VIOLACAO = "violacao"
+REVISAO = "revisao"
+
+# Palavras que não identificam um item proibido por si só
+_PALAVRAS_GENERICAS = {
+    "de", "do", "da", "dos", "das", "e", "ou", "em", "para", "o", "a", "os", "as",
+    "com", "kit", "equipamento", "servico", "uso", "industrial", "masculino",
+    "feminino", "escritorio", "pessoal", "arma", "compra", "ex", "item",
+}
+
+_VALOR = r"([\d.]+,\d{2}|\d+)"
+
+
+def _tokens(texto):
+    """Tokens normalizados, com um stemming simples de plural."""
+    tokens = set()
+    for token in _palavras(texto):
+        if len(token) > 3 and token.endswith("s"):
+            token = token[:-1]
+        tokens.add(token)
+    return tokens
+
+
+def _valor(texto):
+    return float(texto.replace(".", "").replace(",", "."))
+
+
+def _fornecedor(descricao):
+    """Extrai o fornecedor de descrições como 'Staples - Despesa de ...' ou 'Hooters (...)'."""
+    return re.split(r" - |\(", descricao, maxsplit=1)[0].strip()
+
+
+def _itens_de_lista(texto):
+    """Divide 'a, b (c, d) e e' em itens, tratando o conteúdo entre parênteses como itens."""
+    itens = []
+    for dentro in re.findall(r"\(([^)]*)\)", texto):
+        dentro = re.sub(r"^\s*ex:\s*", "", dentro)
+        itens.extend(re.split(r",\s*|\s+ou\s+", dentro))
+    fora = re.sub(r"\([^)]*\)", "", texto)
+    itens.extend(re.split(r",\s*|\s+e\s+", fora))
+    return [i.strip(" .\"'") for i in itens if i.strip(" .\"'")]
+
+
+def secoes_da_politica(politica):
+    """Divide a política em {número da seção: texto}."""
+    partes = re.split(r"^SEÇÃO (\d+):.*$", politica, flags=re.MULTILINE)
+    return {partes[i]: partes[i + 1] for i in range(1, len(partes) - 1, 2)}
+
+
+def compilar_regras(politica):
+    """
+    Extrai da política de compliance as regras que podem ser avaliadas sem contexto.
+
+    Retorna um dicionário com:
+      - "alcadas": lista de (categoria, limite inferior) em ordem crescente de valor
+      - "regras": lista de regras, cada uma com id, seção, descrição, decisão
+        (VIOLACAO ou REVISAO) e o critério que a ativa (categorias, termos de
+        descrição, fornecedores e valor mínimo)
+    """
+    secoes = secoes_da_politica(politica)
+    regras = []
+
+    # SEÇÃO 1: alçadas de aprovação ("Categoria C - Até US$ 50,00" etc.)
+    alcadas = []
+    for subsecao, letra, tipo, v1, v2, autoridade in re.findall(
+        rf"^(\d+\.\d+)\. [^(\n]*"
+        rf"\(Categoria ([A-Z]) - (Até|De|Acima de) US\$ {_VALOR}(?: a US\$ {_VALOR})?\)"
+        r"[^\n]*\n(?:(?!\d+\.\d+\.).*\n)*?\s*- Autoridade: ([^\n]*)",
+        secoes.get("1", ""),
+        re.MULTILINE,
+    ):
+        if tipo == "Até":
+            limite = 0.0
+        elif tipo == "De":
+            limite = _valor(v1)
+        else:
+            limite = np.nextafter(_valor(v1), np.inf)
+        alcadas.append((letra, limite))
+        # Alçadas que exigem aprovação só podem ser decididas com a evidência dela
+        if autoridade.startswith("Requer"):
+            regras.append(
+                {
+                    "id": f"1-{letra}",
+                    "secao": subsecao,
+                    "descricao": f"Categoria {letra} (a partir de US$ {limite:.2f}): "
+                    f"{autoridade.rstrip('.')}",
+                    "decisao": REVISAO,
+                    "valor_minimo": limite,
+                }
+            )
+    alcadas.sort(key=lambda a: a[1])
+
+    # SEÇÃO 2: categorias genéricas não aceitas acima de um valor
+    for cat1, cat2, limite in re.findall(
+        rf'"([^"]+)" e "([^"]+)" não são categorias aceitáveis para valores acima de US\$ {_VALOR}',
+        secoes.get("2", ""),
+    ):
+        regras.append(
+            {
+                "id": "2-categoria-generica",
+                "secao": "2",
+                "descricao": f'Categorias "{cat1}"/"{cat2}" não são aceitas acima de US$ {limite}',
+                "decisao": VIOLACAO,
+                "categorias": {cat1, cat2},
+                "valor_minimo": np.nextafter(_valor(limite), np.inf),
+            }
+        )
+
+    # SEÇÃO 2.1: locais restritos e aprovados para refeições com clientes
+    restritos = re.search(r'Locais Restritos: O restaurante "([^"]+)"', politica)
+    if restritos:
+        regras.append(
+            {
+                "id": "2.1-local-restrito",
+                "secao": "2.1",
+                "descricao": f"{restritos.group(1)} está banido da lista de reembolso corporativo",
+                "decisao": VIOLACAO,
+                "fornecedores": {_normalizar(restritos.group(1))},
+            }
+        )
+    aprovados = re.search(r"Locais Aprovados: (.*)\.\s*$", politica, re.MULTILINE)
+    if aprovados:
+        regras.append(
+            {
+                "id": "2.1-local-nao-aprovado",
+                "secao": "2.1",
+                "descricao": "Refeição com cliente fora dos locais aprovados",
+                "decisao": REVISAO,
+                "categorias": {"Refeição com Cliente"},
+                "fornecedores_permitidos": {
+                    _normalizar(re.sub(r"\s*\(.*\)", "", local))
+                    for local in aprovados.group(1).split(", ")
+                },
+            }
+        )
+
+    # SEÇÃO 2.3: compras de tecnologia acima do limite passam pelo RH
+    ti = re.search(rf"toda compra de (\w+) acima de US\$ {_VALOR}", secoes.get("2", ""))
+    if ti:
+        regras.append(
+            {
+                "id": "2.3-tecnologia",
+                "secao": "2.3",
+                "descricao": f"Compra de {ti.group(1)} acima de US$ {ti.group(2)} exige aprovação do RH",
+                "decisao": REVISAO,
+                "categorias": {ti.group(1)},
+                "valor_minimo": np.nextafter(_valor(ti.group(2)), np.inf),
+            }
+        )
+
+    # Itens proibidos citados como "X são proibidos" (ex.: conversíveis na seção 2.2)
+    for item in re.findall(r"- [^:\n]*: ([^.\n]+?) são proibidos", politica):
+        _adicionar_itens_proibidos(regras, "2.2", _itens_de_lista(item))
+
+    # SEÇÃO 3: lista negra
+    lista_negra = secoes.get("3", "")
+    for subsecao, corpo in re.findall(
+        r"^(3\.\d+)\. (.*?)(?=^3\.\d+\.|\Z)", lista_negra, re.MULTILINE | re.DOTALL
+    ):
+        itens = []
+        for lista in re.findall(r"Estão proibidos: ([^\n]+)", corpo):
+            itens.extend(_itens_de_lista(lista))
+        for alinea in re.findall(r"^\s*[a-z]\) ([^\n]+)", corpo, re.MULTILINE):
+            exemplos = re.findall(r"\(([^)]*)\)", alinea)
+            if exemplos:
+                itens.extend(_itens_de_lista(f"({exemplos[0]})"))
+            else:
+                itens.append(re.split(r" para | se | dentro ", alinea)[0])
+        _adicionar_itens_proibidos(regras, subsecao, itens)
+
+    return {"alcadas": alcadas, "regras": regras}
+
+
+def _adicionar_itens_proibidos(regras, secao, itens):
+    """
+    Cria as regras de um item proibido.
+
+    A VIOLACAO exige todos os termos informativos do item na descrição
+    ("estrelas ninja" -> {"estrela", "ninja"}). Um termo isolado é ambíguo
+    ("estrela" também descreve um hotel 3 estrelas, "corrente" ou "branca" não
+    indicam arma alguma): itens com um único termo informativo e descrições que
+    contêm só o núcleo de um item ("algemas de escape" -> "algema") viram REVISAO
+    e seguem para o LLM. Nomes próprios ("Dunder Infinity") só valem completos:
+    o núcleo ("dunder") não é revisado.
+    """
+    for item in itens:
+        palavras = [
+            t
+            for t in _palavras(item)
+            if len(t) > 2 and t not in _PALAVRAS_GENERICAS
+        ]
+        palavras = [next(iter(_tokens(p))) for p in palavras]
+        palavras = [p for p in palavras if p not in _PALAVRAS_GENERICAS]
+        if not palavras:
+            continue
+        termos = set(palavras)
+        nome_proprio = all(p[:1].isupper() for p in item.split())
+        if len(termos) > 1:
+            regras.append(
+                {
+                    "id": f"{secao}-proibido",
+                    "secao": secao,
+                    "descricao": f"Item proibido: {item}",
+                    "decisao": VIOLACAO,
+                    "termos": termos,
+                }
+            )
+        if nome_proprio and len(termos) > 1:
+            continue
+        regras.append(
+            {
+                "id": f"{secao}-possivel-proibido",
+                "secao": secao,
+                "descricao": f"Possível item proibido: {item}",
+                "decisao": REVISAO,
+                "termos": {palavras[0]},
+            }
+        )
+
+
+def _mascara_por_valor_unico(valores_unicos, codigos, predicado):
+    """Avalia `predicado` uma vez por valor distinto e expande para todas as linhas."""
+    tabela = np.fromiter(
+        (predicado(v) for v in valores_unicos), dtype=bool, count=len(valores_unicos)
+    )
+    return tabela[codigos]
+
+
+def avaliar_transacoes(tabela, regras_compiladas, indices=None):
+    """
+    Avalia as regras compiladas sobre todas as transações de uma vez.
+
+    Usa as colunas da `TabelaTransacoes` (ver src/transacoes.py): as regras textuais
+    são avaliadas uma única vez por valor distinto e expandidas pelos códigos
+    categóricos, e os limites de valor são comparações vetorizadas. Se `indices`
+    for informado, apenas essas linhas são consideradas no resultado.
+
+    Retorna (violacoes, indices_indecisos): a lista de violações determinísticas
+    (transação, alçada e regras violadas) e os índices das transações que as regras não
+    conseguem decidir e que devem ser analisadas pelo LLM.
+    """
+    if len(tabela) == 0:
+        return [], []
+
+    valores = np.asarray(tabela.valores)
+    categorias = tabela.rotulos["categoria"]
+    cod_categoria = np.asarray(tabela.codigos["categoria"])
+    descricoes = tabela.rotulos["descricao"]
+    cod_descricao = np.asarray(tabela.codigos["descricao"])
+    total = len(tabela)
+    tokens_descricao = [_tokens(d) for d in descricoes]
+    fornecedores = [_normalizar(_fornecedor(d)) for d in descricoes]
+
+    regras = regras_compiladas["regras"]
+    ativadas = np.zeros((len(regras), total), dtype=bool)
+    for n, regra in enumerate(regras):
+        mascara = np.ones(total, dtype=bool)
+        if "valor_minimo" in regra:
+            mascara &= valores >= regra["valor_minimo"]
+        if "categorias" in regra:
+            mascara &= _mascara_por_valor_unico(
+                categorias, cod_categoria, lambda c: str(c) in regra["categorias"]
+            )
+        if "termos" in regra:
+            mascara &= _mascara_por_valor_unico(
+                range(len(descricoes)),
+                cod_descricao,
+                lambda i: regra["termos"] <= tokens_descricao[i],
+            )
+        if "fornecedores" in regra:
+            mascara &= _mascara_por_valor_unico(
+                range(len(descricoes)),
+                cod_descricao,
+                lambda i: fornecedores[i] in regra["fornecedores"],
+            )
+        if "fornecedores_permitidos" in regra:
+            mascara &= _mascara_por_valor_unico(
+                range(len(descricoes)),
+                cod_descricao,
+                lambda i: fornecedores[i] not in regra["fornecedores_permitidos"],
+            )
+        ativadas[n] = mascara
+
+    decisoes = np.array([r["decisao"] for r in regras])
+    violou = ativadas[decisoes == VIOLACAO].any(axis=0)
+    revisar = ativadas[decisoes == REVISAO].any(axis=0)
+
+    if indices is not None:
+        selecionadas = np.zeros(total, dtype=bool)
+        selecionadas[indices] = True
+        violou &= selecionadas
+        revisar &= selecionadas
+
+    # Alçada de aprovação de cada transação (busca binária nos limites)
+    alcadas = regras_compiladas["alcadas"]
+    limites = np.array([limite for _, limite in alcadas])
+    posicao_alcada = np.searchsorted(limites, valores, side="right") - 1
+
+    eh_violacao = decisoes == VIOLACAO
+    violacoes = [
+        {
+            "transacao": tabela.registro(i),
+            "alcada": alcadas[posicao_alcada[i]][0] if alcadas else None,
+            "regras": [regras[n] for n in np.flatnonzero(ativadas[:, i] & eh_violacao)],
+        }
+        for i in np.flatnonzero(violou)
+    ]
+    indices_indecisos = np.flatnonzero(revisar & ~violou).tolist()
+    return violacoes, indices_indecisos
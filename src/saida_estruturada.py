@@ -0,0 +1,250 @@
+import json
+
+from src.telemetria import medir
+from src.texto import normalizar
+
+# Severidades aceitas nas violações diretas
+SEVERIDADES = ("baixa", "media", "alta")
+
+# Novas tentativas, item a item, para os itens citados por registros inválidos
+MAX_TENTATIVAS_REGISTRO = 2
+
+
+def _esquema_lista(campo, propriedades):
+    """Esquema de resposta `{campo: [objeto, ...]}` com todas as propriedades obrigatórias."""
+    return {
+        "type": "object",
+        "properties": {
+            campo: {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": propriedades,
+                    "required": list(propriedades),
+                },
+            }
+        },
+        "required": [campo],
+    }
+
+
+_TEXTO = {"type": "string"}
+_IDS_EMAIL = {"type": "array", "items": {"type": "integer"}}
+
+# Esquemas passados ao modelo em `response_schema`
+ESQUEMA_VIOLACOES = _esquema_lista(
+    "violacoes",
+    {
+        "id_transacao": _TEXTO,
+        "funcionario": _TEXTO,
+        "regra": _TEXTO,
+        "severidade": {"type": "string", "enum": list(SEVERIDADES)},
+    },
+)
+ESQUEMA_ACHADOS = _esquema_lista(
+    "achados",
+    {
+        "funcionarios": {"type": "array", "items": _TEXTO},
+        "tipo": _TEXTO,
+        "evidencia_email_ids": _IDS_EMAIL,
+    },
+)
+ESQUEMA_FRAUDES = _esquema_lista(
+    "fraudes",
+    {
+        "id_transacao": _TEXTO,
+        "funcionario": _TEXTO,
+        "tipo": _TEXTO,
+        "evidencia_email_ids": _IDS_EMAIL,
+        "justificativa": _TEXTO,
+    },
+)
+
+
+def config_json(esquema, temperatura=0.1):
+    """Configuração de geração que restringe a resposta ao esquema JSON."""
+    return {
+        "temperature": temperatura,
+        "response_mime_type": "application/json",
+        "response_schema": esquema,
+    }
+
+
+class RegistroInvalido(ValueError):
+    """
+    Registro da resposta fora do esquema. `chaves` são os itens (transações ou
+    e-mails) a que ele se refere, que podem ser reenviados ao modelo sozinhos.
+    """
+
+    def __init__(self, mensagem, chaves=()):
+        super().__init__(mensagem)
+        self.chaves = list(chaves)
+
+
+def ler_registros(resposta, campo):
+    """
+    Lista de registros de uma resposta JSON (`{campo: [...]}` ou a lista direto).
+    Levanta ValueError se a resposta não for JSON ou não tiver a lista.
+    """
+    dados = json.loads(resposta)
+    if isinstance(dados, dict):
+        dados = dados.get(campo)
+    if not isinstance(dados, list):
+        raise ValueError(f"Resposta fora do formato esperado: falta a lista '{campo}'.")
+    return dados
+
+
+def _texto(item, campo, chaves):
+    valor = item.get(campo)
+    if not isinstance(valor, str) or not valor.strip():
+        raise RegistroInvalido(f"Campo '{campo}' ausente ou vazio.", chaves)
+    return valor.strip()
+
+
+def _ids_email(item, chaves):
+    valores = item.get("evidencia_email_ids") or []
+    if not isinstance(valores, list):
+        raise RegistroInvalido("Campo 'evidencia_email_ids' não é uma lista.", chaves)
+    ids = []
+    for valor in valores:
+        try:
+            ids.append(int(str(valor).strip().lstrip("#")))
+        except ValueError:
+            raise RegistroInvalido(f"ID de e-mail inválido: {valor!r}.", chaves)
+    return ids
+
+
+def _objeto(item):
+    if not isinstance(item, dict):
+        raise RegistroInvalido("Registro não é um objeto JSON.")
+    return item
+
+
+def validar_violacao(item, ids_transacoes):
+    """
+    Violação direta: {"id_transacao", "funcionario", "regra", "severidade"}.
+    O ID precisa ser uma das transações enviadas (`ids_transacoes`).
+    """
+    item = _objeto(item)
+    id_transacao = str(item.get("id_transacao") or "").strip()
+    if id_transacao not in ids_transacoes:
+        raise RegistroInvalido(f"ID de transação fora do lote: {id_transacao!r}.")
+    chaves = [id_transacao]
+    severidade = normalizar(str(item.get("severidade") or "")).strip()
+    if severidade not in SEVERIDADES:
+        raise RegistroInvalido(f"Severidade inválida: {item.get('severidade')!r}.", chaves)
+    return {
+        "id_transacao": id_transacao,
+        "funcionario": _texto(item, "funcionario", chaves),
+        "regra": _texto(item, "regra", chaves),
+        "severidade": severidade,
+    }
+
+
+def validar_achado(item, ids_emails):
+    """
+    Achado da análise de e-mails: {"funcionarios", "tipo", "evidencia_email_ids"}.
+    Evidências fora de `ids_emails` são descartadas; o achado precisa citar ao
+    menos um funcionário ou um e-mail.
+    """
+    item = _objeto(item)
+    evidencias = [i for i in _ids_email(item, []) if i in ids_emails]
+    funcionarios = item.get("funcionarios") or []
+    if not isinstance(funcionarios, list):
+        raise RegistroInvalido("Campo 'funcionarios' não é uma lista.", evidencias)
+    funcionarios = [str(f).strip() for f in funcionarios if str(f).strip()]
+    if not funcionarios and not evidencias:
+        raise RegistroInvalido("Achado sem funcionários nem e-mails de evidência.")
+    return {
+        "funcionarios": funcionarios,
+        "tipo": _texto(item, "tipo", evidencias),
+        "evidencia_email_ids": evidencias,
+    }
+
+
+def validar_fraude_contextual(item, ids_transacoes):
+    """
+    Fraude contextual: {"id_transacao", "funcionario", "tipo",
+    "evidencia_email_ids", "justificativa"}, com o ID entre `ids_transacoes`.
+    """
+    item = _objeto(item)
+    id_transacao = str(item.get("id_transacao") or "").strip()
+    if id_transacao not in ids_transacoes:
+        raise RegistroInvalido(f"ID de transação fora do lote: {id_transacao!r}.")
+    chaves = [id_transacao]
+    return {
+        "id_transacao": id_transacao,
+        "funcionario": _texto(item, "funcionario", chaves),
+        "tipo": _texto(item, "tipo", chaves),
+        "evidencia_email_ids": _ids_email(item, chaves),
+        "justificativa": _texto(item, "justificativa", chaves),
+    }
+
+
+def validar_registros(registros, validar, chaves_validas):
+    """
+    Valida cada registro com `validar(registro, chaves_validas)`.
+
+    Retorna (registros válidos, chaves citadas por registros inválidos,
+    quantidade de registros inválidos).
+    """
+    validos = []
+    a_repetir = []
+    invalidos = 0
+    for registro in registros:
+        try:
+            validos.append(validar(registro, chaves_validas))
+        except RegistroInvalido as e:
+            invalidos += 1
+            a_repetir.extend(c for c in e.chaves if c not in a_repetir)
+    return validos, a_repetir, invalidos
+
+
+def resposta_valida(campo, validar, chaves_validas):
+    """
+    Critério `aceitar` de `gerar`: a resposta é JSON com a lista `campo` e todos
+    os registros passam em `validar`. Respostas que falham não vão para o cache.
+    """
+
+    def aceitar(resposta):
+        try:
+            registros = ler_registros(resposta, campo)
+        except ValueError:
+            return False
+        return validar_registros(registros, validar, chaves_validas)[2] == 0
+
+    return aceitar
+
+
+def analisar_com_revalidacao(
+    analisar, itens, chave_do_item, max_tentativas=MAX_TENTATIVAS_REGISTRO
+):
+    """
+    Executa `analisar(itens)`, que retorna (registros válidos, chaves dos itens
+    citados por registros inválidos), e reenvia ao modelo, um por vez, os itens
+    citados por registros inválidos, até `max_tentativas` vezes cada. Os demais
+    itens não são reanalisados. Para que cada tentativa seja uma nova consulta ao
+    modelo, `analisar` deve chamar `gerar` com `aceitar=resposta_valida(...)`:
+    respostas inválidas não ficam no cache.
+
+    Retorna (registros válidos, chaves dos itens que continuaram inválidos).
+    Registros idênticos são mantidos uma única vez.
+    """
+    registros, a_repetir = analisar(itens)
+    por_chave = {chave_do_item(item): item for item in itens}
+
+    persistentes = []
+    for chave in a_repetir:
+        if chave not in por_chave:
+            continue
+        for tentativa in range(1, max_tentativas + 1):
+            with medir("revalidacao", item=str(chave), tentativa=tentativa):
+                novos, ainda_invalidos = analisar([por_chave[chave]])
+            registros.extend(novos)
+            if not ainda_invalidos:
+                break
+        else:
+            persistentes.append(chave)
+
+    unicos = {json.dumps(r, sort_keys=True, ensure_ascii=False): r for r in registros}
+    return list(unicos.values()), persistentes
@@ -0,0 +1,351 @@
+import asyncio
+import contextlib
+import json
+import os
+import time
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from src.telemetria import etiquetas, prometheus
+from src.turno import executar_turno
+
+# Turnos executados ao mesmo tempo no processo e por usuário; os demais esperam
+# na fila, e pedidos além de SERVIDOR_FILA_MAX recebem 503
+SERVIDOR_MAX_TURNOS = int(os.getenv("SERVIDOR_MAX_TURNOS", "8"))
+SERVIDOR_MAX_POR_USUARIO = int(os.getenv("SERVIDOR_MAX_POR_USUARIO", "1"))
+SERVIDOR_FILA_MAX = int(os.getenv("SERVIDOR_FILA_MAX", "64"))
+# Sessões sem turnos há mais de SERVIDOR_SESSAO_OCIOSA segundos são descartadas, e
+# no máximo SERVIDOR_MAX_SESSOES ficam abertas (as ociosas há mais tempo saem antes)
+SERVIDOR_SESSAO_OCIOSA = float(os.getenv("SERVIDOR_SESSAO_OCIOSA", "3600"))
+SERVIDOR_MAX_SESSOES = int(os.getenv("SERVIDOR_MAX_SESSOES", "10000"))
+
+# Amostras de latência mantidas para os percentis de /metricas
+AMOSTRAS_METRICAS = 10000
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+_STATUS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+
+class ErroHTTP(Exception):
+    def __init__(self, status, mensagem):
+        super().__init__(mensagem)
+        self.status = status
+
+
+def _percentis(amostras):
+    if not amostras:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.fromiter(amostras, float), [50, 95, 99])
+    return {"p50": round(p50, 4), "p95": round(p95, 4), "p99": round(p99, 4)}
+
+
+async def _ler_requisicao(reader):
+    """Lê uma requisição HTTP/1.1: (método, caminho, corpo)."""
+    linha = await reader.readline()
+    if not linha:
+        raise ConnectionResetError
+    try:
+        metodo, alvo, _ = linha.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ErroHTTP(400, "Linha de requisição inválida.")
+
+    cabecalhos = {}
+    while True:
+        linha = await reader.readline()
+        if linha in (b"\r\n", b"\n", b""):
+            break
+        nome, _, valor = linha.decode("latin-1").partition(":")
+        cabecalhos[nome.strip().lower()] = valor.strip()
+
+    try:
+        tamanho = int(cabecalhos.get("content-length") or 0)
+    except ValueError:
+        raise ErroHTTP(400, "Content-Length inválido.")
+    if tamanho > TAMANHO_MAXIMO_CORPO:
+        raise ErroHTTP(413, "Corpo da requisição muito grande.")
+    corpo = await reader.readexactly(tamanho) if tamanho else b""
+    return metodo.upper(), urlsplit(alvo).path, corpo
+
+
+def _responder_json(writer, status, dados):
+    corpo = json.dumps(dados, ensure_ascii=False).encode("utf-8")
+    writer.write(
+        (
+            f"HTTP/1.1 {status} {_STATUS[status]}\r\n"
+            "Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1")
+        + corpo
+    )
+
+
+def _responder_texto(writer, status, texto, tipo="text/plain; charset=utf-8"):
+    corpo = texto.encode("utf-8")
+    writer.write(
+        (
+            f"HTTP/1.1 {status} {_STATUS[status]}\r\n"
+            f"Content-Type: {tipo}\r\n"
+            f"Content-Length: {len(corpo)}\r\n"
+            "Connection: close\r\n\r\n"
+        ).encode("latin-1")
+        + corpo
+    )
+
+
+def _evento_sse(tipo, dados):
+    return f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n".encode(
+        "utf-8"
+    )
+
+
+class ServidorAuditor:
+    """
+    Servidor HTTP/SSE que atende vários usuários com um único Runner do ADK.
+
+    Rotas:
+    - `POST /chat` com `{"usuario": ..., "mensagem": ...}`: executa um turno na
+      sessão do usuário (criada no primeiro pedido) e transmite os eventos de
+      `executar_turno` como Server-Sent Events (`fila`, `texto`, `resposta`,
+      `ferramenta_inicio`, `ferramenta_fim`, `fim` ou `erro`)
+    - `GET /healthz`: estado do processo
+    - `GET /metricas`: contadores, vazão e percentis de latência
+    - `GET /metrics`: telemetria das operações (LLM, FAISS, leitura dos arquivos)
+      no formato de texto do Prometheus, por operação e ferramenta
+
+    No máximo `max_turnos` turnos rodam ao mesmo tempo, e `max_por_usuario` por
+    usuário (com o padrão 1, os turnos de uma sessão são serializados). Os demais
+    esperam na fila, limitada a `fila_max` pedidos.
+
+    A sessão de um usuário sem turnos em andamento é descartada (com o histórico
+    da conversa) depois de `sessao_ociosa` segundos, ou antes, das mais antigas
+    para as mais recentes, quando há mais de `max_sessoes` abertas; o próximo
+    pedido do usuário abre uma sessão nova.
+    """
+
+    def __init__(
+        self,
+        runner,
+        session_service,
+        max_turnos=SERVIDOR_MAX_TURNOS,
+        max_por_usuario=SERVIDOR_MAX_POR_USUARIO,
+        fila_max=SERVIDOR_FILA_MAX,
+        streaming=True,
+        sessao_ociosa=SERVIDOR_SESSAO_OCIOSA,
+        max_sessoes=SERVIDOR_MAX_SESSOES,
+    ):
+        self.runner = runner
+        self.session_service = session_service
+        self.max_por_usuario = max_por_usuario
+        self.fila_max = fila_max
+        self.streaming = streaming
+        self.sessao_ociosa = sessao_ociosa
+        self.max_sessoes = max_sessoes
+
+        self._vagas = asyncio.Semaphore(max_turnos)
+        self._vagas_usuario = {}  # usuario -> asyncio.Semaphore
+        self._sessoes = OrderedDict()  # usuario -> session_id, do uso mais antigo ao mais recente
+        self._ultimo_uso = {}  # usuario -> time.monotonic() do fim do último turno
+        self._turnos_usuario = {}  # usuario -> turnos em andamento ou na fila
+        self._lock_sessoes = asyncio.Lock()
+
+        self.inicio = time.monotonic()
+        self.ativos = 0
+        self.na_fila = 0
+        self.contadores = {"concluidos": 0, "com_erro": 0, "rejeitados": 0}
+        self._latencias = {
+            nome: deque(maxlen=AMOSTRAS_METRICAS)
+            for nome in ("espera_fila", "primeiro_token", "total")
+        }
+
+    async def iniciar(self, host="127.0.0.1", porta=8080):
+        """Abre o socket e retorna o `asyncio.Server` (use `serve_forever`)."""
+        return await asyncio.start_server(self._atender, host, porta)
+
+    async def _sessao(self, usuario):
+        """Sessão do usuário, reservada até `_liberar_sessao` (não é descartada antes)."""
+        async with self._lock_sessoes:
+            await self._descartar_ociosas(usuario)
+            if usuario not in self._sessoes:
+                session = await self.session_service.create_session(
+                    user_id=usuario, app_name=self.runner.app_name
+                )
+                self._sessoes[usuario] = session.id
+                self._vagas_usuario[usuario] = asyncio.Semaphore(self.max_por_usuario)
+            self._sessoes.move_to_end(usuario)
+            self._turnos_usuario[usuario] = self._turnos_usuario.get(usuario, 0) + 1
+            return self._sessoes[usuario]
+
+    def _liberar_sessao(self, usuario):
+        self._turnos_usuario[usuario] -= 1
+        if not self._turnos_usuario[usuario]:
+            del self._turnos_usuario[usuario]
+        self._ultimo_uso[usuario] = time.monotonic()
+        self._sessoes.move_to_end(usuario)
+
+    async def _descartar_ociosas(self, novo_usuario):
+        """
+        Descarta as sessões ociosas há mais de `sessao_ociosa` e, se preciso, as
+        ociosas há mais tempo para que caibam `max_sessoes` com a de `novo_usuario`.
+        `_sessoes` está na ordem do último uso: a varredura para na primeira sessão
+        livre que deve ficar.
+        """
+        agora = time.monotonic()
+        excedentes = len(self._sessoes) - self.max_sessoes
+        if novo_usuario not in self._sessoes:
+            excedentes += 1
+        descartadas = []
+        for usuario, session_id in self._sessoes.items():
+            if usuario in self._turnos_usuario or usuario == novo_usuario:
+                continue
+            ociosa = agora - self._ultimo_uso.get(usuario, agora) > self.sessao_ociosa
+            if not ociosa and len(descartadas) >= excedentes:
+                break
+            descartadas.append((usuario, session_id))
+
+        for usuario, session_id in descartadas:
+            del self._sessoes[usuario]
+            del self._vagas_usuario[usuario]
+            self._ultimo_uso.pop(usuario, None)
+            with contextlib.suppress(Exception):
+                await self.session_service.delete_session(
+                    app_name=self.runner.app_name, user_id=usuario, session_id=session_id
+                )
+
+    def metricas(self):
+        decorrido = time.monotonic() - self.inicio
+        return {
+            "uptime_s": round(decorrido, 1),
+            "turnos_ativos": self.ativos,
+            "turnos_na_fila": self.na_fila,
+            "usuarios": len(self._sessoes),
+            "turnos_concluidos": self.contadores["concluidos"],
+            "turnos_com_erro": self.contadores["com_erro"],
+            "pedidos_rejeitados": self.contadores["rejeitados"],
+            "vazao_turnos_por_s": round(self.contadores["concluidos"] / decorrido, 3),
+            "latencia_s": {
+                nome: _percentis(amostras) for nome, amostras in self._latencias.items()
+            },
+        }
+
+    async def _atender(self, reader, writer):
+        try:
+            metodo, caminho, corpo = await _ler_requisicao(reader)
+            if caminho == "/healthz":
+                if metodo != "GET":
+                    raise ErroHTTP(405, "Use GET.")
+                _responder_json(
+                    writer,
+                    200,
+                    {
+                        "status": "ok",
+                        "turnos_ativos": self.ativos,
+                        "turnos_na_fila": self.na_fila,
+                    },
+                )
+            elif caminho == "/metricas":
+                if metodo != "GET":
+                    raise ErroHTTP(405, "Use GET.")
+                _responder_json(writer, 200, self.metricas())
+            elif caminho == "/metrics":
+                if metodo != "GET":
+                    raise ErroHTTP(405, "Use GET.")
+                _responder_texto(
+                    writer, 200, prometheus(), "text/plain; version=0.0.4; charset=utf-8"
+                )
+            elif caminho == "/chat":
+                if metodo != "POST":
+                    raise ErroHTTP(405, "Use POST.")
+                await self._chat(writer, corpo)
+            else:
+                raise ErroHTTP(404, f"Rota desconhecida: {caminho}")
+            await writer.drain()
+        except ErroHTTP as e:
+            _responder_json(writer, e.status, {"erro": str(e)})
+            with contextlib.suppress(ConnectionError):
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # cliente desconectou
+        finally:
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _chat(self, writer, corpo):
+        try:
+            pedido = json.loads(corpo or b"{}")
+            usuario = str(pedido["usuario"]).strip()
+            mensagem = str(pedido["mensagem"])
+        except (ValueError, KeyError, TypeError):
+            raise ErroHTTP(400, 'Envie {"usuario": ..., "mensagem": ...}.')
+        if not usuario:
+            raise ErroHTTP(400, "O campo 'usuario' não pode ser vazio.")
+        if self.na_fila >= self.fila_max:
+            self.contadores["rejeitados"] += 1
+            raise ErroHTTP(503, "Fila cheia; tente novamente em instantes.")
+
+        # A vaga na fila é reservada antes de esperar pela sessão: pedidos
+        # simultâneos não passam todos pela verificação acima
+        inicio = time.perf_counter()
+        self.na_fila += 1
+        na_fila = True
+        try:
+            session_id = await self._sessao(usuario)
+            try:
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\n"
+                    b"Content-Type: text/event-stream; charset=utf-8\r\n"
+                    b"Cache-Control: no-cache\r\n"
+                    b"Connection: close\r\n\r\n"
+                )
+                # Vaga do usuário antes da global: turnos enfileirados de um mesmo
+                # usuário não ocupam vagas que outros poderiam usar
+                async with self._vagas_usuario[usuario], self._vagas:
+                    self.na_fila -= 1
+                    na_fila = False
+                    espera = time.perf_counter() - inicio
+                    self._latencias["espera_fila"].append(espera)
+                    self.ativos += 1
+                    try:
+                        writer.write(_evento_sse("fila", {"tipo": "fila", "espera": espera}))
+                        await writer.drain()
+                        await self._transmitir_turno(writer, usuario, session_id, mensagem)
+                    finally:
+                        self.ativos -= 1
+            finally:
+                self._liberar_sessao(usuario)
+        finally:
+            if na_fila:  # cancelado ou com erro enquanto esperava
+                self.na_fila -= 1
+
+    async def _transmitir_turno(self, writer, usuario, session_id, mensagem):
+        turno = executar_turno(self.runner, usuario, session_id, mensagem, self.streaming)
+        try:
+            with etiquetas(sessao=session_id):
+                async with contextlib.aclosing(turno):
+                    async for evento in turno:
+                        writer.write(_evento_sse(evento["tipo"], evento))
+                        await writer.drain()
+                        if evento["tipo"] == "fim":
+                            self.contadores["concluidos"] += 1
+                            self._latencias["total"].append(evento["total"])
+                            if evento["primeiro_token"] is not None:
+                                self._latencias["primeiro_token"].append(
+                                    evento["primeiro_token"]
+                                )
+        except ConnectionError:
+            self.contadores["com_erro"] += 1
+            raise
+        except Exception as e:
+            self.contadores["com_erro"] += 1
+            print(f"[Servidor] Erro no turno de '{usuario}': {e}")
+            writer.write(_evento_sse("erro", {"tipo": "erro", "erro": str(e)}))
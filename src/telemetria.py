@@ -0,0 +1,295 @@
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Arquivo JSON-lines com um registro por operação medida (vazio: sem trace)
+TELEMETRIA_TRACE = os.getenv("TELEMETRIA_TRACE", "")
+# Preço estimado em US$ por milhão de tokens: (entrada, saída, entrada servida do
+# cache de contexto). Modelos ausentes têm custo zero; a tabela pode ser
+# sobrescrita com TELEMETRIA_PRECOS='{"modelo": [entrada, saida, cache]}'
+PRECOS_POR_MILHAO = {
+    "gemini-2.5-flash": (0.30, 2.50, 0.075),
+    "gemini-2.5-pro": (1.25, 10.00, 0.31),
+    "text-embedding-004": (0.0, 0.0, 0.0),
+}
+PRECOS_POR_MILHAO.update(
+    {
+        modelo: tuple(precos)
+        for modelo, precos in json.loads(os.getenv("TELEMETRIA_PRECOS", "{}")).items()
+    }
+)
+# Registros recentes mantidos em memória para o resumo de cada turno
+REGISTROS_EM_MEMORIA = 10000
+# Ferramenta atribuída às operações feitas fora de uma ferramenta (o próprio
+# agente, o aquecimento do índice)
+SEM_FERRAMENTA = "agente"
+CAMPOS_TOKENS = ("tokens_entrada", "tokens_saida", "tokens_cache")
+
+# --- Variáveis Globais para Caching ---
+_etiquetas = contextvars.ContextVar("telemetria_etiquetas", default={})
+_registro_atual = contextvars.ContextVar("telemetria_registro", default=None)
+_lock = threading.Lock()
+_sequencia = 0
+_recentes = deque(maxlen=REGISTROS_EM_MEMORIA)
+_agregados = {}  # (operacao, ferramenta) -> totais exportados em `prometheus`
+_caminho_trace = TELEMETRIA_TRACE
+_arquivo_trace = None
+# ------------------------------------
+
+
+def definir_trace(caminho):
+    """Grava os registros seguintes em `caminho` (JSON-lines); None desliga o trace."""
+    global _caminho_trace, _arquivo_trace
+    with _lock:
+        if _arquivo_trace is not None:
+            _arquivo_trace.close()
+        _caminho_trace = caminho or ""
+        _arquivo_trace = None
+
+
+@contextlib.contextmanager
+def etiquetas(**valores):
+    """
+    Atribui `valores` (ex.: ferramenta, sessao) às operações medidas dentro do bloco.
+
+    As etiquetas seguem o contexto: valem nas corrotinas e em `asyncio.to_thread`;
+    para threads de um executor, envolva a função com `com_contexto`.
+    """
+    token = _etiquetas.set({**_etiquetas.get(), **valores})
+    try:
+        yield
+    finally:
+        _etiquetas.reset(token)
+
+
+def com_contexto(funcao):
+    """
+    Versão de `funcao` que roda nas etiquetas de quem a criou, para uso em
+    `ThreadPoolExecutor` (que não propaga o contexto para as threads).
+    """
+    contexto = contextvars.copy_context()
+
+    def executar(*args, **kwargs):
+        # Cada chamada usa uma cópia: um mesmo contexto não pode rodar em duas threads
+        return contexto.copy().run(funcao, *args, **kwargs)
+
+    return executar
+
+
+def custo(modelo, tokens_entrada=0, tokens_saida=0, tokens_cache=0):
+    """Custo estimado, em US$, de uma chamada segundo `PRECOS_POR_MILHAO`."""
+    nome = (modelo or "").removeprefix("models/")
+    entrada, saida, cache = PRECOS_POR_MILHAO.get(nome, (0.0, 0.0, 0.0))
+    return (
+        (tokens_entrada - tokens_cache) * entrada
+        + tokens_cache * cache
+        + tokens_saida * saida
+    ) / 1_000_000
+
+
+def uso_de(resposta):
+    """Tokens do `usage_metadata` de uma resposta do Gemini ou de um evento do ADK."""
+    uso = getattr(resposta, "usage_metadata", None)
+    if uso is None:
+        return {}
+    return {
+        "tokens_entrada": getattr(uso, "prompt_token_count", 0) or 0,
+        "tokens_saida": getattr(uso, "candidates_token_count", 0) or 0,
+        "tokens_cache": getattr(uso, "cached_content_token_count", 0) or 0,
+    }
+
+
+def anotar(**campos):
+    """
+    Acrescenta campos à operação em andamento (a de `medir` mais interna).
+
+    Tokens e `requisicoes` são somados, pois uma operação pode fazer mais de uma
+    requisição; os demais campos são substituídos. Sem operação em andamento,
+    não faz nada.
+    """
+    registro = _registro_atual.get()
+    if registro is None:
+        return
+    for campo, valor in campos.items():
+        if campo in CAMPOS_TOKENS or campo == "requisicoes":
+            registro[campo] = registro.get(campo, 0) + valor
+        else:
+            registro[campo] = valor
+
+
+@contextlib.contextmanager
+def medir(operacao, **campos):
+    """
+    Mede o tempo de parede do bloco e o registra como `operacao`.
+
+    Durante o bloco, `anotar` acrescenta campos (tokens, modelo, cache) ao
+    registro; uma exceção é registrada no campo `erro` e propagada.
+    """
+    registro = dict(campos)
+    token = _registro_atual.set(registro)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    except BaseException as e:
+        registro["erro"] = type(e).__name__
+        raise
+    finally:
+        _registro_atual.reset(token)
+        registrar(operacao, time.perf_counter() - inicio, **registro)
+
+
+def _novos_totais():
+    return {
+        "chamadas": 0,
+        "erros": 0,
+        "segundos": 0.0,
+        "custo_usd": 0.0,
+        **{campo: 0 for campo in CAMPOS_TOKENS},
+    }
+
+
+def registrar(operacao, segundos, **campos):
+    """
+    Registra uma operação já medida: guarda-a em memória, soma-a aos totais e a
+    grava no trace. A ferramenta e a sessão vêm das `etiquetas` em vigor, a menos
+    que sejam informadas em `campos`. Retorna o registro.
+    """
+    global _sequencia, _arquivo_trace
+    registro = {
+        "ts": round(time.time(), 3),
+        "operacao": operacao,
+        "ferramenta": SEM_FERRAMENTA,
+        "sessao": None,
+        **_etiquetas.get(),
+        **campos,
+        "segundos": round(segundos, 6),
+    }
+    if any(campo in registro for campo in CAMPOS_TOKENS):
+        registro["custo_usd"] = custo(
+            registro.get("modelo"), *(registro.get(c, 0) for c in CAMPOS_TOKENS)
+        )
+
+    with _lock:
+        _sequencia += 1
+        registro["seq"] = _sequencia
+        _recentes.append(registro)
+
+        totais = _agregados.setdefault(
+            (operacao, registro["ferramenta"]), _novos_totais()
+        )
+        totais["chamadas"] += 1
+        totais["erros"] += "erro" in registro
+        totais["segundos"] += segundos
+        totais["custo_usd"] += registro.get("custo_usd", 0.0)
+        for campo in CAMPOS_TOKENS:
+            totais[campo] += registro.get(campo, 0)
+
+        if _caminho_trace:
+            try:
+                if _arquivo_trace is None:
+                    _arquivo_trace = open(_caminho_trace, "a", encoding="utf-8")
+                _arquivo_trace.write(
+                    json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+                )
+                _arquivo_trace.flush()
+            except OSError as e:
+                print(f"[Telemetria] Não foi possível gravar o trace: {e}")
+    return registro
+
+
+def marca():
+    """Posição atual do registro; use com `registros_desde` para isolar um turno."""
+    with _lock:
+        return _sequencia
+
+
+def registros_desde(posicao, sessao=None):
+    """Registros feitos depois de `posicao` (de `marca`), opcionalmente de uma sessão."""
+    with _lock:
+        return [
+            r
+            for r in _recentes
+            if r["seq"] > posicao and (sessao is None or r["sessao"] == sessao)
+        ]
+
+
+def resumo(registros):
+    """
+    Agrupa registros por ferramenta: {ferramenta: {"operacoes": {operacao:
+    (chamadas, segundos)}, "segundos", tokens, "custo_usd"}}. `segundos` é o
+    tempo da própria ferramenta (operação "ferramenta") ou, fora delas, a soma
+    das operações.
+    """
+    por_ferramenta = {}
+    for r in registros:
+        grupo = por_ferramenta.setdefault(
+            r["ferramenta"],
+            {"operacoes": {}, "segundos": None, "custo_usd": 0.0}
+            | {campo: 0 for campo in CAMPOS_TOKENS},
+        )
+        if r["operacao"] == "ferramenta":
+            grupo["segundos"] = (grupo["segundos"] or 0.0) + r["segundos"]
+            continue
+        chamadas, segundos = grupo["operacoes"].get(r["operacao"], (0, 0.0))
+        grupo["operacoes"][r["operacao"]] = (chamadas + 1, segundos + r["segundos"])
+        grupo["custo_usd"] += r.get("custo_usd", 0.0)
+        for campo in CAMPOS_TOKENS:
+            grupo[campo] += r.get(campo, 0)
+    for grupo in por_ferramenta.values():
+        if grupo["segundos"] is None:
+            grupo["segundos"] = sum(s for _, s in grupo["operacoes"].values())
+    return por_ferramenta
+
+
+def _rotulos(**valores):
+    partes = []
+    for nome, valor in valores.items():
+        valor = str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        partes.append(f'{nome}="{valor}"')
+    return "{" + ",".join(partes) + "}"
+
+
+def prometheus():
+    """
+    Totais desde o início do processo no formato de texto do Prometheus, por
+    operação e ferramenta (a sessão fica só no trace, para não multiplicar as
+    séries).
+    """
+    with _lock:
+        agregados = {chave: dict(totais) for chave, totais in _agregados.items()}
+
+    metricas = [
+        ("auditor_operacoes_total", "counter", "Operações medidas.", "chamadas"),
+        ("auditor_operacoes_erro_total", "counter", "Operações que falharam.", "erros"),
+        (
+            "auditor_operacao_segundos_total",
+            "counter",
+            "Tempo de parede somado das operações.",
+            "segundos",
+        ),
+        ("auditor_custo_usd_total", "counter", "Custo estimado em US$.", "custo_usd"),
+    ]
+    linhas = []
+    for nome, tipo, ajuda, campo in metricas:
+        linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} {tipo}"]
+        for (operacao, ferramenta), totais in sorted(agregados.items()):
+            rotulos = _rotulos(operacao=operacao, ferramenta=ferramenta)
+            linhas.append(f"{nome}{rotulos} {totais[campo]:g}")
+
+    linhas += [
+        "# HELP auditor_tokens_total Tokens de entrada, saída e servidos do cache.",
+        "# TYPE auditor_tokens_total counter",
+    ]
+    for (operacao, ferramenta), totais in sorted(agregados.items()):
+        for campo in CAMPOS_TOKENS:
+            rotulos = _rotulos(
+                operacao=operacao,
+                ferramenta=ferramenta,
+                tipo=campo.removeprefix("tokens_"),
+            )
+            linhas.append(f"auditor_tokens_total{rotulos} {totais[campo]}")
+    return "\n".join(linhas) + "\n"
@@ -0,0 +1,15 @@
+import re
+import unicodedata
+
+_PALAVRA = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos ("Mágica" -> "magica")."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def palavras(texto):
+    """Lista de palavras normalizadas do texto, na ordem em que aparecem."""
+    return _PALAVRA.findall(normalizar(texto))
@@ -1,35 +1,46 @@
+import asyncio
 import os
 
 from src.compliance_chatbot import criar_chatbot_compliance, perguntar_ao_chatbot
 from src.conspiracy_detector import verificar_conspiracao
 from src.fraud_detector_complex import analisar_transacoes_complexas
 from src.fraud_detector_simple import analisar_transacoes_simples
+from src.telemetria import etiquetas, medir
 
-# Ensure the chatbot is initialized
-caminho_politica = "documents/politica_compliance.txt"
-if os.path.exists(caminho_politica):
-    criar_chatbot_compliance(caminho_politica)
+CAMINHO_POLITICA = "documents/politica_compliance.txt"
+CAMINHO_EMAILS = "documents/emails_internos.txt"
+CAMINHO_TRANSACOES = "documents/transacoes_bancarias.csv"
 
 
-def compliance_tool(pergunta: str) -> str:
+def inicializar_chatbot():
     """
-    Responde a perguntas sobre a política de compliance da empresa.
-    Use esta ferramenta quando o usuário tiver dúvidas sobre regras, diretrizes ou políticas internas.
+    Garante que o índice do chatbot de compliance esteja carregado.
 
-    Args:
-        pergunta: A pergunta do usuário sobre compliance.
+    Não é chamada na importação: o `main.py` a executa em segundo plano e a
+    `compliance_tool` a chama antes da primeira pergunta (a construção acontece
+    uma única vez, mesmo com chamadas simultâneas).
     """
+    if os.path.exists(CAMINHO_POLITICA):
+        criar_chatbot_compliance(
+            CAMINHO_POLITICA,
+            CAMINHO_EMAILS if os.path.exists(CAMINHO_EMAILS) else None,
+            CAMINHO_TRANSACOES if os.path.exists(CAMINHO_TRANSACOES) else None,
+        )
+
+
+def _responder_compliance(pergunta, secao="", fonte="politica"):
     try:
-        return perguntar_ao_chatbot(pergunta)
+        inicializar_chatbot()
+        secoes = [s.strip() for s in secao.split(",") if s.strip()]
+        tipos = [t.strip() for t in fonte.split(",") if t.strip()]
+        if "todas" in tipos:
+            tipos = []
+        return perguntar_ao_chatbot(pergunta, secoes or None, tipos or None)
     except Exception as e:
         return f"Erro ao consultar o chatbot de compliance: {str(e)}"
 
 
-def conspiracy_tool() -> str:
-    """
-    Analisa e-mails internos em busca de evidências de conspiração contra Toby Flenderson.
-    Use esta ferramenta quando o usuário pedir para investigar conspirações ou tramas.
-    """
+def _investigar_conspiracao():
     try:
         caminho_emails = "documents/emails_internos.txt"
         return verificar_conspiracao(caminho_emails)
@@ -37,36 +48,39 @@ def conspiracy_tool() -> str:
         return f"Erro ao verificar conspiração: {str(e)}"
 
 
-def simple_fraud_tool() -> str:
-    """
-    Analisa transações bancárias em busca de violações DIRETAS da política de compliance.
-    Use esta ferramenta para verificar transações que, POR SI SÓ, quebram regras
-    (ex: valores acima do limite, categorias proibidas, fornecedores não autorizados).
-    """
+def _relatorio_fraude_simples():
     try:
         caminho_transacoes = "documents/transacoes_bancarias.csv"
         caminho_politica = "documents/politica_compliance.txt"
         violacoes = analisar_transacoes_simples(caminho_transacoes, caminho_politica)
 
-        if not violacoes:
+        com_violacoes = [v for v in violacoes if v["status"] == "ok"]
+        falhas = [v for v in violacoes if v["status"] == "erro"]
+
+        if not com_violacoes and not falhas:
             return "Nenhuma violação direta de compliance foi detectada nas transações."
 
-        relatorio = (
-            f"Foram encontrados {len(violacoes)} lotes com violações diretas:\n\n"
-        )
-        for v in violacoes:
+        if com_violacoes:
+            relatorio = (
+                f"Foram encontrados {len(com_violacoes)} lotes com violações diretas:\n\n"
+            )
+        else:
+            relatorio = "Nenhuma violação direta foi detectada nos lotes analisados.\n\n"
+        for v in com_violacoes:
             relatorio += f"--- Lote {v['batch']} ---\n{v['justificativa_ia']}\n\n"
+        if falhas:
+            relatorio += (
+                f"{len(falhas)} lotes não puderam ser analisados "
+                "(podem ser reexecutados):\n\n"
+            )
+            for v in falhas:
+                relatorio += f"--- Lote {v['batch']} ---\n{v['justificativa_ia']}\n\n"
         return relatorio
     except Exception as e:
         return f"Erro ao analisar fraudes simples: {str(e)}"
 
 
-def complex_fraud_tool() -> str:
-    """
-    Realiza uma análise forense que CRUZA e-mails com transações para descobrir fraudes contextuais.
-    Use esta ferramenta para identificar funcionários combinando fraudes, desvios de verba,
-    ou conspirações que só podem ser descobertas analisando as comunicações internas.
-    """
+def _relatorio_fraude_complexa():
     try:
         caminho_transacoes = "documents/transacoes_bancarias.csv"
         caminho_politica = "documents/politica_compliance.txt"
@@ -96,3 +110,60 @@ def complex_fraud_tool() -> str:
         return relatorio
     except Exception as e:
         return f"Erro ao analisar fraudes complexas: {str(e)}"
+
+
+# --- Ferramentas do agente ---
+# As análises fazem chamadas bloqueantes ao LLM (e algumas levam minutos). As
+# ferramentas são corrotinas que as executam em uma thread: o ADK as aguarda sem
+# travar o event loop, e chamadas independentes no mesmo turno rodam em paralelo.
+# Cada execução é medida e tudo o que ela faz (LLM, FAISS, leitura dos arquivos)
+# é atribuído à ferramenta na telemetria.
+
+
+async def _executar_ferramenta(nome, funcao, *args):
+    with etiquetas(ferramenta=nome), medir("ferramenta"):
+        return await asyncio.to_thread(funcao, *args)
+
+
+async def compliance_tool(
+    pergunta: str, secao: str = "", fonte: str = "politica"
+) -> str:
+    """
+    Responde a perguntas sobre a política de compliance da empresa, citando as seções usadas.
+    Use esta ferramenta quando o usuário tiver dúvidas sobre regras, diretrizes ou políticas internas.
+    Também consulta os e-mails internos e os resumos de transações por funcionário (argumento `fonte`).
+
+    Args:
+        pergunta: A pergunta do usuário sobre compliance.
+        secao: Opcional. Seções da política a consultar, separadas por vírgula (ex: "3" ou "1.2, 1.3").
+        fonte: Opcional. Documentos a consultar, separados por vírgula: "politica" (padrão), "email", "transacoes" ou "todas".
+    """
+    return await _executar_ferramenta(
+        "compliance_tool", _responder_compliance, pergunta, secao, fonte
+    )
+
+
+async def conspiracy_tool() -> str:
+    """
+    Analisa e-mails internos em busca de evidências de conspiração contra Toby Flenderson.
+    Use esta ferramenta quando o usuário pedir para investigar conspirações ou tramas.
+    """
+    return await _executar_ferramenta("conspiracy_tool", _investigar_conspiracao)
+
+
+async def simple_fraud_tool() -> str:
+    """
+    Analisa transações bancárias em busca de violações DIRETAS da política de compliance.
+    Use esta ferramenta para verificar transações que, POR SI SÓ, quebram regras
+    (ex: valores acima do limite, categorias proibidas, fornecedores não autorizados).
+    """
+    return await _executar_ferramenta("simple_fraud_tool", _relatorio_fraude_simples)
+
+
+async def complex_fraud_tool() -> str:
+    """
+    Realiza uma análise forense que CRUZA e-mails com transações para descobrir fraudes contextuais.
+    Use esta ferramenta para identificar funcionários combinando fraudes, desvios de verba,
+    ou conspirações que só podem ser descobertas analisando as comunicações internas.
+    """
+    return await _executar_ferramenta("complex_fraud_tool", _relatorio_fraude_complexa)
@@ -0,0 +1,345 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from src.telemetria import medir
+
+# Colunas categóricas: guardadas como códigos inteiros + tabela de rótulos
+COLUNAS_CATEGORICAS = ("funcionario", "cargo", "descricao", "categoria", "departamento")
+
+# --- Variáveis Globais para Caching ---
+_tabelas = {}  # caminho absoluto -> TabelaTransacoes
+_lock = threading.Lock()
+# ------------------------------------
+
+
+class TabelaTransacoes:
+    """
+    Transações em formato colunar.
+
+    - `ids`: array de strings com o id_transacao
+    - `datas`: datetime64[D]
+    - `valores`: float64
+    - para cada coluna categórica (funcionario, cargo, descricao, categoria,
+      departamento): `codigos[coluna]` (int32, um por linha) e `rotulos[coluna]`
+      (valores distintos, ordenados)
+
+    Os índices por funcionário, categoria e data são construídos sob demanda a
+    partir de uma ordenação estável dos códigos, e as buscas usam `searchsorted`.
+    """
+
+    def __init__(self, ids, datas, valores, codigos, rotulos):
+        self.ids = ids
+        self.datas = datas
+        self.valores = valores
+        self.codigos = codigos
+        self.rotulos = rotulos
+        self._indices = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def codigo(self, coluna, rotulo):
+        """Código de um rótulo em uma coluna categórica, ou -1 se não existir."""
+        rotulos = self.rotulos[coluna]
+        posicao = np.searchsorted(rotulos, rotulo)
+        if posicao < len(rotulos) and rotulos[posicao] == rotulo:
+            return int(posicao)
+        return -1
+
+    def _indice_categorico(self, coluna):
+        if coluna not in self._indices:
+            codigos = self.codigos[coluna]
+            ordem = np.argsort(codigos, kind="stable")
+            limites = np.searchsorted(
+                codigos[ordem], np.arange(len(self.rotulos[coluna]) + 1)
+            )
+            self._indices[coluna] = (ordem, limites)
+        return self._indices[coluna]
+
+    def indices_por(self, coluna, rotulos):
+        """Índices (em ordem de linha) das transações cujo `coluna` está em `rotulos`."""
+        ordem, limites = self._indice_categorico(coluna)
+        partes = []
+        for rotulo in rotulos:
+            codigo = self.codigo(coluna, rotulo)
+            if codigo >= 0:
+                partes.append(ordem[limites[codigo] : limites[codigo + 1]])
+        if not partes:
+            return np.array([], dtype=np.int64)
+        return np.sort(np.concatenate(partes))
+
+    def indices_por_funcionario(self, nomes):
+        return self.indices_por("funcionario", nomes)
+
+    def indices_por_categoria(self, categorias):
+        return self.indices_por("categoria", categorias)
+
+    def indices_por_periodo(self, inicio=None, fim=None):
+        """Índices das transações com data entre `inicio` e `fim` (inclusivos)."""
+        if "data" not in self._indices:
+            ordem = np.argsort(self.datas, kind="stable")
+            self._indices["data"] = (ordem, self.datas[ordem])
+        ordem, datas_ordenadas = self._indices["data"]
+        esquerda = 0
+        direita = len(ordem)
+        if inicio is not None:
+            esquerda = np.searchsorted(
+                datas_ordenadas, np.datetime64(inicio, "D"), side="left"
+            )
+        if fim is not None:
+            direita = np.searchsorted(
+                datas_ordenadas, np.datetime64(fim, "D"), side="right"
+            )
+        return np.sort(ordem[esquerda:direita])
+
+    def rotulos_de(self, coluna, indices=None):
+        """Valores (strings) de uma coluna categórica nas linhas indicadas."""
+        codigos = self.codigos[coluna]
+        if indices is not None:
+            codigos = codigos[indices]
+        return self.rotulos[coluna][codigos]
+
+    def registro(self, i):
+        """Uma transação como dicionário, no mesmo formato das linhas do CSV."""
+        registro = {
+            "id_transacao": str(self.ids[i]),
+            "data": str(self.datas[i]),
+            "valor": float(self.valores[i]),
+        }
+        for coluna in COLUNAS_CATEGORICAS:
+            registro[coluna] = str(self.rotulos[coluna][self.codigos[coluna][i]])
+        return registro
+
+    def registros(self, indices=None):
+        if indices is None:
+            indices = range(len(self))
+        return [self.registro(i) for i in indices]
+
+
+def _hash_arquivo(caminho, limite=None):
+    """SHA-256 do arquivo inteiro ou dos seus `limite` primeiros bytes."""
+    h = hashlib.sha256()
+    restante = limite
+    with open(caminho, "rb") as f:
+        while restante is None or restante > 0:
+            bloco = f.read(1 << 16 if restante is None else min(1 << 16, restante))
+            if not bloco:
+                break
+            h.update(bloco)
+            if restante is not None:
+                restante -= len(bloco)
+    return h.hexdigest()
+
+
+def _ler_csv(caminho):
+    with open(caminho, mode="r", encoding="utf-8", newline="") as csvfile:
+        reader = csv.DictReader(csvfile)
+        linhas = list(reader)
+    return _montar_tabela(linhas)
+
+
+def _ler_acrescimo(caminho, inicio):
+    """Linhas do CSV a partir do byte `inicio` (início de uma linha), com o cabeçalho do arquivo."""
+    with open(caminho, mode="r", encoding="utf-8", newline="") as csvfile:
+        cabecalho = next(csv.reader(csvfile))
+    with open(caminho, "rb") as f:
+        f.seek(inicio)
+        resto = f.read().decode("utf-8")
+    return list(csv.DictReader(io.StringIO(resto, newline=""), fieldnames=cabecalho))
+
+
+def _concatenar(tabela, nova):
+    """Tabela com as linhas de `tabela` seguidas das de `nova`, com os rótulos unidos."""
+    codigos = {}
+    rotulos = {}
+    for coluna in COLUNAS_CATEGORICAS:
+        rotulos[coluna] = np.union1d(tabela.rotulos[coluna], nova.rotulos[coluna])
+        codigos[coluna] = np.concatenate(
+            [
+                np.searchsorted(rotulos[coluna], tabela.rotulos[coluna])[
+                    tabela.codigos[coluna]
+                ],
+                np.searchsorted(rotulos[coluna], nova.rotulos[coluna])[
+                    nova.codigos[coluna]
+                ],
+            ]
+        ).astype(np.int32)
+    return TabelaTransacoes(
+        ids=np.concatenate([tabela.ids, nova.ids]),
+        datas=np.concatenate([tabela.datas, nova.datas]),
+        valores=np.concatenate([tabela.valores, nova.valores]),
+        codigos=codigos,
+        rotulos=rotulos,
+    )
+
+
+def _montar_tabela(linhas):
+    codigos = {}
+    rotulos = {}
+    for coluna in COLUNAS_CATEGORICAS:
+        rotulos[coluna], inversos = np.unique(
+            [linha[coluna] for linha in linhas], return_inverse=True
+        )
+        codigos[coluna] = inversos.astype(np.int32)
+
+    return TabelaTransacoes(
+        ids=np.array([linha["id_transacao"] for linha in linhas], dtype=str),
+        datas=np.array([linha["data"] for linha in linhas], dtype="datetime64[D]"),
+        valores=np.array([float(linha["valor"]) for linha in linhas]),
+        codigos=codigos,
+        rotulos=rotulos,
+    )
+
+
+def _diretorio_cache(caminho):
+    pasta, nome = os.path.split(caminho)
+    return os.path.join(pasta, f".{nome}.colunas")
+
+
+def _ler_meta(caminho):
+    try:
+        with open(
+            os.path.join(_diretorio_cache(caminho), "meta.json"), "r", encoding="utf-8"
+        ) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _abrir_colunas(caminho):
+    diretorio = _diretorio_cache(caminho)
+
+    def coluna(nome):
+        return np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode="r")
+
+    try:
+        return TabelaTransacoes(
+            ids=coluna("ids"),
+            datas=coluna("datas"),
+            valores=coluna("valores"),
+            codigos={c: coluna(f"{c}.codigos") for c in COLUNAS_CATEGORICAS},
+            rotulos={c: coluna(f"{c}.rotulos") for c in COLUNAS_CATEGORICAS},
+        )
+    except (OSError, ValueError):
+        return None
+
+
+def _carregar_cache(caminho, estado):
+    """Carrega as colunas memory-mapped se o cache corresponder ao CSV atual."""
+    diretorio = _diretorio_cache(caminho)
+    caminho_meta = os.path.join(diretorio, "meta.json")
+    meta = _ler_meta(caminho)
+    if meta is None:
+        return None
+
+    if (meta.get("mtime_ns"), meta.get("tamanho")) != (
+        estado.st_mtime_ns,
+        estado.st_size,
+    ):
+        # O mtime mudou: só reconstrói se o conteúdo também mudou
+        if meta.get("tamanho") != estado.st_size or meta.get("sha256") != _hash_arquivo(
+            caminho
+        ):
+            return None
+        meta["mtime_ns"] = estado.st_mtime_ns
+        with open(caminho_meta, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+
+    return _abrir_colunas(caminho)
+
+
+def _estender_cache(caminho):
+    """
+    Se o CSV só cresceu desde o cache (os bytes já vistos são os mesmos e
+    terminam em uma quebra de linha), lê apenas as linhas acrescentadas e
+    retorna (tabela completa, linhas novas); senão, None.
+    """
+    meta = _ler_meta(caminho)
+    if meta is None or not meta.get("tamanho"):
+        return None
+    tamanho = meta["tamanho"]
+    with open(caminho, "rb") as f:
+        f.seek(tamanho - 1)
+        if f.read(1) != b"\n":
+            return None
+    if _hash_arquivo(caminho, tamanho) != meta.get("sha256"):
+        return None
+    anterior = _abrir_colunas(caminho)
+    if anterior is None:
+        return None
+    linhas = _ler_acrescimo(caminho, tamanho)
+    if not linhas:
+        return anterior, 0
+    return _concatenar(anterior, _montar_tabela(linhas)), len(linhas)
+
+
+def _salvar_cache(caminho, estado, tabela):
+    diretorio = _diretorio_cache(caminho)
+    pasta = os.path.dirname(diretorio) or "."
+    temporario = tempfile.mkdtemp(dir=pasta, prefix=".colunas-")
+    try:
+        colunas = {"ids": tabela.ids, "datas": tabela.datas, "valores": tabela.valores}
+        for c in COLUNAS_CATEGORICAS:
+            colunas[f"{c}.codigos"] = tabela.codigos[c]
+            colunas[f"{c}.rotulos"] = tabela.rotulos[c]
+        for nome, array in colunas.items():
+            np.save(os.path.join(temporario, f"{nome}.npy"), array)
+        with open(os.path.join(temporario, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "mtime_ns": estado.st_mtime_ns,
+                    "tamanho": estado.st_size,
+                    "sha256": _hash_arquivo(caminho),
+                },
+                f,
+            )
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.replace(temporario, diretorio)
+    except OSError as e:
+        shutil.rmtree(temporario, ignore_errors=True)
+        print(f"[Transações] Não foi possível salvar o cache colunar: {e}")
+
+
+def carregar_transacoes(caminho_arquivo):
+    """
+    Retorna a `TabelaTransacoes` do CSV, carregando-a uma única vez por processo.
+
+    Uma cópia binária das colunas fica em `.<arquivo>.colunas/`, ao lado do CSV, e é
+    aberta com memory-map nas execuções seguintes. O cache é validado pelo mtime e
+    pelo tamanho do CSV e, se o mtime mudou, pelo hash do conteúdo. Se o CSV só
+    recebeu linhas novas no fim (export "somente acréscimo"), apenas elas são lidas
+    e acrescentadas às colunas.
+    """
+    caminho = os.path.abspath(caminho_arquivo)
+    estado = os.stat(caminho)
+    chave = (estado.st_mtime_ns, estado.st_size)
+
+    with _lock, medir("csv.carregar", arquivo=os.path.basename(caminho)) as registro:
+        em_memoria = _tabelas.get(caminho)
+        if em_memoria is not None and em_memoria[0] == chave:
+            registro["origem"] = "memoria"
+            return em_memoria[1]
+
+        registro["origem"] = "colunas"
+        tabela = _carregar_cache(caminho, estado)
+        if tabela is None:
+            estendida = _estender_cache(caminho)
+            if estendida is not None:
+                registro["origem"] = "acrescimo"
+                tabela, registro["linhas_novas"] = estendida
+            else:
+                registro["origem"] = "csv"
+                tabela = _ler_csv(caminho)
+            _salvar_cache(caminho, estado, tabela)
+
+        registro["linhas"] = len(tabela.ids)
+        _tabelas[caminho] = (chave, tabela)
+        return tabela
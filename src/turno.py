@@ -0,0 +1,95 @@
+import time
+
+from src.telemetria import registrar, uso_de
+
+
+def _textos(event):
+    """Trechos de texto (sem pensamentos) de um evento do modelo."""
+    content = getattr(event, "content", None)
+    if not content or getattr(content, "role", None) != "model":
+        return []
+    return [
+        part.text
+        for part in content.parts or []
+        if getattr(part, "text", None) and not getattr(part, "thought", False)
+    ]
+
+
+def _nome_modelo(runner):
+    """Nome do modelo do agente (uma string ou uma instância de `BaseLlm`)."""
+    modelo = getattr(runner.agent, "model", "")
+    return modelo if isinstance(modelo, str) else getattr(modelo, "model", "")
+
+
+async def executar_turno(runner, user_id, session_id, mensagem, streaming=True):
+    """
+    Executa um turno do agente e produz os eventos que a interface deve exibir.
+
+    Cada evento é um dicionário com a chave `tipo`:
+    - `texto`: um trecho da resposta (`texto`), assim que chega do modelo
+    - `resposta`: o texto completo de uma mensagem do modelo (`texto`), ao final dela
+    - `ferramenta_inicio` / `ferramenta_fim`: chamada de ferramenta (`nome`; o fim
+      traz também os `segundos` gastos)
+    - `fim`: último evento do turno, com `primeiro_token` (segundos até o primeiro
+      trecho de texto, ou None) e `total` (latência do turno)
+
+    Sem `streaming`, o modelo responde de uma só vez e não há eventos `texto`.
+    Cada resposta completa do modelo do agente é registrada na telemetria como
+    `agente.modelo`, com os tokens do `usage_metadata`. Usado pela CLI (`main.py`) e pelo servidor HTTP (`src/servidor.py`).
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    from google.genai import types
+
+    message_content = types.Content(role="user", parts=[types.Part(text=mensagem)])
+    run_config = RunConfig(
+        streaming_mode=StreamingMode.SSE if streaming else StreamingMode.NONE
+    )
+
+    inicio = time.perf_counter()
+    inicio_modelo = inicio  # início da chamada ao modelo em andamento
+    modelo = _nome_modelo(runner)
+    primeiro_token = None
+    inicio_ferramentas = {}
+    transmitindo = False  # já enviou parciais da mensagem atual
+
+    async for event in runner.run_async(
+        user_id=user_id,
+        session_id=session_id,
+        new_message=message_content,
+        run_config=run_config,
+    ):
+        uso = uso_de(event)
+        if uso and not event.partial:
+            registrar(
+                "agente.modelo", time.perf_counter() - inicio_modelo, modelo=modelo, **uso
+            )
+        for chamada in event.get_function_calls():
+            inicio_ferramentas[chamada.id] = time.perf_counter()
+            yield {"tipo": "ferramenta_inicio", "nome": chamada.name}
+        for resposta in event.get_function_responses():
+            decorrido = time.perf_counter() - inicio_ferramentas.pop(resposta.id, inicio)
+            yield {"tipo": "ferramenta_fim", "nome": resposta.name, "segundos": decorrido}
+            inicio_modelo = time.perf_counter()
+
+        textos = _textos(event)
+        if not textos:
+            continue
+        if primeiro_token is None:
+            primeiro_token = time.perf_counter() - inicio
+        texto = "".join(textos)
+        if event.partial:
+            if streaming:
+                transmitindo = True
+                yield {"tipo": "texto", "texto": texto}
+            continue
+        # Evento consolidado: só vira trecho se a mensagem não veio em parciais
+        if streaming and not transmitindo:
+            yield {"tipo": "texto", "texto": texto}
+        transmitindo = False
+        yield {"tipo": "resposta", "texto": texto}
+
+    yield {
+        "tipo": "fim",
+        "primeiro_token": primeiro_token,
+        "total": time.perf_counter() - inicio,
+    }
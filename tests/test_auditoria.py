@@ -0,0 +1,68 @@
+import pytest
+
+from src.auditoria import SEM_MARCA, Marca, RegistroAuditoria, hash_politica
+
+POLITICA = """PREFÁCIO
+Texto livre.
+SEÇÃO 1: ALÇADAS
+Até US$ 50,00.
+SEÇÃO 2: CATEGORIAS
+Outros não é aceito.
+"""
+
+
+@pytest.fixture
+def registro(tmp_path):
+    return RegistroAuditoria(str(tmp_path / "auditoria.sqlite3"))
+
+
+@pytest.fixture
+def fonte(tmp_path):
+    caminho = tmp_path / "transacoes.csv"
+    caminho.write_text("id,valor\nTX_1,10\nTX_2,20\n", encoding="utf-8")
+    return caminho
+
+
+def test_hash_politica_ignora_o_que_o_detector_nao_usa():
+    base = hash_politica(POLITICA, ("1",))
+    assert hash_politica(POLITICA.replace("Texto livre.", "Outro prefácio."), ("1",)) == base
+    assert hash_politica(POLITICA.replace("Até US$ 50,00.", "Até   US$ 50,00."), ("1",)) == base
+    assert hash_politica(POLITICA.replace("Outros", "Diversos"), ("1",)) == base
+    assert hash_politica(POLITICA.replace("Outros", "Diversos"), ("1", "2")) != hash_politica(
+        POLITICA, ("1", "2")
+    )
+    assert hash_politica(POLITICA.replace("50,00", "60,00"), ("1",)) != base
+    assert hash_politica(POLITICA, ("1",), versao="v2") != base
+
+
+def test_registrar_e_consultar_por_versao_da_politica(registro, fonte):
+    registro.registrar("detector", fonte, "h1", {"TX_1": [], "TX_2": [{"regra": "x"}]})
+    assert registro.analisados("detector", fonte, "h1") == {"TX_1": [], "TX_2": [{"regra": "x"}]}
+    assert registro.analisados("detector", fonte, "h2") == {}
+    assert registro.analisados("outro", fonte, "h1") == {}
+
+
+def test_marca_dagua_avanca_com_acrescimos(registro, fonte):
+    assert registro.verificar_fonte("detector", fonte, "h1") == SEM_MARCA
+    tamanho = fonte.stat().st_size
+    registro.avancar_marca("detector", fonte, "h1", tamanho, 2)
+    with open(fonte, "a", encoding="utf-8") as f:
+        f.write("TX_3,30\n")
+    assert registro.verificar_fonte("detector", fonte, "h1") == Marca(tamanho, 2)
+    # A marca é por versão da política
+    assert registro.verificar_fonte("detector", fonte, "h2") == SEM_MARCA
+
+
+def test_arquivo_reescrito_descarta_marca_e_resultados(registro, fonte, capsys):
+    registro.registrar("detector", fonte, "h1", {"TX_1": []})
+    registro.avancar_marca("detector", fonte, "h1", fonte.stat().st_size, 2)
+    fonte.write_text("id,valor\nTX_1,99\nTX_2,20\n", encoding="utf-8")
+    assert registro.verificar_fonte("detector", fonte, "h1") == SEM_MARCA
+    assert "reescrito" in capsys.readouterr().out
+    assert registro.analisados("detector", fonte, "h1") == {}
+
+
+def test_arquivo_truncado_descarta_a_marca(registro, fonte):
+    registro.avancar_marca("detector", fonte, "h1", fonte.stat().st_size, 2)
+    fonte.write_text("id,valor\n", encoding="utf-8")
+    assert registro.verificar_fonte("detector", fonte, "h1") == SEM_MARCA
@@ -0,0 +1,91 @@
+import types
+
+import pytest
+
+import src.cliente_llm as cliente_llm
+import src.compliance_chatbot as chatbot
+from src.bm25 import IndiceBM25, secoes_citadas, termos
+
+POLITICA = "documents/politica_compliance.txt"
+
+
+def test_termos_sem_plural_infinitivo_e_com_bigramas():
+    assert termos("Posso comprar estrelas ninja?") == [
+        "compra",
+        "estrela",
+        "ninja",
+        "compra_estrela",
+        "estrela_ninja",
+    ]
+
+
+@pytest.mark.parametrize(
+    "pergunta, esperadas",
+    [
+        ("o que diz a seção 1.1?", ["1.1"]),
+        ("item 3.2 e § 2", ["3.2", "2"]),
+        ("posso gastar $49.50?", []),
+        ("reembolso de R$ 1.000 em 49.5%", []),
+    ],
+)
+def test_secoes_citadas(pergunta, esperadas):
+    assert secoes_citadas(pergunta) == esperadas
+
+
+def test_expressao_exclusiva():
+    indice = IndiceBM25(["limite da categoria c", "categoria b e limite geral"])
+    assert indice.expressao_exclusiva("qual a categoria c?", 0)
+    assert not indice.expressao_exclusiva("qual a categoria c?", 1)
+    assert not indice.expressao_exclusiva("qual o limite?", 0)
+
+
+@pytest.fixture
+def chamadas_embedding(tmp_path, monkeypatch):
+    """Índice do chatbot sobre a política real, com embeddings falsos contados."""
+    chamadas = []
+
+    def embed_content(model, content, task_type=None, **_):
+        chamadas.append(content)
+        textos = [content] if isinstance(content, str) else content
+        vetores = [[float(len(t) % 7 + 1), float(len(t) % 5 + 1), 1.0] for t in textos]
+        return {"embedding": vetores[0] if isinstance(content, str) else vetores}
+
+    monkeypatch.setattr(cliente_llm, "_genai", types.SimpleNamespace(embed_content=embed_content))
+    monkeypatch.setattr(cliente_llm, "modo_cache", "desligado")
+    monkeypatch.setattr(chatbot, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(chatbot, "EMBEDDINGS_DIR", str(tmp_path / "fontes"))
+    monkeypatch.setattr(chatbot, "vector_store", None)
+    monkeypatch.setattr(chatbot, "text_chunks", None)
+    chatbot.criar_chatbot_compliance(POLITICA)
+    chamadas.clear()
+    return chamadas
+
+
+@pytest.mark.parametrize(
+    "pergunta",
+    [
+        "limite da Categoria C",
+        "Posso comprar uma katana?",
+        "quem aprova despesas intermediárias",
+        "Posso levar um cliente ao Hooters?",
+    ],
+)
+def test_rota_lexical_dispensa_embedding(chamadas_embedding, pergunta):
+    [(indices, embedding, rota)] = chatbot._recuperar_em_lote([pergunta])
+    assert rota == "lexical"
+    assert indices and embedding is None
+    assert chamadas_embedding == []
+
+
+def test_rota_secao_dispensa_embedding(chamadas_embedding):
+    [(indices, embedding, rota)] = chatbot._recuperar_em_lote(["o que diz a seção 1.1?"])
+    assert rota == "secao"
+    assert all("1.1" in chatbot.text_chunks[i].metadata.get("subsecoes", []) for i in indices)
+    assert chamadas_embedding == []
+
+
+def test_pergunta_ambigua_usa_busca_hibrida(chamadas_embedding):
+    [(_, embedding, rota)] = chatbot._recuperar_em_lote(["qual a punição por fraude?"])
+    assert rota == "hibrida"
+    assert embedding is not None
+    assert len(chamadas_embedding) == 1
@@ -0,0 +1,105 @@
+import threading
+import time
+
+from src import cliente_llm
+from src.cliente_llm import ContextosEmCache
+
+
+class ContextosLentos(ContextosEmCache):
+    """Backend "gemini" cuja criação de contexto demora e é contada."""
+
+    def __init__(self, atraso):
+        super().__init__("gemini", 3600)
+        self.atraso = atraso
+        self.criados = []
+
+    def _criar(self, modelo, prefixo):
+        time.sleep(self.atraso)
+        self.criados.append(prefixo)
+        return f"contexto:{prefixo}"
+
+
+def _em_threads(funcao, argumentos):
+    resultados = [None] * len(argumentos)
+
+    def executar(n):
+        resultados[n] = funcao(*argumentos[n])
+
+    threads = [threading.Thread(target=executar, args=(n,)) for n in range(len(argumentos))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return resultados
+
+
+def test_contexto_do_mesmo_prefixo_e_criado_uma_vez():
+    contextos = ContextosLentos(atraso=0.2)
+    resultados = _em_threads(contextos.obter, [("modelo", "politica")] * 4)
+    assert contextos.criados == ["politica"]
+    assert [contexto for contexto, _ in resultados] == ["contexto:politica"] * 4
+    assert sum(criado for _, criado in resultados) == 1
+    assert contextos.estatisticas["contextos_criados"] == 1
+
+
+def test_prefixos_diferentes_sao_criados_em_paralelo():
+    contextos = ContextosLentos(atraso=0.3)
+    inicio = time.monotonic()
+    _em_threads(contextos.obter, [("modelo", f"politica {n}") for n in range(4)])
+    assert sorted(contextos.criados) == [f"politica {n}" for n in range(4)]
+    assert time.monotonic() - inicio < 0.9
+
+
+def test_backend_local_contabiliza_tokens_economizados(monkeypatch):
+    class Resposta:
+        text = "ok"
+
+    class Modelo:
+        def generate_content(self, prompt, **_):
+            return Resposta()
+
+    monkeypatch.setattr(cliente_llm, "modelo_compartilhado", lambda *a, **k: Modelo())
+    contextos = ContextosEmCache("local", 3600)
+    prefixo = "x" * 400
+    for _ in range(3):
+        assert contextos.gerar("modelo", None, prefixo, "pergunta") == "ok"
+    assert contextos.estatisticas["chamadas_com_prefixo"] == 3
+    # A primeira chamada registra o contexto; as seguintes economizam o prefixo
+    economizados = contextos.estatisticas["tokens_prefixo_economizados"]
+    assert economizados == 2 * cliente_llm.estimar_tokens(prefixo)
+
+
+def _linha(tokens):
+    """Texto com `tokens` tokens estimados."""
+    return "x" * ((tokens - 1) * cliente_llm.CARACTERES_POR_TOKEN)
+
+
+def test_empacotar_preenche_o_orcamento_sem_cortar_linhas():
+    textos = [_linha(40)] * 5
+    lotes = cliente_llm.empacotar(textos, orcamento_tokens=120, tokens_fixos=20)
+    assert [(l.inicio, l.fim, l.tokens) for l in lotes] == [(0, 2, 80), (2, 4, 80), (4, 5, 40)]
+    assert lotes[0].ocupacao == 0.8
+
+
+def test_empacotar_limita_itens_por_lote():
+    lotes = cliente_llm.empacotar([_linha(1)] * 5, orcamento_tokens=1000, max_itens=2)
+    assert [(l.inicio, l.fim) for l in lotes] == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_empacotar_linha_maior_que_o_orcamento_vai_sozinha():
+    textos = [_linha(10), _linha(300), _linha(10)]
+    lotes = cliente_llm.empacotar(textos, orcamento_tokens=100)
+    assert [(l.inicio, l.fim) for l in lotes] == [(0, 1), (1, 2), (2, 3)]
+    assert lotes[1].ocupacao > 1
+
+
+def test_empacotar_sem_textos():
+    assert cliente_llm.empacotar([], orcamento_tokens=100) == []
+    assert cliente_llm.descrever_ocupacao([]) == "nenhum lote"
+
+
+def test_descrever_ocupacao():
+    lotes = cliente_llm.empacotar([_linha(50)] * 3, orcamento_tokens=100)
+    assert cliente_llm.descrever_ocupacao(lotes) == (
+        "2 lote(s), ocupação média 75% (mín. 50%, máx. 100%)"
+    )
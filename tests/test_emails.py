@@ -0,0 +1,145 @@
+import datetime
+
+import pytest
+
+from src.emails import indice_de_offsets, iterar_emails, ler_email, ler_emails
+from src.indice_emails import carregar_indice_emails
+
+DUMP = """DUMP DE SERVIDOR DE E-MAIL
+-------------------------------------------------------------------------------
+De: Michael Scott <Michael.Scott@dundermifflin.com>
+Para: Toby Flenderson <toby.flenderson@dundermifflin.com>
+Data: 2008-04-05 14:00
+Assunto: Reembolso
+Mensagem:
+Toby, aprove o reembolso de $300 da festa.
+Sem perguntas.
+-------------------------------------------------------------------------------
+
+De: Angela Martin <angela.martin@dundermifflin.com>
+Para: Kevin Malone <kevin.malone@dundermifflin.com>; Oscar Martinez <oscar.martinez@dundermifflin.com>
+Data: 2008-04-20 09:30
+Assunto: Fatura
+Mensagem: A fatura da WCS Supplies chegou de novo.
+-------------------------------------------------------------------------------
+De: Dwight Schrute
+Para: Grupo de Vendas
+Data: data inválida
+Assunto: Beterrabas
+Mensagem:
+Beterrabas à venda no estacionamento.
+De: Creed Bratton <creed@dundermifflin.com>
+Para: Michael Scott <michael.scott@dundermifflin.com>
+Data: 2008-05-02 08:00
+Assunto: Reembolsos
+Mensagem:
+Não lembro da fatura.
+"""
+
+
+@pytest.fixture
+def dump(tmp_path):
+    caminho = tmp_path / "emails.txt"
+    caminho.write_bytes(DUMP.encode("utf-8"))
+    return str(caminho)
+
+
+def test_iterar_emails(dump):
+    emails = list(iterar_emails(dump))
+    assert [e.id for e in emails] == [1, 2, 3, 4]
+
+    primeiro = emails[0]
+    assert (primeiro.de, primeiro.de_email) == (
+        "Michael Scott",
+        "michael.scott@dundermifflin.com",
+    )
+    assert primeiro.data == datetime.datetime(2008, 4, 5, 14, 0)
+    assert primeiro.assunto == "Reembolso"
+    assert primeiro.corpo == "Toby, aprove o reembolso de $300 da festa.\nSem perguntas."
+
+    # Vários destinatários e corpo na mesma linha de "Mensagem:"
+    assert emails[1].para == "Kevin Malone; Oscar Martinez"
+    assert emails[1].para_email == (
+        "kevin.malone@dundermifflin.com; oscar.martinez@dundermifflin.com"
+    )
+    assert emails[1].corpo == "A fatura da WCS Supplies chegou de novo."
+
+    # Sem endereço, data inválida e sem separador antes do próximo "De:"
+    assert (emails[2].de, emails[2].de_email, emails[2].data) == ("Dwight Schrute", "", None)
+    assert emails[2].corpo == "Beterrabas à venda no estacionamento."
+    assert emails[3].de == "Creed Bratton"
+
+
+def test_offsets_delimitam_cada_email(dump):
+    emails = list(iterar_emails(dump))
+    offsets = indice_de_offsets(dump)
+    assert offsets.tolist() == [[e.inicio, e.fim] for e in emails]
+    with open(dump, "rb") as f:
+        conteudo = f.read()
+    for email in emails:
+        assert conteudo[email.inicio : email.fim].startswith(b"De: ")
+
+
+def test_ler_emails_por_id(dump):
+    todos = list(iterar_emails(dump))
+    assert ler_emails(dump, [4, 2]) == [todos[3], todos[1]]
+    assert ler_email(dump, 3) == todos[2]
+
+
+def test_iterar_a_partir_de_um_offset(dump):
+    todos = list(iterar_emails(dump))
+    novos = list(iterar_emails(dump, a_partir_de=todos[1].fim, primeiro_id=3))
+    assert novos == todos[2:]
+
+
+@pytest.mark.parametrize(
+    "consulta, esperados",
+    [
+        ("from:michael.scott", [1]),
+        ("from:michael.scott@dundermifflin.com", [1]),
+        ("to:michael.scott", [4]),
+        ("to:oscar.martinez", [2]),
+        ("to:grupo.de.vendas", [3]),
+        ("term:fatura", [2, 4]),
+        ("term:reembols*", [1, 4]),
+        ("term:BETERRABAS", [3]),
+        ("has:valor", [1]),
+        ("term:fatura from:angela.martin", [2]),
+        ("term:fatura AND NOT from:angela.martin", [4]),
+        ("(term:festa OR term:fatura) NOT to:michael.scott", [1, 2]),
+        ("NOT NOT term:festa", [1]),
+        ("date:2008-04", [1, 2]),
+        ("date:2008-04-10..2008-05", [2, 4]),
+        ("date:..2008-04-05", [1]),
+        ("date:2008-05-02..", [4]),
+        ("term:inexistente", []),
+    ],
+)
+def test_consultas_booleanas(dump, consulta, esperados):
+    assert carregar_indice_emails(dump).buscar(consulta).tolist() == esperados
+
+
+@pytest.mark.parametrize(
+    "consulta",
+    ["(term:fatura", "term:fatura)", "fatura", "term:", "subject:fatura", "term:fatura AND"],
+)
+def test_consultas_invalidas(dump, consulta):
+    with pytest.raises(ValueError):
+        carregar_indice_emails(dump).buscar(consulta)
+
+
+def test_indice_e_reconstruido_quando_o_dump_muda(dump):
+    assert carregar_indice_emails(dump).total == 4
+    with open(dump, "a", encoding="utf-8") as f:
+        f.write(
+            "-------------------------------------------------------------------------------\n"
+            "De: Pam Beesly <pam.beesly@dundermifflin.com>\n"
+            "Para: Jim Halpert <jim.halpert@dundermifflin.com>\n"
+            "Data: 2008-05-10 10:00\n"
+            "Assunto: Fatura\n"
+            "Mensagem:\n"
+            "Mais uma fatura.\n"
+        )
+    indice = carregar_indice_emails(dump)
+    assert indice.total == 5
+    assert indice.buscar("term:fatura").tolist() == [2, 4, 5]
@@ -0,0 +1,89 @@
+import pytest
+
+from src.regras_compliance import REVISAO, VIOLACAO, avaliar_transacoes, compilar_regras
+from src.transacoes import carregar_transacoes
+
+POLITICA = "documents/politica_compliance.txt"
+
+CABECALHO = "id_transacao,data,funcionario,cargo,descricao,valor,categoria,departamento\n"
+LINHAS = [
+    "TX_1,2008-04-01,Pam Beesly,Recepcionista,Compra de Café,25.5,Copa e Cozinha,Administrativo",
+    "TX_2,2008-04-01,Andy Bernard,Vendedor,Papelaria Local - Despesa de Material de Escritório,82.84,Material de Escritório,Vendas",
+    "TX_3,2008-04-02,Dwight Schrute,Vendedor,Loja de Armas - Estrelas Ninja,30.0,Outros,Vendas",
+    "TX_4,2008-04-02,Michael Scott,Gerente Regional,Hooters (almoço com cliente),45.0,Refeição com Cliente,Vendas",
+    "TX_5,2008-04-03,Jim Halpert,Vendedor,Staples - Despesa de Material de Escritório,800.0,Material de Escritório,Vendas",
+    "TX_6,2008-04-03,Kevin Malone,Contador,Hotel 3 estrelas Radisson,40.0,Viagem,Contabilidade",
+    "TX_7,2008-04-04,Creed Bratton,Controle de Qualidade,Algemas de brinquedo,20.0,Material de Escritório,Qualidade",
+]
+
+
+@pytest.fixture(scope="module")
+def regras():
+    with open(POLITICA, encoding="utf-8") as f:
+        return compilar_regras(f.read())
+
+
+@pytest.fixture
+def tabela(tmp_path):
+    caminho = tmp_path / "transacoes.csv"
+    caminho.write_text(CABECALHO + "\n".join(LINHAS) + "\n", encoding="utf-8")
+    return carregar_transacoes(str(caminho))
+
+
+def _por_id(regras):
+    return {r["id"]: r for r in regras["regras"]}
+
+
+def test_alcadas_da_secao_1(regras):
+    assert [letra for letra, _ in regras["alcadas"]] == ["C", "B", "A"]
+    assert regras["alcadas"][0][1] == 0.0
+    assert regras["alcadas"][1][1] == pytest.approx(50.01)
+    assert regras["alcadas"][2][1] > 500.0
+
+
+def test_alcadas_que_exigem_aprovacao_viram_revisao(regras):
+    por_id = _por_id(regras)
+    assert "1-C" not in por_id  # o funcionário tem autonomia até US$ 50
+    assert por_id["1-B"]["decisao"] == REVISAO
+    assert por_id["1-B"]["secao"] == "1.2"
+    assert por_id["1-B"]["valor_minimo"] == pytest.approx(50.01)
+    assert por_id["1-A"]["secao"] == "1.3"
+
+
+def test_regras_das_secoes_2_e_3(regras):
+    por_id = _por_id(regras)
+    assert por_id["2-categoria-generica"]["categorias"] == {"Outros", "Diversos"}
+    assert por_id["2.1-local-restrito"]["fornecedores"] == {"hooters"}
+    assert por_id["2.3-tecnologia"]["decisao"] == REVISAO
+    proibidos = [r["termos"] for r in regras["regras"] if r["id"] == "3.2-proibido"]
+    assert {"estrela", "ninja"} in proibidos
+    # Um termo isolado de um item proibido só pede revisão
+    possiveis = [r["termos"] for r in regras["regras"] if r["id"] == "3.2-possivel-proibido"]
+    assert {"katana"} in possiveis
+
+
+def test_avaliar_transacoes(regras, tabela):
+    violacoes, indecisos = avaliar_transacoes(tabela, regras)
+    por_id = {
+        v["transacao"]["id_transacao"]: {r["id"] for r in v["regras"]} for v in violacoes
+    }
+    assert por_id == {
+        "TX_3": {"2-categoria-generica", "3.2-proibido"},
+        "TX_4": {"2.1-local-restrito"},
+    }
+    assert all(r["decisao"] == VIOLACAO for v in violacoes for r in v["regras"])
+    assert {v["transacao"]["id_transacao"]: v["alcada"] for v in violacoes} == {
+        "TX_3": "C",
+        "TX_4": "C",
+    }
+    # Valores das alçadas B e A precisam da evidência de aprovação; "algemas de
+    # brinquedo" e o hotel "3 estrelas" citam só o núcleo de um item proibido
+    # ("algemas de escape", "estrelas ninja"). O café fica decidido pelas regras
+    ids_indecisos = {str(tabela.ids[i]) for i in indecisos}
+    assert ids_indecisos == {"TX_2", "TX_5", "TX_6", "TX_7"}
+
+
+def test_avaliar_transacoes_restrito_aos_indices(regras, tabela):
+    violacoes, indecisos = avaliar_transacoes(tabela, regras, indices=[1, 2])
+    assert [v["transacao"]["id_transacao"] for v in violacoes] == ["TX_3"]
+    assert [str(tabela.ids[i]) for i in indecisos] == ["TX_2"]
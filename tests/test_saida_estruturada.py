@@ -0,0 +1,133 @@
+import json
+
+import pytest
+
+from src.saida_estruturada import (
+    RegistroInvalido,
+    analisar_com_revalidacao,
+    ler_registros,
+    resposta_valida,
+    validar_achado,
+    validar_fraude_contextual,
+    validar_registros,
+    validar_violacao,
+)
+
+IDS = {"TX_1", "TX_2", "TX_3"}
+
+
+def _violacao(**campos):
+    violacao = {
+        "id_transacao": "TX_1",
+        "funcionario": "Michael Scott",
+        "regra": "Seção 3.1",
+        "severidade": "alta",
+    }
+    violacao.update(campos)
+    return violacao
+
+
+def test_ler_registros():
+    assert ler_registros('{"violacoes": [{"a": 1}]}', "violacoes") == [{"a": 1}]
+    assert ler_registros("[]", "violacoes") == []
+    with pytest.raises(ValueError):
+        ler_registros('{"outra": []}', "violacoes")
+    with pytest.raises(ValueError):
+        ler_registros("Nenhuma violação.", "violacoes")
+
+
+def test_validar_violacao_normaliza_campos():
+    registro = validar_violacao(_violacao(id_transacao=" TX_2 ", severidade="Média"), IDS)
+    assert registro == _violacao(id_transacao="TX_2", severidade="media")
+
+
+@pytest.mark.parametrize(
+    "campos, chaves",
+    [
+        ({"id_transacao": "TX_9"}, []),
+        ({"severidade": "gravíssima"}, ["TX_1"]),
+        ({"regra": " "}, ["TX_1"]),
+        ({"funcionario": None}, ["TX_1"]),
+    ],
+)
+def test_validar_violacao_invalida(campos, chaves):
+    with pytest.raises(RegistroInvalido) as erro:
+        validar_violacao(_violacao(**campos), IDS)
+    assert erro.value.chaves == chaves
+
+
+def test_validar_achado():
+    achado = validar_achado(
+        {
+            "funcionarios": ["Kevin", " "],
+            "tipo": "Fornecedor fantasma",
+            "evidencia_email_ids": ["#2", 7, 99],
+        },
+        {2, 7},
+    )
+    assert achado == {
+        "funcionarios": ["Kevin"],
+        "tipo": "Fornecedor fantasma",
+        "evidencia_email_ids": [2, 7],
+    }
+    with pytest.raises(RegistroInvalido):
+        validar_achado({"funcionarios": [], "tipo": "x", "evidencia_email_ids": [99]}, {2})
+    with pytest.raises(RegistroInvalido) as erro:
+        validar_achado({"funcionarios": ["Kevin"], "evidencia_email_ids": [2]}, {2})
+    assert erro.value.chaves == [2]
+
+
+def test_validar_fraude_contextual():
+    fraude = {
+        "id_transacao": "TX_3",
+        "funcionario": "Creed",
+        "tipo": "Desvio",
+        "evidencia_email_ids": [4],
+        "justificativa": "E-mail #4",
+    }
+    assert validar_fraude_contextual(fraude, IDS) == fraude
+    with pytest.raises(RegistroInvalido) as erro:
+        validar_fraude_contextual(dict(fraude, evidencia_email_ids=["quatro"]), IDS)
+    assert erro.value.chaves == ["TX_3"]
+
+
+def test_validar_registros_separa_os_invalidos():
+    registros = [_violacao(), _violacao(id_transacao="TX_2", severidade="?"), "texto solto"]
+    validos, a_repetir, invalidos = validar_registros(registros, validar_violacao, IDS)
+    assert validos == [_violacao()]
+    assert a_repetir == ["TX_2"]
+    assert invalidos == 2
+
+
+def test_resposta_valida():
+    aceitar = resposta_valida("violacoes", validar_violacao, IDS)
+    assert aceitar(json.dumps({"violacoes": [_violacao()]}))
+    assert aceitar(json.dumps({"violacoes": []}))
+    assert not aceitar(json.dumps({"violacoes": [_violacao(severidade="?")]}))
+    assert not aceitar("não é JSON")
+
+
+def test_analisar_com_revalidacao_reenvia_so_os_itens_invalidos():
+    itens = [("TX_1", "linha 1"), ("TX_2", "linha 2"), ("TX_3", "linha 3")]
+    chamadas = []
+    respostas = {
+        # Lote inteiro: TX_2 e TX_3 voltam inválidos
+        ("TX_1", "TX_2", "TX_3"): ([_violacao()], ["TX_2", "TX_3"]),
+        # TX_2 é corrigido na primeira tentativa; TX_3 nunca
+        ("TX_2",): ([_violacao(id_transacao="TX_2")], []),
+        ("TX_3",): ([_violacao()], ["TX_3"]),
+    }
+
+    def analisar(lote):
+        chave = tuple(item[0] for item in lote)
+        chamadas.append(chave)
+        validos, invalidos = respostas[chave]
+        return list(validos), list(invalidos)
+
+    registros, persistentes = analisar_com_revalidacao(
+        analisar, itens, lambda item: item[0], max_tentativas=2
+    )
+    assert chamadas == [("TX_1", "TX_2", "TX_3"), ("TX_2",), ("TX_3",), ("TX_3",)]
+    assert persistentes == ["TX_3"]
+    # Registros repetidos nas tentativas aparecem uma única vez
+    assert registros == [_violacao(), _violacao(id_transacao="TX_2")]
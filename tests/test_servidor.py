@@ -0,0 +1,113 @@
+import asyncio
+import itertools
+import types
+
+import pytest
+
+from src import servidor
+from src.servidor import ServidorAuditor
+
+
+class Sessoes:
+    """Substituto do `session_service` do ADK que registra criações e remoções."""
+
+    def __init__(self):
+        self.ids = itertools.count()
+        self.removidas = []
+
+    async def create_session(self, user_id, app_name):
+        return types.SimpleNamespace(id=f"{user_id}-{next(self.ids)}")
+
+    async def delete_session(self, app_name, user_id, session_id):
+        self.removidas.append(session_id)
+
+
+def _servidor(**kwargs):
+    runner = types.SimpleNamespace(app_name="auditor")
+    return ServidorAuditor(runner, Sessoes(), **kwargs)
+
+
+async def _turno(srv, usuario):
+    session_id = await srv._sessao(usuario)
+    srv._liberar_sessao(usuario)
+    return session_id
+
+
+def test_limite_de_sessoes_descarta_as_ociosas_ha_mais_tempo():
+    srv = _servidor(max_sessoes=2)
+
+    async def cenario():
+        await _turno(srv, "ana")
+        await _turno(srv, "bia")
+        await _turno(srv, "ana")
+        await _turno(srv, "caio")
+
+    asyncio.run(cenario())
+    assert list(srv._sessoes) == ["ana", "caio"]
+    assert set(srv._vagas_usuario) == {"ana", "caio"}
+    assert srv.session_service.removidas == ["bia-1"]
+
+
+def test_sessao_ociosa_e_descartada_e_recriada(monkeypatch):
+    srv = _servidor(sessao_ociosa=10)
+    relogio = [1000.0]
+    monkeypatch.setattr(servidor.time, "monotonic", lambda: relogio[0])
+
+    async def cenario():
+        primeira = await _turno(srv, "ana")
+        await _turno(srv, "bia")
+        relogio[0] += 60
+        await _turno(srv, "caio")
+        return primeira, await _turno(srv, "ana")
+
+    primeira, segunda = asyncio.run(cenario())
+    assert primeira != segunda
+    assert sorted(srv.session_service.removidas) == ["ana-0", "bia-1"]
+    assert list(srv._sessoes) == ["caio", "ana"]
+
+
+def test_sessao_em_uso_nao_e_descartada():
+    srv = _servidor(max_sessoes=1)
+
+    async def cenario():
+        await srv._sessao("ana")  # turno em andamento
+        await _turno(srv, "bia")
+
+    asyncio.run(cenario())
+    assert "ana" in srv._sessoes
+    assert srv.session_service.removidas == []
+
+
+def test_fila_e_reservada_antes_de_criar_a_sessao():
+    srv = _servidor(fila_max=1)
+    liberar = asyncio.Event()
+
+    async def create_session(user_id, app_name):
+        await liberar.wait()
+        return types.SimpleNamespace(id=user_id)
+
+    srv.session_service.create_session = create_session
+
+    class Escritor:
+        def write(self, dados):
+            pass
+
+        async def drain(self):
+            pass
+
+    async def cenario():
+        primeiro = asyncio.create_task(
+            srv._chat(Escritor(), b'{"usuario": "ana", "mensagem": "oi"}')
+        )
+        await asyncio.sleep(0)
+        assert srv.na_fila == 1
+        with pytest.raises(servidor.ErroHTTP) as erro:
+            await srv._chat(Escritor(), b'{"usuario": "bia", "mensagem": "oi"}')
+        primeiro.cancel()
+        liberar.set()
+        await asyncio.gather(primeiro, return_exceptions=True)
+        return erro.value.status
+
+    assert asyncio.run(cenario()) == 503
+    assert srv.contadores["rejeitados"] == 1
+    assert srv.na_fila == 0